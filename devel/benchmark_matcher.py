@@ -0,0 +1,102 @@
+#!/usr/bin/env python
+# This module times the ways SignatureMatcher can search response bodies, on
+# the signatures of the bundled manifest, to choose AUTOMATON_THRESHOLD.
+# Run it from the root of the repository, with pyahocorasick installed.
+import json
+import random
+import string
+import sys
+import timeit
+
+import ahocorasick
+
+sys.path.insert(0, ".")
+from sherlock_project.matcher import ERROR, WAF, WAF_FINGERPRINTS
+
+DATA_REL_URI: str = "sherlock_project/resources/data.json"
+
+DEFAULT_ENCODING = "utf-8"
+
+# Sizes (in bytes) of the bodies searched
+BODY_SIZES = (2_000, 50_000, 500_000)
+
+REPEAT = 3
+
+
+def automaton(signatures):
+    built = ahocorasick.Automaton()
+    for kind, signature in signatures:
+        built.add_word(signature, (kind, signature))
+    built.make_automaton()
+    return built
+
+
+def body(size):
+    # Markup-like text holding none of the signatures, the common case
+    words = ["".join(random.choices(string.ascii_lowercase, k=random.randint(2, 9))) for _ in range(2000)]
+    text = "<html><body>" + " ".join(
+        random.choice(words) + ('<div class="x">' if random.random() < 0.1 else "")
+        for _ in range(size // 6)
+    )
+    return text[:size]
+
+
+def per_site(seconds, sites):
+    return f"{seconds / REPEAT / sites * 1e6:9.1f} us"
+
+
+with open(DATA_REL_URI, "r", encoding=DEFAULT_ENCODING) as data_file:
+    data: dict = json.load(data_file)
+data.pop("$schema", None)
+
+error_msgs = {}
+for name, info in data.items():
+    messages = info.get("errorMsg")
+    if messages is not None:
+        error_msgs[name] = (messages,) if isinstance(messages, str) else tuple(messages)
+
+site_signatures = [
+    [(WAF, fingerprint) for fingerprint in WAF_FINGERPRINTS] + [(ERROR, message) for message in messages]
+    for messages in error_msgs.values()
+]
+print(f"{len(site_signatures)} sites with error messages, "
+      f"at most {max(map(len, site_signatures))} signatures each")
+
+random.seed(1)
+site_automatons = [automaton(signatures) for signatures in site_signatures]
+# One automaton for the whole manifest, whose hits are filtered by site
+manifest_automaton = automaton({
+    signature for signatures in site_signatures for signature in signatures
+})
+
+print(f"{'body':>9} {'substring':>12} {'site automaton':>15} {'manifest automaton':>19}")
+for size in BODY_SIZES:
+    text = body(size)
+    substring = timeit.timeit(
+        lambda text=text: [signature in text for signatures in site_signatures for _, signature in signatures],
+        number=REPEAT,
+    )
+    site = timeit.timeit(
+        lambda text=text: [list(built.iter(text)) for built in site_automatons], number=REPEAT,
+    )
+    manifest = timeit.timeit(
+        lambda text=text: [[hit for hit in manifest_automaton.iter(text) if hit[1] in signatures]
+                 for signatures in map(set, site_signatures)],
+        number=REPEAT,
+    )
+    sites = len(site_signatures)
+    print(f"{size:>9} {per_site(substring, sites):>12} {per_site(site, sites):>15} "
+          f"{per_site(manifest, sites):>19}")
+
+# Number of signatures from which one automaton walk beats substring scans
+messages = [message for messages in error_msgs.values() for message in messages]
+text = body(50_000)
+print(f"{'signatures':>10} {'substring':>12} {'automaton':>12}")
+for count in (8, 16, 32, 48, 64, 128):
+    signatures = [(ERROR, message) for message in (messages * 2)[:count]]
+    built = automaton(signatures)
+    substring = timeit.timeit(
+        lambda signatures=signatures: [signature in text for _, signature in signatures], number=REPEAT,
+    )
+    walk = timeit.timeit(lambda built=built: list(built.iter(text)), number=REPEAT)
+    print(f"{count:>10} {per_site(substring, 1):>12} {per_site(walk, 1):>12}")
@@ -5,9 +5,9 @@ networks.
 
 """
 
-from importlib.metadata import version as pkg_version, PackageNotFoundError
 import pathlib
-import tomli
+from importlib.metadata import PackageNotFoundError
+from importlib.metadata import version as pkg_version
 
 
 def get_version() -> str:
@@ -15,6 +15,9 @@ def get_version() -> str:
     try:
         return pkg_version("sherlock_project")
     except PackageNotFoundError:
+        # Only needed when running from a source tree which isn't installed.
+        import tomli
+
         pyproject_path: pathlib.Path = pathlib.Path(__file__).resolve().parent.parent / "pyproject.toml"
         with pyproject_path.open("rb") as f:
             pyproject_data = tomli.load(f)
@@ -0,0 +1,290 @@
+"""Sherlock Asyncio Module
+
+This module provides an asyncio based session for running probes.  All
+requests are multiplexed on a single event loop, so the number of probes in
+flight is not limited by the number of worker threads.
+"""
+import asyncio
+import threading
+from concurrent.futures import Future
+from http.cookiejar import CookieJar, DefaultCookiePolicy
+from time import monotonic
+from typing import Optional
+
+import httpx
+import requests
+from requests.structures import CaseInsensitiveDict
+from requests.utils import get_encoding_from_headers
+
+from sherlock_project.scheduler import HostScheduler
+from sherlock_project.streaming import CHUNK_SIZE
+
+# Default number of probes which may be in flight at the same time.  This is
+# high enough that a full sweep of the manifest is issued in a single wave.
+DEFAULT_MAX_IN_FLIGHT = 1000
+
+
+def to_requests_response(response: httpx.Response, elapsed: float,
+                         content: Optional[bytes] = None) -> requests.Response:
+    """Convert Response.
+
+    Converts an httpx response into a requests response, so that the rest of
+    Sherlock can handle the results of either engine identically.
+
+    Keyword Arguments:
+    response               -- httpx.Response() object.
+    elapsed                -- Time (in seconds) required to perform request.
+    content                -- Bytes of the body, if it was streamed rather
+                              than loaded into the response.
+
+    Return Value:
+    requests.Response() object.
+    """
+    converted = requests.Response()
+    converted.status_code = response.status_code
+    converted.reason = response.reason_phrase
+    converted.headers = CaseInsensitiveDict(response.headers.items())
+    converted.url = str(response.url)
+    converted.encoding = get_encoding_from_headers(converted.headers)
+    converted._content = response.content if content is None else content
+    converted.elapsed = elapsed
+    converted.latency = elapsed
+    # Such as "HTTP/1.1", or "HTTP/2" when the server accepted it
+    converted.http_version = response.http_version
+
+    return converted
+
+
+def to_requests_exception(error: httpx.HTTPError) -> requests.exceptions.RequestException:
+    """Convert Exception.
+
+    Maps an httpx exception onto the equivalent requests exception, so that
+    get_response() reports the same error context for either engine.
+
+    Keyword Arguments:
+    error                  -- Exception raised by httpx.
+
+    Return Value:
+    requests.exceptions.RequestException() object.
+    """
+    if isinstance(error, httpx.ProxyError):
+        return requests.exceptions.ProxyError(str(error))
+    if isinstance(error, httpx.ConnectTimeout):
+        return requests.exceptions.ConnectTimeout(str(error))
+    if isinstance(error, httpx.TimeoutException):
+        return requests.exceptions.ReadTimeout(str(error))
+    if isinstance(error, (httpx.NetworkError, httpx.RemoteProtocolError)):
+        return requests.exceptions.ConnectionError(str(error))
+    if isinstance(error, httpx.TooManyRedirects):
+        return requests.exceptions.TooManyRedirects(str(error))
+    return requests.exceptions.RequestException(str(error))
+
+
+class SherlockAsyncSession:
+    """Sherlock Asyncio Session.
+
+    Runs requests on an event loop owned by a background thread.  The
+    request methods mirror those of SherlockFuturesSession, and return
+    concurrent.futures.Future() objects resolving to requests.Response()
+    objects, so that sherlock() can drive either session the same way.
+    """
+
+    def __init__(self, max_in_flight: int = DEFAULT_MAX_IN_FLIGHT,
+                 proxy: Optional[str] = None,
+                 scheduler: Optional[HostScheduler] = None,
+                 http2: bool = False):
+        """Create Sherlock Asyncio Session Object.
+
+        Keyword Arguments:
+        self                   -- This object.
+        max_in_flight          -- Maximum number of requests to run at the
+                                  same time.
+        proxy                  -- String indicating the proxy URL.  All
+                                  requests made through this session use it.
+        scheduler              -- HostScheduler() object limiting requests to
+                                  each host.  Default of None for no limits.
+        http2                  -- Boolean indicating whether to offer HTTP/2
+                                  to servers, so that all requests to a host
+                                  which accepts it share one connection.
+                                  Needs the h2 package.  Default of False.
+
+        Return Value:
+        Nothing.
+        """
+
+        self.scheduler = scheduler
+        self._loop = asyncio.new_event_loop()
+        self._thread = threading.Thread(
+            target=self._loop.run_forever, name="sherlock-asyncio", daemon=True
+        )
+        self._thread.start()
+
+        async def setup():
+            self._semaphore = asyncio.Semaphore(max_in_flight)
+            self._client = httpx.AsyncClient(
+                proxy=proxy,
+                http2=http2,
+                # Shared by every username, so no cookies are kept, lest
+                # those set for one username change the answer for the next
+                cookies=CookieJar(policy=DefaultCookiePolicy(allowed_domains=[])),
+                limits=httpx.Limits(max_connections=max_in_flight,
+                                    max_keepalive_connections=max_in_flight),
+            )
+
+        try:
+            asyncio.run_coroutine_threadsafe(setup(), self._loop).result()
+        except Exception:
+            # Such as HTTP/2 without the h2 package
+            self._loop.call_soon_threadsafe(self._loop.stop)
+            self._thread.join()
+            self._loop.close()
+            raise
+
+        return
+
+    async def _request(self, method, url, headers, allow_redirects, timeout, json,
+                       limit_key, body_reader, on_send):
+        if self.scheduler is None or limit_key is None:
+            return await self._send(method, url, headers, allow_redirects, timeout,
+                                    json, body_reader, on_send)
+        # Wait for the host before taking a slot, so that requests queued for
+        # a busy host do not hold up requests to other hosts.
+        async with self.scheduler.limiter(limit_key).async_slot():
+            breaker = self.scheduler.breaker(limit_key)
+            if breaker is None:
+                return await self._send(method, url, headers, allow_redirects, timeout,
+                                        json, body_reader, on_send)
+            with breaker.guard(limit_key):
+                return await self._send(method, url, headers, allow_redirects, timeout,
+                                        json, body_reader, on_send)
+
+    async def _send(self, method, url, headers, allow_redirects, timeout, json,
+                    body_reader, on_send):
+        if isinstance(timeout, tuple):
+            # A (connect, read) tuple, as taken by requests
+            timeout = httpx.Timeout(timeout[1], connect=timeout[0])
+        async with self._semaphore:
+            if on_send is not None:
+                on_send()
+            start = monotonic()
+            try:
+                if body_reader is None:
+                    response = await self._client.request(
+                        method,
+                        url,
+                        headers=headers,
+                        json=json,
+                        follow_redirects=allow_redirects,
+                        timeout=timeout,
+                    )
+                    return to_requests_response(response, monotonic() - start)
+
+                async with self._client.stream(
+                    method,
+                    url,
+                    headers=headers,
+                    json=json,
+                    follow_redirects=allow_redirects,
+                    timeout=timeout,
+                ) as response:
+                    converted = to_requests_response(response, monotonic() - start, b"")
+                    body_reader.start(converted.encoding)
+                    async for chunk in response.aiter_bytes(CHUNK_SIZE):
+                        if body_reader.feed(chunk):
+                            break
+            except httpx.HTTPError as error:
+                raise to_requests_exception(error) from error
+            except httpx.InvalidURL as error:
+                raise requests.exceptions.InvalidURL(str(error)) from error
+
+            converted._content = body_reader.content
+            converted.body_matches = body_reader.found
+            if body_reader.stopped and converted.encoding is None:
+                converted.encoding = body_reader.encoding
+            return converted
+
+    def request(self, method, url, headers=None, proxies=None,
+                allow_redirects=True, timeout=None, json=None,
+                limit_key=None, body_reader=None, on_send=None) -> Future:
+        """Request URL.
+
+        Schedules the request on the event loop without blocking.
+
+        Keyword Arguments:
+        self                   -- This object.
+        method                 -- String containing method desired for request.
+        url                    -- String containing URL for request.
+        headers                -- Dictionary containing headers for request.
+        proxies                -- Accepted for compatibility with requests.
+                                  The proxy is configured for the whole
+                                  session when it is created.
+        allow_redirects        -- Boolean indicating whether to follow
+                                  redirects.
+        timeout                -- Time in seconds to wait before timing out
+                                  request, or a tuple of the times to wait
+                                  for the connection and for the answer.
+        json                   -- Object to send as JSON body of request.
+        limit_key              -- String returned by HostScheduler.register()
+                                  for the site being probed.
+        body_reader            -- BodyReader() object to stream the body
+                                  through.  Default of None to load the
+                                  whole body.
+        on_send                -- Function to call just before the request
+                                  is sent.  Default of None.
+
+        Return Value:
+        concurrent.futures.Future() object resolving to requests.Response().
+        """
+        return asyncio.run_coroutine_threadsafe(
+            self._request(method, url, headers, allow_redirects, timeout, json,
+                          limit_key, body_reader, on_send),
+            self._loop,
+        )
+
+    def get(self, url, **kwargs) -> Future:
+        return self.request("GET", url, **kwargs)
+
+    def head(self, url, **kwargs) -> Future:
+        return self.request("HEAD", url, **kwargs)
+
+    def post(self, url, **kwargs) -> Future:
+        return self.request("POST", url, **kwargs)
+
+    def put(self, url, **kwargs) -> Future:
+        return self.request("PUT", url, **kwargs)
+
+    def close(self):
+        """Close Session.
+
+        Closes all pooled connections and stops the event loop.
+
+        Keyword Arguments:
+        self                   -- This object.
+
+        Return Value:
+        Nothing.
+        """
+        if self._loop.is_closed():
+            return
+
+        async def shutdown():
+            # Abandon requests nobody is waiting for anymore.
+            tasks = [task for task in asyncio.all_tasks()
+                     if task is not asyncio.current_task()]
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+            await self._client.aclose()
+
+        asyncio.run_coroutine_threadsafe(shutdown(), self._loop).result()
+        self._loop.call_soon_threadsafe(self._loop.stop)
+        self._thread.join()
+        self._loop.close()
+
+        return
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
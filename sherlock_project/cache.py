@@ -0,0 +1,168 @@
+"""Sherlock Cache Module
+
+This module keeps downloaded files, such as the site manifest, in an on-disk
+cache.  Cached files are served without touching the network until they are
+older than their time to live, and are then revalidated with a conditional
+request, so an unchanged file is never downloaded twice.
+"""
+import hashlib
+import json
+import os
+import time
+from typing import Optional
+
+import requests
+
+# Default time (in seconds) a cached download is used without revalidation.
+DEFAULT_TTL = 60 * 60
+
+
+def cache_dir() -> str:
+    """Get Cache Directory.
+
+    Return Value:
+    String containing the path of Sherlock's cache directory, following the
+    XDG Base Directory Specification.  The directory may not exist yet.
+    """
+    base = os.environ.get("XDG_CACHE_HOME") or os.path.join(os.path.expanduser("~"), ".cache")
+    return os.path.join(base, "sherlock")
+
+
+def write_atomic(path: str, data: bytes):
+    """Write a file so that readers never see it half written."""
+    temporary = f"{path}.{os.getpid()}.tmp"
+    with open(temporary, "wb") as file:
+        file.write(data)
+    os.replace(temporary, path)
+
+
+class CachedDownload:
+    """Cached Download Object.
+
+    A file at a URL, together with the copy of it in the cache and the
+    validators (ETag and Last-Modified) it was served with.
+    """
+
+    def __init__(self, url: str, directory: Optional[str] = None):
+        """Create Cached Download Object.
+
+        Keyword Arguments:
+        self                   -- This object.
+        url                    -- String containing URL of file.
+        directory              -- String containing path of cache directory.
+                                  Default of None for cache_dir().
+
+        Return Value:
+        Nothing.
+        """
+        self.url = url
+        self.directory = directory or cache_dir()
+
+        # Keep the file name readable, but unique to the URL.
+        digest = hashlib.sha256(url.encode("utf-8")).hexdigest()[:16]
+        name = os.path.basename(url.split("?", 1)[0]) or "download"
+        self.path = os.path.join(self.directory, f"{digest}-{name}")
+        self.meta_path = self.path + ".meta.json"
+
+        return
+
+    def cached(self) -> tuple[Optional[bytes], dict]:
+        """Read Cached Copy.
+
+        Keyword Arguments:
+        self                   -- This object.
+
+        Return Value:
+        Tuple of the cached bytes (None if there is no cached copy) and the
+        dictionary of metadata stored with them.
+        """
+        try:
+            with open(self.path, "rb") as file:
+                content = file.read()
+            with open(self.meta_path, "r", encoding="utf-8") as file:
+                meta = json.load(file)
+        except (OSError, ValueError):
+            return None, {}
+
+        return content, meta
+
+    def store(self, content: Optional[bytes], meta: dict):
+        """Store Cached Copy.
+
+        Failing to write the cache is not an error: the download simply is
+        not cached.
+
+        Keyword Arguments:
+        self                   -- This object.
+        content                -- Bytes to store, or None to only update the
+                                  metadata of the cached copy.
+        meta                   -- Dictionary of metadata to store.
+
+        Return Value:
+        Nothing.
+        """
+        try:
+            os.makedirs(self.directory, exist_ok=True)
+            if content is not None:
+                write_atomic(self.path, content)
+            write_atomic(self.meta_path, json.dumps(meta).encode("utf-8"))
+        except OSError:
+            pass
+
+        return
+
+    def fetch(self, ttl: float = DEFAULT_TTL, timeout: float = 30) -> bytes:
+        """Fetch File.
+
+        Keyword Arguments:
+        self                   -- This object.
+        ttl                    -- Time (in seconds) the cached copy is used
+                                  without asking the server.  A ttl of 0
+                                  revalidates on every fetch.
+        timeout                -- Time (in seconds) to wait for the server.
+
+        Return Value:
+        Bytes of the file.  A stale cached copy is returned if the server
+        cannot be reached or fails.  Raises FileNotFoundError if there is
+        neither a response nor a cached copy.
+        """
+        content, meta = self.cached()
+        if content is not None and time.time() - meta.get("fetched_at", 0) < ttl:
+            return content
+
+        headers = {}
+        if content is not None:
+            if meta.get("etag"):
+                headers["If-None-Match"] = meta["etag"]
+            if meta.get("last_modified"):
+                headers["If-Modified-Since"] = meta["last_modified"]
+
+        try:
+            response = requests.get(url=self.url, headers=headers, timeout=timeout)
+        except requests.exceptions.RequestException as error:
+            if content is not None:
+                return content
+            raise FileNotFoundError(
+                f"Problem while attempting to access data file URL '{self.url}':  {error}"
+            )
+
+        if response.status_code == 304 and content is not None:
+            meta["fetched_at"] = time.time()
+            self.store(None, meta)
+            return content
+
+        if response.status_code != 200:
+            if content is not None:
+                return content
+            raise FileNotFoundError(f"Bad response while accessing "
+                                    f"data file URL '{self.url}'."
+                                    )
+
+        self.store(response.content, {
+            "url": self.url,
+            "etag": response.headers.get("ETag"),
+            "last_modified": response.headers.get("Last-Modified"),
+            "fetched_at": time.time(),
+        })
+
+        return response.content
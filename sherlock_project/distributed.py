@@ -0,0 +1,549 @@
+"""Sherlock Distributed Module
+
+This module spreads searches over any number of worker processes through
+Redis.  A search is split into jobs, each probing one username on one shard
+of the sites.  Workers take jobs from a shared queue and push their results
+back, so scanning scales across cores and machines independently of the
+process which submitted the search.
+
+Jobs are delivered at least once.  A job taken by a worker is leased to it
+for a while, and the worker keeps renewing the lease while it runs the job.
+A job whose lease runs out, as its worker died, is queued again, and only
+the first completion of a job counts.  A search which has made no progress
+for a long while is reported as incomplete rather than running forever.
+"""
+import json
+import os
+import threading
+import time
+import uuid
+from argparse import ArgumentParser, BooleanOptionalAction
+from collections import Counter
+from typing import Optional
+
+from sherlock_project.latency import LatencyTracker
+from sherlock_project.notify import QueryNotify
+from sherlock_project.result import QueryResult, QueryStatus
+from sherlock_project.runner import SearchRunner
+from sherlock_project.scheduler import HostScheduler
+from sherlock_project.sherlock import sherlock
+
+# Prefix of every Redis key used by Sherlock.
+DEFAULT_PREFIX = "sherlock"
+
+# Number of jobs each username is split into.
+DEFAULT_SHARDS = 8
+
+# Time (in seconds) the state and results of a search are kept in Redis.
+SEARCH_TTL = 24 * 60 * 60
+
+# Time (in seconds) a job is leased to the worker which took it.  Workers
+# renew the lease while they run the job, so it only runs out when they die.
+DEFAULT_VISIBILITY_TIMEOUT = 300
+
+# Time (in seconds) after which a search no job has completed for is
+# reported as incomplete.
+DEFAULT_STALL_TIMEOUT = 30 * 60
+
+
+def shard_sites(site_data: dict, index: int, count: int) -> dict:
+    """Get the sites of one shard, out of count shards of similar size."""
+    names = sorted(site_data)[index::count]
+    return {name: site_data[name] for name in names}
+
+
+def result_record(username: str, site: str, results_site: dict) -> dict:
+    """Convert the results of one site, as returned by sherlock(), to a JSON record."""
+    status = results_site["status"]
+    return {
+        "username": username,
+        "site": site,
+        "url_main": results_site.get("url_main"),
+        "url_user": results_site.get("url_user"),
+        "status": status.status.name,
+        "http_status": results_site.get("http_status"),
+        "query_time": status.query_time,
+        "context": status.context,
+    }
+
+
+def record_result(record: dict) -> QueryResult:
+    """Convert a JSON record back to a QueryResult() object."""
+    return QueryResult(
+        username=record["username"],
+        site_name=record["site"],
+        site_url_user=record["url_user"],
+        status=QueryStatus[record["status"]],
+        query_time=record["query_time"],
+        context=record["context"],
+        http_status=record["http_status"] if isinstance(record["http_status"], int) else None,
+    )
+
+
+def collect_results(records: list[dict]) -> dict[str, dict]:
+    """Collect Results.
+
+    Keyword Arguments:
+    records                -- List of JSON records of a search.
+
+    Return Value:
+    Dictionary of username to a results dictionary in the format returned by
+    sherlock(), without the response text, for writing reports.
+    """
+    results = {}
+    for record in records:
+        results.setdefault(record["username"], {})[record["site"]] = {
+            "url_main": record["url_main"],
+            "url_user": record["url_user"],
+            "status": record_result(record),
+            "http_status": record["http_status"],
+        }
+    return results
+
+
+class RedisJobQueue:
+    """Redis Job Queue Object.
+
+    Holds the queue of jobs, and the state and results of each search.
+    """
+
+    def __init__(self, client, prefix: str = DEFAULT_PREFIX, ttl: int = SEARCH_TTL,
+                 visibility_timeout: float = DEFAULT_VISIBILITY_TIMEOUT,
+                 stall_timeout: float = DEFAULT_STALL_TIMEOUT):
+        """Create Redis Job Queue Object.
+
+        Keyword Arguments:
+        self                   -- This object.
+        client                 -- redis.Redis() object, or any object with the
+                                  same interface.  The server must be Redis
+                                  6.2 or later, for BLMOVE.
+        prefix                 -- String prefixed to every key.
+        ttl                    -- Time (in seconds) the state and results of
+                                  a search are kept.
+        visibility_timeout     -- Time (in seconds) a job is leased to the
+                                  worker which took it, before it is queued
+                                  again.
+        stall_timeout          -- Time (in seconds) without a completed job
+                                  after which a search is incomplete.
+
+        Return Value:
+        Nothing.
+        """
+        self.client = client
+        self.prefix = prefix
+        self.ttl = ttl
+        self.visibility_timeout = visibility_timeout
+        self.stall_timeout = stall_timeout
+
+        return
+
+    @classmethod
+    def from_url(cls, url: str, **kwargs) -> "RedisJobQueue":
+        """Create a queue connected to the Redis server at a URL."""
+        # Optional; only needed by distributed deployments.
+        import redis
+
+        return cls(redis.Redis.from_url(url), **kwargs)
+
+    @property
+    def jobs_key(self) -> str:
+        return f"{self.prefix}:jobs"
+
+    @property
+    def processing_key(self) -> str:
+        return f"{self.prefix}:processing"
+
+    @property
+    def leases_key(self) -> str:
+        return f"{self.prefix}:leases"
+
+    @property
+    def leased_key(self) -> str:
+        return f"{self.prefix}:leased"
+
+    def search_key(self, search_id: str) -> str:
+        return f"{self.prefix}:search:{search_id}"
+
+    def results_key(self, search_id: str) -> str:
+        return f"{self.prefix}:search:{search_id}:results"
+
+    def events_channel(self, search_id: str) -> str:
+        return f"{self.prefix}:search:{search_id}:events"
+
+    def submit(self, search_id: str, usernames: list[str], shards: int = DEFAULT_SHARDS,
+               site_list: Optional[list[str]] = None, nsfw: bool = False,
+               proxy: Optional[str] = None, timeout: float = 60) -> int:
+        """Submit Search.
+
+        Keyword Arguments:
+        self                   -- This object.
+        search_id              -- String identifying the search.
+        usernames              -- List of strings indicating usernames to
+                                  search for.
+        shards                 -- Number of jobs each username is split into.
+        site_list              -- List of site names to limit the search to.
+                                  Default of None for all sites.
+        nsfw                   -- Boolean indicating whether to include NSFW
+                                  sites.
+        proxy                  -- String indicating the proxy URL.
+        timeout                -- Time in seconds to wait before timing out
+                                  request.
+
+        Return Value:
+        Number of jobs queued.
+        """
+        jobs = [
+            json.dumps({
+                "id": uuid.uuid4().hex,
+                "search_id": search_id,
+                "username": username,
+                "shard": shard,
+                "shards": shards,
+                "site_list": site_list,
+                "nsfw": nsfw,
+                "proxy": proxy,
+                "timeout": timeout,
+            })
+            for username in usernames
+            for shard in range(shards)
+        ]
+
+        pipeline = self.client.pipeline()
+        now = time.time()
+        pipeline.hset(self.search_key(search_id), mapping={
+            "usernames": json.dumps(usernames),
+            "jobs_total": len(jobs),
+            "jobs_done": 0,
+            "created": now,
+            "updated": now,
+        })
+        pipeline.expire(self.search_key(search_id), self.ttl)
+        if jobs:
+            pipeline.lpush(self.jobs_key, *jobs)
+        pipeline.execute()
+
+        return len(jobs)
+
+    def next_job(self, timeout: float = 5) -> Optional[dict]:
+        """Next Job.
+
+        Takes the next job from the queue, and leases it to the caller, who
+        must renew() the lease until it calls complete().  Jobs whose lease
+        has run out are queued again first.
+
+        Keyword Arguments:
+        self                   -- This object.
+        timeout                -- Time (in seconds) to wait for a job.
+
+        Return Value:
+        Dictionary of the job, or None if there was none in time.
+        """
+        self.requeue_expired()
+        # The job is moved in one step, so that it is never out of Redis.
+        raw = self.client.blmove(self.jobs_key, self.processing_key, timeout, "RIGHT", "LEFT")
+        if raw is None:
+            return None
+        job = json.loads(raw)
+        pipeline = self.client.pipeline()
+        pipeline.hset(self.leased_key, job["id"], raw)
+        pipeline.zadd(self.leases_key, {job["id"]: time.time() + self.visibility_timeout})
+        pipeline.execute()
+        return job
+
+    def renew(self, job: dict) -> bool:
+        """Renew the lease of a job taken by next_job(), returning whether it was still held."""
+        return self.client.zadd(
+            self.leases_key, {job["id"]: time.time() + self.visibility_timeout}, xx=True, ch=True,
+        ) > 0
+
+    def requeue_expired(self) -> int:
+        """Requeue Expired.
+
+        Queues again the jobs whose lease has run out.
+
+        Keyword Arguments:
+        self                   -- This object.
+
+        Return Value:
+        Number of jobs queued again.
+        """
+        now = time.time()
+        # A worker which died between taking a job and leasing it left no
+        # lease, so the job is leased to nobody from now on.
+        for raw in self.client.lrange(self.processing_key, 0, -1):
+            job_id = json.loads(raw)["id"]
+            pipeline = self.client.pipeline()
+            pipeline.hsetnx(self.leased_key, job_id, raw)
+            pipeline.zadd(self.leases_key, {job_id: now + self.visibility_timeout}, nx=True)
+            pipeline.execute()
+
+        requeued = 0
+        for job_id in self.client.zrangebyscore(self.leases_key, 0, now):
+            # Whoever removes the lease requeues the job, so it is queued
+            # once however many workers look.
+            if not self.client.zrem(self.leases_key, job_id):
+                continue
+            raw = self.client.hget(self.leased_key, job_id)
+            if raw is None:
+                continue
+            pipeline = self.client.pipeline()
+            pipeline.lrem(self.processing_key, 1, raw)
+            pipeline.hdel(self.leased_key, job_id)
+            # Taken before the jobs queued after it
+            pipeline.rpush(self.jobs_key, raw)
+            pipeline.execute()
+            requeued += 1
+
+        return requeued
+
+    def complete(self, job: dict, records: list[dict], error: Optional[str] = None) -> bool:
+        """Complete Job.
+
+        Stores the results of a job, and tells listeners about them.
+
+        Keyword Arguments:
+        self                   -- This object.
+        job                    -- Dictionary of the job, as returned by
+                                  next_job().
+        records                -- List of JSON records of the results.
+        error                  -- String describing why the job failed.
+                                  Default of None if it succeeded.
+
+        Return Value:
+        Boolean indicating whether the results were stored.  They are not if
+        the lease of the job ran out, as it was queued again, or if the job
+        was completed already.
+        """
+        raw = self.client.hget(self.leased_key, job["id"])
+        pipeline = self.client.pipeline()
+        pipeline.zrem(self.leases_key, job["id"])
+        pipeline.hdel(self.leased_key, job["id"])
+        if raw is not None:
+            pipeline.lrem(self.processing_key, 1, raw)
+        if not pipeline.execute()[0]:
+            return False
+
+        search_id = job["search_id"]
+        pipeline = self.client.pipeline()
+        if records:
+            pipeline.rpush(self.results_key(search_id), *[json.dumps(record) for record in records])
+            pipeline.expire(self.results_key(search_id), self.ttl)
+        for status, count in Counter(record["status"] for record in records).items():
+            pipeline.hincrby(self.search_key(search_id), f"count:{status}", count)
+        if error is not None:
+            pipeline.hset(self.search_key(search_id), "error", error)
+        pipeline.hincrby(self.search_key(search_id), "jobs_done", 1)
+        pipeline.hset(self.search_key(search_id), "updated", time.time())
+        pipeline.publish(self.events_channel(search_id), json.dumps({
+            "job": job["id"], "results": len(records), "error": error,
+        }))
+        pipeline.execute()
+
+        return True
+
+    def progress(self, search_id: str, start: int = 0) -> Optional[dict]:
+        """Get Progress.
+
+        Keyword Arguments:
+        self                   -- This object.
+        search_id              -- String identifying the search.
+        start                  -- Index of the first result record to return.
+
+        Return Value:
+        Dictionary with the "status" of the search ("running", "completed",
+        "error", or "incomplete" if no job has completed for stall_timeout),
+        its "usernames", "jobs_total" and "jobs_done", the "error" of a
+        failed job if any, the "counts" of results of each QueryStatus() so
+        far, and the result "records" from start on.
+        None if the search is not known.
+        """
+        pipeline = self.client.pipeline()
+        pipeline.hgetall(self.search_key(search_id))
+        pipeline.lrange(self.results_key(search_id), start, -1)
+        state, records = pipeline.execute()
+        if not state:
+            return None
+
+        state = {key.decode() if isinstance(key, bytes) else key:
+                 value.decode() if isinstance(value, bytes) else value
+                 for key, value in state.items()}
+        jobs_total = int(state["jobs_total"])
+        jobs_done = int(state["jobs_done"])
+        error = state.get("error")
+
+        status = "running"
+        if jobs_done >= jobs_total:
+            status = "error" if error is not None else "completed"
+        elif time.time() - float(state.get("updated", state["created"])) > self.stall_timeout:
+            status = "incomplete"
+            error = error or f"No progress for {self.stall_timeout:g} seconds, {jobs_done} of {jobs_total} jobs done"
+
+        return {
+            "status": status,
+            "usernames": json.loads(state["usernames"]),
+            "jobs_total": jobs_total,
+            "jobs_done": jobs_done,
+            "error": error,
+            "counts": {
+                QueryStatus[key[len("count:"):]]: int(value)
+                for key, value in state.items() if key.startswith("count:")
+            },
+            "records": [json.loads(record) for record in records],
+        }
+
+
+class ScanWorker:
+    """Scan Worker Object.
+
+    Runs jobs from a RedisJobQueue() with the engine of a SearchRunner(),
+    sharing its manifest and session between jobs.
+    """
+
+    def __init__(self, queue: RedisJobQueue, runner: SearchRunner):
+        """Create Scan Worker Object.
+
+        Keyword Arguments:
+        self                   -- This object.
+        queue                  -- RedisJobQueue() object to take jobs from.
+        runner                 -- SearchRunner() object providing the sites
+                                  and session.
+
+        Return Value:
+        Nothing.
+        """
+        self.queue = queue
+        self.runner = runner
+
+        return
+
+    def run_job(self, job: dict):
+        """Run one job, and complete it with its results or its error."""
+        finished = threading.Event()
+
+        def renew():
+            while not finished.wait(self.queue.visibility_timeout / 3):
+                self.queue.renew(job)
+
+        threading.Thread(target=renew, name="sherlock-lease", daemon=True).start()
+        try:
+            self._run_job(job)
+        finally:
+            finished.set()
+
+    def _run_job(self, job: dict):
+        """Run one job, while run_job() renews its lease."""
+        try:
+            site_data = shard_sites(
+                self.runner.site_data(job["site_list"], nsfw=job["nsfw"]),
+                job["shard"], job["shards"],
+            )
+            results = sherlock(
+                job["username"], site_data, QueryNotify(), proxy=job["proxy"],
+                timeout=job["timeout"], session=self.runner.session,
+                latencies=self.runner.latencies,
+                retry_policy=self.runner.retry_policy,
+            )
+        except Exception as error:  # noqa: BLE001 - reported with the search
+            self.queue.complete(job, [], error=f"{type(error).__name__}: {error}")
+            return
+
+        self.queue.complete(job, [
+            result_record(job["username"], site, results_site)
+            for site, results_site in results.items()
+        ])
+
+        return
+
+    def run(self, stop: Optional[threading.Event] = None, poll: float = 5):
+        """Run Worker.
+
+        Keyword Arguments:
+        self                   -- This object.
+        stop                   -- threading.Event() which stops the worker once
+                                  set.  Default of None to run forever.
+        poll                   -- Time (in seconds) to wait for a job before
+                                  checking whether to stop.
+
+        Return Value:
+        Nothing.
+        """
+        while stop is None or not stop.is_set():
+            job = self.queue.next_job(timeout=poll)
+            if job is not None:
+                self.run_job(job)
+
+        return
+
+
+def main():
+    parser = ArgumentParser(
+        description="Sherlock worker: run search jobs queued in Redis."
+    )
+    parser.add_argument(
+        "--redis-url",
+        dest="redis_url",
+        default=os.environ.get("REDIS_URL"),
+        help="URL of the Redis server (Default: $REDIS_URL)",
+    )
+    parser.add_argument(
+        "--prefix",
+        dest="prefix",
+        default=DEFAULT_PREFIX,
+        help=f"Prefix of the Redis keys (Default: {DEFAULT_PREFIX})",
+    )
+    parser.add_argument(
+        "--jobs",
+        dest="jobs",
+        type=int,
+        default=4,
+        help="Number of jobs to run at the same time (Default: 4)",
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        dest="max_concurrency",
+        type=int,
+        default=None,
+        help="Maximum number of requests in flight for all jobs together",
+    )
+    parser.add_argument(
+        "--circuit-breaker",
+        metavar="FAILURES",
+        dest="circuit_breaker",
+        type=int,
+        default=int(os.environ.get("CIRCUIT_BREAKER", 0)),
+        help="Skip a host for a while after this many consecutive connection errors or timeouts, "
+        "reporting its sites as unknown. 0 never skips a host (Default: $CIRCUIT_BREAKER or 0)",
+    )
+    parser.add_argument(
+        "--adaptive-timeouts",
+        action=BooleanOptionalAction,
+        dest="adaptive_timeouts",
+        default=bool(os.environ.get("ADAPTIVE_TIMEOUTS")),
+        help="Wait on each site for a timeout derived from its latencies so far, "
+        "rather than the full timeout of the search (Default: off, unless $ADAPTIVE_TIMEOUTS is set)",
+    )
+    args = parser.parse_args()
+
+    if not args.redis_url:
+        parser.error("a Redis URL is required, with --redis-url or $REDIS_URL")
+
+    queue = RedisJobQueue.from_url(args.redis_url, prefix=args.prefix)
+    kwargs = {} if args.max_concurrency is None else {"max_concurrency": args.max_concurrency}
+    if args.circuit_breaker:
+        kwargs["scheduler"] = HostScheduler(failure_threshold=args.circuit_breaker)
+    if args.adaptive_timeouts:
+        kwargs["latencies"] = LatencyTracker()
+    runner = SearchRunner(**kwargs)
+
+    threads = [
+        threading.Thread(target=ScanWorker(queue, runner).run, name=f"sherlock-worker-{i}")
+        for i in range(max(args.jobs, 1))
+    ]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,350 @@
+"""Sherlock Export Module
+
+This module writes the results of a username search to report files.  The
+writers are query notify objects, so each result is written as soon as it
+arrives, and a report is complete on disk once its username is done.
+"""
+import csv
+import json
+import os
+from abc import ABC, abstractmethod
+from contextlib import ExitStack
+from typing import Optional
+
+from sherlock_project.notify import QueryNotify
+from sherlock_project.result import QueryResult, QueryStatus
+
+# Columns of the csv, ndjson and xlsx reports.
+REPORT_COLUMNS = [
+    "username",
+    "name",
+    "url_main",
+    "url_user",
+    "exists",
+    "http_status",
+    "response_time_s",
+]
+
+
+def report_sites(results: dict, found_only: bool = False) -> list[str]:
+    """Get the sites to report, optionally only those where the username was found."""
+    return [
+        site for site in results
+        if not found_only or results[site]["status"].status == QueryStatus.CLAIMED
+    ]
+
+
+class ReportWriter(QueryNotify, ABC):
+    """Report Writer Object.
+
+    Base class of the query notify classes which write one report file per
+    username.  The file of a username is opened when its queries start, each
+    result is added to it as it arrives, and it is closed when the next
+    username starts or the queries finish.  Callers must finish() the writer
+    even if the queries fail, so that the open file is closed.
+    """
+
+    # File name extension of the reports, set by each subclass.
+    extension = None
+
+    def __init__(self, folder: Optional[str] = None, path: Optional[str] = None,
+                 url_mains: Optional[dict] = None, found_only: bool = False):
+        """Create Report Writer Object.
+
+        Keyword Arguments:
+        self                   -- This object.
+        folder                 -- String containing path of folder to write
+                                  the report of each username to, as
+                                  "<username>.<extension>".  It is created if
+                                  needed.  Default of None for the current
+                                  directory.
+        path                   -- String containing path of file to write
+                                  every report to, instead of one file per
+                                  username in folder.  Default of None.
+        url_mains              -- Dictionary of the URL of the main page of
+                                  each site, by site name.  Default of None.
+        found_only             -- Boolean indicating whether to only report the
+                                  sites where the username was found.
+
+        Return Value:
+        Nothing.
+        """
+
+        super().__init__()
+        self.folder = folder
+        self.path = path
+        self.url_mains = url_mains or {}
+        self.found_only = found_only
+        self.username = None
+        self.file = None
+        # Holds the open report file, closed by close().
+        self.files = ExitStack()
+
+        return
+
+    def report_path(self, username: str) -> str:
+        """Get the path of the report file of a username."""
+        if self.path is not None:
+            return self.path
+        if self.folder:
+            os.makedirs(self.folder, exist_ok=True)
+            return os.path.join(self.folder, f"{username}.{self.extension}")
+        return f"{username}.{self.extension}"
+
+    def row(self, result: QueryResult) -> list:
+        """Get the values of the REPORT_COLUMNS of a result."""
+        return [
+            result.username,
+            result.site_name,
+            self.url_mains.get(result.site_name, ""),
+            # There is no profile of a username the site does not allow.
+            "" if result.status == QueryStatus.ILLEGAL else result.site_url_user,
+            str(result.status),
+            result.http_status,
+            result.query_time,
+        ]
+
+    def start(self, message=None):
+        """Notify Start.
+
+        Keyword Arguments:
+        self                   -- This object.
+        message                -- String containing username that the series
+                                  of queries are about.
+
+        Return Value:
+        Nothing.
+        """
+        self.close()
+        self.username = message
+        self.open(self.report_path(message))
+
+        return
+
+    def update(self, result):
+        """Notify Update.
+
+        Keyword Arguments:
+        self                   -- This object.
+        result                 -- Object of type QueryResult() containing
+                                  results for this query.
+
+        Return Value:
+        Nothing.
+        """
+        self.result = result
+        if self.found_only and result.status != QueryStatus.CLAIMED:
+            return
+        self.write(result)
+
+        return
+
+    def finish(self, message=None):
+        """Notify Finish.
+
+        Keyword Arguments:
+        self                   -- This object.
+        message                -- Object that is used to give context to the
+                                  finish of the queries.
+                                  Default is None.
+
+        Return Value:
+        Nothing.
+        """
+        self.close()
+
+        return
+
+    def open_file(self, path: str, **kwargs):
+        """Open a text file at path for writing, to be closed by close()."""
+        # The file stays open across notifications, so it is entered into
+        # self.files rather than a with block.
+        return self.files.enter_context(open(path, "w", encoding="utf-8", **kwargs))
+
+    @abstractmethod
+    def open(self, path: str):
+        """Open the report file at path, as self.file, through self.files."""
+
+    @abstractmethod
+    def write(self, result: QueryResult):
+        """Add a result to the open report file."""
+
+    def close(self):
+        """Complete and close the open report file, if any."""
+        self.files.close()
+        self.file = None
+
+
+class TxtWriter(ReportWriter):
+    """Text Report Writer Object.
+
+    Writes the URL of each site where the username was found, followed by
+    the number of them.
+    """
+
+    extension = "txt"
+
+    def open(self, path: str):
+        self.file = self.open_file(path)
+        self.exists_counter = 0
+
+    def write(self, result: QueryResult):
+        if result.status == QueryStatus.CLAIMED:
+            self.exists_counter += 1
+            self.file.write(result.site_url_user + "\n")
+            self.file.flush()
+
+    def close(self):
+        if self.file is not None:
+            self.file.write(f"Total Websites Username Detected On : {self.exists_counter}\n")
+        super().close()
+
+
+class CsvWriter(ReportWriter):
+    """CSV Report Writer Object."""
+
+    extension = "csv"
+
+    def open(self, path: str):
+        self.file = self.open_file(path, newline="")
+        self.writer = csv.writer(self.file)
+        self.writer.writerow(REPORT_COLUMNS)
+
+    def write(self, result: QueryResult):
+        self.writer.writerow(["" if value is None else value for value in self.row(result)])
+        self.file.flush()
+
+
+class NdjsonWriter(ReportWriter):
+    """NDJSON Report Writer Object.
+
+    Writes each result as a JSON object of the REPORT_COLUMNS, one per line.
+    """
+
+    extension = "ndjson"
+
+    def open(self, path: str):
+        self.file = self.open_file(path)
+
+    def write(self, result: QueryResult):
+        self.file.write(json.dumps(dict(zip(REPORT_COLUMNS, self.row(result)))) + "\n")
+        self.file.flush()
+
+
+class XlsxWriter(ReportWriter):
+    """Excel Report Writer Object.
+
+    Writes a workbook in write-only mode, which keeps its rows on disk
+    rather than in memory.  The workbook is only a valid spreadsheet once it
+    is closed.
+    """
+
+    extension = "xlsx"
+
+    def open(self, path: str):
+        # openpyxl takes a while to import, so only runs which write a
+        # spreadsheet import it.
+        from openpyxl import Workbook
+
+        self.file = Workbook(write_only=True)
+        self.sheet = self.file.create_sheet("sheet1")
+        self.sheet.append(REPORT_COLUMNS)
+        self.files.callback(self.file.save, path)
+
+    def write(self, result: QueryResult):
+        row = self.row(result)
+        # Links are written as formulas, so that they can be clicked.
+        row[2] = f'=HYPERLINK("{row[2]}")'
+        row[3] = f'=HYPERLINK("{row[3]}")'
+        self.sheet.append(row)
+
+
+def write_report(writer: ReportWriter, username: Optional[str], results: dict):
+    """Write Report.
+
+    Keyword Arguments:
+    writer                 -- ReportWriter() object to write the report with.
+    username               -- String indicating username that was queried.
+    results                -- Dictionary of results returned by sherlock().
+
+    Return Value:
+    Nothing.
+    """
+    writer.url_mains = {site: results[site]["url_main"] for site in results}
+    writer.start(username)
+    try:
+        for site in results:
+            writer.update(results[site]["status"])
+    finally:
+        writer.finish()
+
+    return
+
+
+def write_txt(results: dict, path: str):
+    """Write Text Report.
+
+    Keyword Arguments:
+    results                -- Dictionary of results returned by sherlock().
+    path                   -- String containing path of file to write.
+
+    Return Value:
+    Nothing.
+    """
+    write_report(TxtWriter(path=path), None, results)
+
+    return
+
+
+def write_csv(username: str, results: dict, path: str, found_only: bool = False):
+    """Write CSV Report.
+
+    Keyword Arguments:
+    username               -- String indicating username that was queried.
+    results                -- Dictionary of results returned by sherlock().
+    path                   -- String containing path of file to write.
+    found_only             -- Boolean indicating whether to only report the
+                              sites where the username was found.
+
+    Return Value:
+    Nothing.
+    """
+    write_report(CsvWriter(path=path, found_only=found_only), username, results)
+
+    return
+
+
+def write_ndjson(username: str, results: dict, path: str, found_only: bool = False):
+    """Write NDJSON Report.
+
+    Keyword Arguments:
+    username               -- String indicating username that was queried.
+    results                -- Dictionary of results returned by sherlock().
+    path                   -- String containing path of file to write.
+    found_only             -- Boolean indicating whether to only report the
+                              sites where the username was found.
+
+    Return Value:
+    Nothing.
+    """
+    write_report(NdjsonWriter(path=path, found_only=found_only), username, results)
+
+    return
+
+
+def write_xlsx(username: str, results: dict, path: str, found_only: bool = False):
+    """Write Excel Report.
+
+    Keyword Arguments:
+    username               -- String indicating username that was queried.
+    results                -- Dictionary of results returned by sherlock().
+    path                   -- String containing path of file to write.
+    found_only             -- Boolean indicating whether to only report the
+                              sites where the username was found.
+
+    Return Value:
+    Nothing.
+    """
+    write_report(XlsxWriter(path=path, found_only=found_only), username, results)
+
+    return
@@ -0,0 +1,147 @@
+"""Sherlock Latency Module
+
+This module learns how long each site takes to answer, so that a site which
+usually answers within a second is given up on within seconds when it
+hangs, rather than after the full timeout.  Latencies are kept in a small
+histogram per site, which may be saved and loaded again by the next run.
+"""
+import bisect
+import threading
+from typing import Optional, Union
+
+# Upper bounds (in seconds) of the histogram buckets, growing by a quarter
+# from 10 ms to a few minutes.  Slower answers fall in a last open bucket.
+BUCKET_BOUNDS = tuple(0.01 * 1.25 ** i for i in range(56))
+
+# Number of latencies a site needs before its timeout is adapted.
+MIN_SAMPLES = 5
+
+# Number of latencies kept per site.  Older ones are given less weight once
+# there are more, so that the histogram follows a site which slows down.
+MAX_SAMPLES = 1000
+
+# Quantile of the latencies of a site its timeout is derived from.
+TIMEOUT_QUANTILE = 0.99
+
+# Default time (in seconds) added to the quantile, so that a site is not
+# given up on as soon as it is a little slower than usual.
+DEFAULT_TIMEOUT_MARGIN = 2.0
+
+Timeout = Union[float, tuple[float, float]]
+
+
+class LatencyTracker:
+    """Latency Tracker Object.
+
+    Keeps a histogram of the latencies of each site, and derives the
+    timeouts of its requests from them.  It may be shared by any number of
+    threads.
+    """
+
+    def __init__(self, margin: float = DEFAULT_TIMEOUT_MARGIN,
+                 state: Optional[dict] = None):
+        """Create Latency Tracker Object.
+
+        Keyword Arguments:
+        self                   -- This object.
+        margin                 -- Time (in seconds) added to the 99th
+                                  percentile of a site's latencies to get its
+                                  timeout.
+        state                  -- Dictionary returned by state(), to carry on
+                                  with the latencies of an earlier run.
+                                  Default of None.
+
+        Return Value:
+        Nothing.
+        """
+        self.margin = margin
+        self._histograms = {}
+        self._lock = threading.Lock()
+
+        self.load_state(state or {})
+
+        return
+
+    def load_state(self, state: dict):
+        """Carry on with the histograms of a dictionary returned by state(), replacing those of its sites."""
+        histograms = {
+            site: [int(count) for count in counts]
+            for site, counts in state.items()
+            if isinstance(counts, list) and len(counts) == len(BUCKET_BOUNDS) + 1
+        }
+        with self._lock:
+            self._histograms.update(histograms)
+
+    def observe(self, site: str, latency: float):
+        """Record the latency (in seconds) of an answer of a site."""
+        index = bisect.bisect_left(BUCKET_BOUNDS, latency)
+        with self._lock:
+            counts = self._histograms.get(site)
+            if counts is None:
+                counts = self._histograms[site] = [0] * (len(BUCKET_BOUNDS) + 1)
+            counts[index] += 1
+            if sum(counts) > MAX_SAMPLES:
+                self._histograms[site] = [count // 2 for count in counts]
+
+    def quantile(self, site: str, quantile: float) -> Optional[float]:
+        """Quantile.
+
+        Keyword Arguments:
+        self                   -- This object.
+        site                   -- String which identifies site.
+        quantile               -- Number between 0 and 1.
+
+        Return Value:
+        Upper bound (in seconds) of the histogram bucket holding the quantile
+        of the site's latencies, or None if there are fewer than MIN_SAMPLES
+        of them.  None as well if it falls in the last, open bucket.
+        """
+        with self._lock:
+            counts = list(self._histograms.get(site, ()))
+        total = sum(counts)
+        if total < MIN_SAMPLES:
+            return None
+
+        seen = 0
+        for index, count in enumerate(counts):
+            seen += count
+            if seen >= quantile * total:
+                return BUCKET_BOUNDS[index] if index < len(BUCKET_BOUNDS) else None
+        return None
+
+    def timeout(self, site: str, ceiling: float,
+                connect_timeout: Optional[float] = None) -> Timeout:
+        """Timeout.
+
+        Keyword Arguments:
+        self                   -- This object.
+        site                   -- String which identifies site.
+        ceiling                -- Time (in seconds) no timeout may exceed,
+                                  such as the --timeout of the run.
+        connect_timeout        -- Time (in seconds) to wait for the connection
+                                  to be made.  Default of None for the same
+                                  timeout as for reading.
+
+        Return Value:
+        Time (in seconds) to wait for the site to answer, or a tuple of the
+        times to wait for the connection and for the answer.
+        """
+        read_timeout = ceiling
+        latency = self.quantile(site, TIMEOUT_QUANTILE)
+        if latency is not None:
+            read_timeout = min(ceiling, latency + self.margin)
+        if connect_timeout is not None:
+            connect_timeout = min(connect_timeout, ceiling)
+        return request_timeout(read_timeout, connect_timeout)
+
+    def state(self) -> dict:
+        """Get the histograms of every site, which may be saved as JSON."""
+        with self._lock:
+            return {site: list(counts) for site, counts in self._histograms.items()}
+
+
+def request_timeout(timeout: float, connect_timeout: Optional[float] = None) -> Timeout:
+    """Get the timeout of a request, as a (connect, read) tuple if a connect timeout is given."""
+    if connect_timeout is None:
+        return timeout
+    return (connect_timeout, timeout)
@@ -0,0 +1,136 @@
+"""Sherlock Matcher Module
+
+This module finds known signatures, such as WAF fingerprints and error
+messages, in response bodies.
+"""
+from typing import Iterable, Optional
+
+try:
+    import ahocorasick
+except ImportError:
+    # Optional; large signature sets fall back to substring scans.
+    ahocorasick = None
+
+
+# As WAFs advance and evolve, they will occasionally block Sherlock and
+# lead to false positives and negatives. Fingerprints should be added
+# here to filter results that fail to bypass WAFs. Fingerprints should
+# be highly targetted. Comment at the end of each fingerprint to
+# indicate target and date fingerprinted.
+WAF_FINGERPRINTS = [
+    r'.loading-spinner{visibility:hidden}body.no-js .challenge-running{display:none}body.dark{background-color:#222;color:#d9d9d9}body.dark a{color:#fff}body.dark a:hover{color:#ee730a;text-decoration:underline}body.dark .lds-ring div{border-color:#999 transparent transparent}body.dark .font-red{color:#b20f03}body.dark', # 2024-05-13 Cloudflare
+    r'<span id="challenge-error-text">', # 2024-11-11 Cloudflare error page
+    r'AwsWafIntegration.forceRefreshToken', # 2024-11-11 Cloudfront (AWS)
+    r'{return l.onPageView}}),Object.defineProperty(r,"perimeterxIdentifiers",{enumerable:' # 2024-04-09 PerimeterX / Human Security
+]
+
+# Kinds of signatures.
+WAF = "waf"
+ERROR = "error"
+
+# Below this many signatures, substring scans (which run at memchr speed)
+# beat an automaton walk over the same text, as measured by
+# devel/benchmark_matcher.py.  Sites of the bundled manifest have at most a
+# handful of signatures, so they are always scanned for substrings; one
+# automaton for the whole manifest, filtered by site, was slower still.
+AUTOMATON_THRESHOLD = 64
+
+
+class SignatureMatcher:
+    """Signature Matcher Object.
+
+    Finds which kinds of signatures occur in a text.  The matcher is built
+    once, and can then be used for any number of texts.  Large signature
+    sets are searched in a single pass with an Aho-Corasick automaton when
+    pyahocorasick is installed, so that the cost of a search does not grow
+    with the number of signatures.
+    """
+
+    def __init__(self, signatures: dict[str, Iterable[str]]):
+        """Create Signature Matcher Object.
+
+        Keyword Arguments:
+        self                   -- This object.
+        signatures             -- Dictionary of signature kind (such as WAF
+                                  or ERROR) to the strings of that kind.
+
+        Return Value:
+        Nothing.
+        """
+        self.signatures = [
+            (kind, signature)
+            for kind, strings in signatures.items()
+            for signature in strings
+        ]
+        self.kinds = {kind for kind, _ in self.signatures}
+        self.max_length = max((len(signature) for _, signature in self.signatures), default=0)
+
+        # An empty signature is in every text.
+        self._always = {}
+        for kind, signature in self.signatures:
+            if not signature:
+                self._always.setdefault(kind, signature)
+
+        self._automaton = None
+        if ahocorasick is not None and len(self.signatures) >= AUTOMATON_THRESHOLD:
+            self._automaton = ahocorasick.Automaton()
+            for kind, signature in self.signatures:
+                if signature:
+                    self._automaton.add_word(signature, (kind, signature))
+            self._automaton.make_automaton()
+
+        return
+
+    def scan(self, text: str) -> dict[str, str]:
+        """Scan Text.
+
+        Keyword Arguments:
+        self                   -- This object.
+        text                   -- String to search.
+
+        Return Value:
+        Dictionary of each signature kind found in the text to the first
+        signature of that kind which matched.
+        """
+        found = dict(self._always)
+        if len(found) == len(self.kinds):
+            return found
+
+        if self._automaton is not None:
+            for _, (kind, signature) in self._automaton.iter(text):
+                if kind not in found:
+                    found[kind] = signature
+                    if len(found) == len(self.kinds):
+                        break
+            return found
+
+        for kind, signature in self.signatures:
+            if kind not in found and signature in text:
+                found[kind] = signature
+
+        return found
+
+    def search(self, text: str) -> Optional[tuple[str, str]]:
+        """Search Text.
+
+        Keyword Arguments:
+        self                   -- This object.
+        text                   -- String to search.
+
+        Return Value:
+        Tuple of the kind and signature of a match, or None if no signature
+        occurs in the text.
+        """
+        for kind, signature in self._always.items():
+            return kind, signature
+
+        if self._automaton is not None:
+            for _, match in self._automaton.iter(text):
+                return match
+            return None
+
+        for kind, signature in self.signatures:
+            if signature in text:
+                return kind, signature
+
+        return None
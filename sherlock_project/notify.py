@@ -3,9 +3,13 @@
 This module defines the objects for notifying the caller about the
 results of queries.
 """
-from sherlock_project.result import QueryStatus
-from colorama import Fore, Style
+import threading
 import webbrowser
+from typing import Optional
+
+from colorama import Fore, Style
+
+from sherlock_project.result import QueryStatus
 
 # Global variable to count the number of results.
 globvar = 0
@@ -108,6 +112,210 @@ class QueryNotify:
         return str(self.result)
 
 
+class QueryNotifyCollect(QueryNotify):
+    """Query Notify Collect Object.
+
+    Query notify class that keeps every result, so that the results can be
+    read while the queries are still running, for example by a web server
+    thread reporting progress.  Readers may wait for new results with
+    wait().
+    """
+
+    def __init__(self, result=None):
+        """Create Query Notify Collect Object.
+
+        Keyword Arguments:
+        self                   -- This object.
+        result                 -- Object of type QueryResult() containing
+                                  results for this query.
+
+        Return Value:
+        Nothing.
+        """
+
+        super().__init__(result)
+        self.usernames = []
+        self.results = []
+        self.counts = {}
+        self.finished = False
+        self._lock = threading.Condition()
+
+        return
+
+    def start(self, message=None):
+        """Notify Start.
+
+        Keyword Arguments:
+        self                   -- This object.
+        message                -- String containing username that the series
+                                  of queries are about.
+
+        Return Value:
+        Nothing.
+        """
+        with self._lock:
+            self.usernames.append(message)
+
+        return
+
+    def update(self, result):
+        """Notify Update.
+
+        Keyword Arguments:
+        self                   -- This object.
+        result                 -- Object of type QueryResult() containing
+                                  results for this query.
+
+        Return Value:
+        Nothing.
+        """
+        with self._lock:
+            self.result = result
+            self.results.append(result)
+            self.counts[result.status] = self.counts.get(result.status, 0) + 1
+            self._lock.notify_all()
+
+        return
+
+    def finish(self, message=None):
+        """Notify Finish.
+
+        Keyword Arguments:
+        self                   -- This object.
+        message                -- Object that is used to give context to the
+                                  finish of the queries.
+                                  Default is None.
+
+        Return Value:
+        Nothing.
+        """
+        with self._lock:
+            self.finished = True
+            self._lock.notify_all()
+
+        return
+
+    def snapshot(self) -> list:
+        """Get a copy of the results collected so far, in the order they arrived."""
+        with self._lock:
+            return list(self.results)
+
+    def since(self, cursor: int = 0) -> tuple[list, dict]:
+        """Since Cursor.
+
+        Keyword Arguments:
+        self                   -- This object.
+        cursor                 -- Number of results the caller already has.
+
+        Return Value:
+        Tuple of the list of results after the first cursor results, and a
+        copy of the number of results of each QueryStatus() so far.
+        """
+        with self._lock:
+            return self.results[cursor:], dict(self.counts)
+
+    def wait(self, since: int = 0, timeout: Optional[float] = None) -> list:
+        """Wait For Results.
+
+        Keyword Arguments:
+        self                   -- This object.
+        since                  -- Number of results the caller already has.
+        timeout                -- Time (in seconds) to wait for a new result.
+                                  Default of None to wait as long as needed.
+
+        Return Value:
+        List of the results after the first since results.  It is empty if
+        the timeout expired, or if the queries have finished and there are
+        no more results.
+        """
+        with self._lock:
+            self._lock.wait_for(
+                lambda: len(self.results) > since or self.finished, timeout=timeout
+            )
+            return self.results[since:]
+
+
+class QueryNotifyGroup(QueryNotify):
+    """Query Notify Group Object.
+
+    Query notify class that passes every notification on to several other
+    query notify objects, in the order they were given, so that results can
+    for example be printed and written to report files as they arrive.
+    """
+
+    def __init__(self, *notifiers):
+        """Create Query Notify Group Object.
+
+        Keyword Arguments:
+        self                   -- This object.
+        notifiers              -- Objects with base type of QueryNotify() to
+                                  notify.
+
+        Return Value:
+        Nothing.
+        """
+
+        super().__init__()
+        self.notifiers = notifiers
+
+        return
+
+    def start(self, message=None):
+        """Notify Start.
+
+        Keyword Arguments:
+        self                   -- This object.
+        message                -- Object that is used to give context to start
+                                  of query.
+                                  Default is None.
+
+        Return Value:
+        Nothing.
+        """
+        for notifier in self.notifiers:
+            notifier.start(message)
+
+        return
+
+    def update(self, result):
+        """Notify Update.
+
+        Keyword Arguments:
+        self                   -- This object.
+        result                 -- Object of type QueryResult() containing
+                                  results for this query.
+
+        Return Value:
+        Nothing.
+        """
+        self.result = result
+        for notifier in self.notifiers:
+            notifier.update(result)
+
+        return
+
+    def finish(self, message=None):
+        """Notify Finish.
+
+        Keyword Arguments:
+        self                   -- This object.
+        message                -- Object that is used to give context to the
+                                  finish of the queries.
+                                  Default of None for each object's own
+                                  default.
+
+        Return Value:
+        Nothing.
+        """
+        for notifier in self.notifiers:
+            if message is None:
+                notifier.finish()
+            else:
+                notifier.finish(message)
+
+        return
+
+
 class QueryNotifyPrint(QueryNotify):
     """Query Notify Print Object.
 
@@ -197,6 +405,8 @@ class QueryNotifyPrint(QueryNotify):
         response_time_text = ""
         if self.result.query_time is not None and self.verbose is True:
             response_time_text = f" [{round(self.result.query_time * 1000)}ms]"
+        if self.verbose is True and (self.result.retries or self.result.hedges):
+            response_time_text += f" [{self.result.retries} retries, {self.result.hedges} hedged]"
 
         # Output to the terminal is desired.
         if result.status == QueryStatus.CLAIMED:
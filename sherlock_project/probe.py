@@ -0,0 +1,248 @@
+"""Sherlock Probe Module
+
+This module compiles the manifest entry of a site into a probe plan.  Every
+part of a probe which does not depend on the username is worked out once,
+when the manifest is loaded, so that querying a username only has to fill
+in the templates of the plan.
+"""
+import hashlib
+import json
+import re
+from dataclasses import dataclass
+from functools import lru_cache
+from types import MappingProxyType
+from typing import Any, Mapping, Optional
+
+from sherlock_project.matcher import ERROR, WAF, WAF_FINGERPRINTS, SignatureMatcher
+from sherlock_project.scheduler import host_key
+
+# A user agent is needed because some sites don't return the correct
+# information since they think that we are bots (Which we actually are...)
+DEFAULT_HEADERS = {
+    "User-Agent": "Mozilla/5.0 (X11; Linux x86_64; rv:129.0) Gecko/20100101 Firefox/129.0",
+}
+
+# Request methods which may be given as "request_method" in the manifest.
+REQUEST_METHODS = ("GET", "HEAD", "POST", "PUT")
+
+
+def interpolate_string(input_object, username):
+    if isinstance(input_object, str):
+        return input_object.replace("{}", username)
+    elif isinstance(input_object, dict):
+        return {k: interpolate_string(v, username) for k, v in input_object.items()}
+    elif isinstance(input_object, list):
+        return [interpolate_string(i, username) for i in input_object]
+    return input_object
+
+
+def freeze(value):
+    """Get a read-only copy of a JSON value, with dictionaries as MappingProxyType() and lists as tuples."""
+    if isinstance(value, Mapping):
+        return MappingProxyType({key: freeze(item) for key, item in value.items()})
+    if isinstance(value, (list, tuple)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+def thaw(value):
+    """Get a plain copy of a value returned by freeze(), with dictionaries and lists again."""
+    if isinstance(value, Mapping):
+        return {key: thaw(item) for key, item in value.items()}
+    if isinstance(value, (list, tuple)):
+        return [thaw(item) for item in value]
+    return value
+
+
+def has_placeholder(input_object) -> bool:
+    """Check whether an object holds a "{}" placeholder anywhere within it."""
+    if isinstance(input_object, str):
+        return "{}" in input_object
+    elif isinstance(input_object, dict):
+        return any(has_placeholder(v) for v in input_object.values())
+    elif isinstance(input_object, list):
+        return any(has_placeholder(i) for i in input_object)
+    return False
+
+
+@lru_cache(maxsize=None)
+def site_matcher(error_msgs: tuple[str, ...] = ()) -> SignatureMatcher:
+    """Get Site Matcher.
+
+    Builds the matcher for the WAF fingerprints and a site's error messages
+    once, and shares it between every site with the same error messages.
+
+    Keyword Arguments:
+    error_msgs             -- Tuple of strings containing the error messages
+                              of the site.
+
+    Return Value:
+    SignatureMatcher() object.
+    """
+    return SignatureMatcher({WAF: WAF_FINGERPRINTS, ERROR: error_msgs})
+
+
+def error_messages(net_info) -> tuple[str, ...]:
+    """Get the error messages of a site as a tuple, whether one or many."""
+    errors = net_info.get("errorMsg")
+    if errors is None:
+        return ()
+    if isinstance(errors, str):
+        return (errors,)
+    return tuple(errors)
+
+
+def entry_revision(net_info) -> str:
+    """Get a short hash of a manifest entry, which changes whenever the entry does."""
+    canonical = json.dumps(thaw(net_info), sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(canonical.encode("utf-8")).hexdigest()[:16]
+
+
+@dataclass(frozen=True)
+class ProbePlan:
+    """Probe Plan Object.
+
+    Describes how to probe a site for any username.  Plans are immutable,
+    so that a single plan may be shared by every query of the site, from
+    any number of threads.
+    """
+
+    name: str
+    url_main: Optional[str]
+    url_parts: tuple[str, ...]
+    probe_parts: Optional[tuple[str, ...]]
+    method: str
+    headers: Mapping[str, str]
+    allow_redirects: bool
+    regex: Optional[re.Pattern]
+    payload: Any
+    payload_templated: bool
+    error_type: tuple[str, ...]
+    error_codes: Optional[tuple[int, ...]]
+    matcher: SignatureMatcher
+    stream: bool
+    max_body_bytes: Optional[int]
+    host_key: str
+    rate_limit: Mapping[str, Any]
+    information: Mapping[str, Any]
+    revision: str
+
+    @classmethod
+    def compile(cls, name: str, net_info: Mapping[str, Any]) -> "ProbePlan":
+        """Compile Probe Plan.
+
+        Keyword Arguments:
+        cls                    -- This class.
+        name                   -- String which identifies site.
+        net_info               -- Dictionary containing the manifest entry of
+                                  the site.  It is never modified.
+
+        Return Value:
+        ProbePlan() object.  A KeyError is raised if the entry lacks an
+        attribute required for probing, and a re.error if its regexCheck is
+        not a valid regular expression.
+        """
+        raw_error_type = net_info["errorType"]
+        error_type = (raw_error_type,) if isinstance(raw_error_type, str) else tuple(raw_error_type)
+
+        headers = dict(DEFAULT_HEADERS)
+        if "headers" in net_info:
+            # Override/append any extra headers required by a given site.
+            headers.update(net_info["headers"])
+
+        method = net_info.get("request_method")
+        if method is None:
+            if raw_error_type == "status_code":
+                # In most cases when we are detecting by status code,
+                # it is not necessary to get the entire body:  we can
+                # detect fine with just the HEAD response.
+                method = "HEAD"
+            else:
+                # Either this detect method needs the content associated
+                # with the GET response, or this specific website will
+                # not respond properly unless we request the whole page.
+                method = "GET"
+
+        error_codes = net_info.get("errorCode")
+        if error_codes is not None:
+            # Type consistency, allowing for both singlets and lists in manifest
+            error_codes = (error_codes,) if isinstance(error_codes, int) else tuple(error_codes)
+
+        regex_check = net_info.get("regexCheck")
+        url_probe = net_info.get("urlProbe")
+        payload = thaw(net_info.get("request_payload"))
+
+        if "message" in error_type:
+            matcher = site_matcher(error_messages(net_info))
+        else:
+            matcher = site_matcher()
+
+        return cls(
+            name=name,
+            url_main=net_info.get("urlMain"),
+            url_parts=tuple(net_info["url"].split("{}")),
+            probe_parts=None if url_probe is None else tuple(url_probe.split("{}")),
+            method=method,
+            headers=freeze(headers),
+            # Sites which forward the request to a different URL if the
+            # username is not found are probed without following redirects,
+            # so that the http status of the original URL is captured.
+            allow_redirects=raw_error_type != "response_url",
+            regex=re.compile(regex_check) if regex_check else None,
+            payload=freeze(payload),
+            payload_templated=has_placeholder(payload),
+            error_type=error_type,
+            error_codes=error_codes,
+            matcher=matcher,
+            # Stream the body of sites which are decided by its content, or
+            # which cap the number of bytes read.
+            stream="message" in error_type or "maxBodyBytes" in net_info,
+            max_body_bytes=net_info.get("maxBodyBytes"),
+            host_key=host_key(url_probe or net_info["url"]),
+            rate_limit=freeze(net_info.get("rateLimit", {})),
+            # The plan is shared by every search, so its entry is read-only
+            # all the way down.
+            information=freeze(net_info),
+            revision=entry_revision(net_info),
+        )
+
+    def allows(self, username: str) -> bool:
+        """Check whether the site accepts the username at all."""
+        return self.regex is None or self.regex.search(username) is not None
+
+    def user_url(self, username: str) -> str:
+        """Get the URL of the user's profile on the site."""
+        return username.replace(' ', '%20').join(self.url_parts)
+
+    def probe_url(self, username: str) -> str:
+        """Get the URL requested to probe for the user."""
+        if self.probe_parts is None:
+            # Probe URL is normal one seen by people out on the web.
+            return self.user_url(username)
+        # There is a special URL for probing existence separate
+        # from where the user profile normally can be found.
+        return username.join(self.probe_parts)
+
+    def request_payload(self, username: str):
+        """Get the JSON body sent with the probe, if any, as a copy the caller may change."""
+        if not self.payload_templated:
+            return thaw(self.payload)
+        return interpolate_string(thaw(self.payload), username)
+
+
+def compile_plans(site_data: Mapping[str, Any]) -> dict[str, ProbePlan]:
+    """Compile Probe Plans.
+
+    Keyword Arguments:
+    site_data              -- Dictionary of site name to either the manifest
+                              entry of the site or its ProbePlan() object.
+
+    Return Value:
+    Dictionary of site name to ProbePlan() object.  Plans are passed through
+    as they are, so that callers holding SitesInformation() plans do not pay
+    for compiling them again.
+    """
+    return {
+        name: info if isinstance(info, ProbePlan) else ProbePlan.compile(name, info)
+        for name, info in site_data.items()
+    }
@@ -0,0 +1,308 @@
+"""Sherlock Registry Module
+
+This module keeps track of the searches of a long lived process, such as the
+web interface.  The registry holds a bounded number of searches and forgets
+the least recently used once it is full, or once they have not been looked
+at for a while.  The results of a finished search are moved from memory to a
+file on disk, so that memory use does not grow with every search ever run.
+"""
+import itertools
+import json
+import os
+import shutil
+import sys
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+from datetime import datetime
+from typing import Optional
+
+from sherlock_project.notify import QueryNotifyCollect
+from sherlock_project.result import QueryResult, QueryStatus
+
+# Default number of searches kept.  The least recently used finished search
+# is forgotten to make room for a new one.
+DEFAULT_MAX_SEARCHES = 100
+
+# Default time (in seconds) a finished search is kept after it was last
+# looked at.
+DEFAULT_SEARCH_TTL = 60 * 60
+
+
+def new_search_id() -> str:
+    """Get a new search identifier, unique even for searches started at once."""
+    return f"search_{datetime.now().strftime('%Y%m%d_%H%M%S')}_{uuid.uuid4().hex[:12]}"
+
+
+def result_size(result: QueryResult) -> int:
+    """Estimate the memory (in bytes) held by a QueryResult() object."""
+    # Interned names are shared by every result of the site or username.
+    return sys.getsizeof(result) + sum(
+        sys.getsizeof(getattr(result, name)) for name in QueryResult.__slots__
+        if name not in ("username", "site_name", "status")
+    )
+
+
+class SpilledResults:
+    """Spilled Results Object.
+
+    Stands in for the QueryNotifyCollect() object of a finished search once
+    its results have been written to disk, offering the same ways to read
+    them.  Results are read from the file each time they are asked for.
+    """
+
+    finished = True
+
+    def __init__(self, path: str, usernames: list[str], counts: dict):
+        """Create Spilled Results Object.
+
+        Keyword Arguments:
+        self                   -- This object.
+        path                   -- String containing path of the file holding
+                                  one JSON record per result.
+        usernames              -- List of the usernames searched for.
+        counts                 -- Dictionary of QueryStatus() to the number of
+                                  results with it.
+
+        Return Value:
+        Nothing.
+        """
+        self.path = path
+        self.usernames = usernames
+        self.counts = counts
+
+        return
+
+    def _read(self, start: int = 0) -> list[QueryResult]:
+        with open(self.path, encoding="utf-8") as file:
+            return [
+                QueryResult(
+                    username=record["username"],
+                    site_name=record["site"],
+                    site_url_user=record["url_user"],
+                    status=QueryStatus[record["status"]],
+                    query_time=record["query_time"],
+                    context=record["context"],
+                    http_status=record["http_status"],
+                )
+                for record in map(json.loads, itertools.islice(file, start, None))
+            ]
+
+    def snapshot(self) -> list:
+        """Get the results, in the order they arrived."""
+        return self._read()
+
+    def since(self, cursor: int = 0) -> tuple[list, dict]:
+        """Get the results after the first cursor results, and the counts of each QueryStatus()."""
+        return self._read(cursor), dict(self.counts)
+
+    def wait(self, since: int = 0, timeout: Optional[float] = None) -> list:
+        """Get the results after the first since results, without waiting as there are no more."""
+        return self._read(since)
+
+
+class SearchRegistry:
+    """Search Registry Object.
+
+    Maps search identifiers to the dictionary describing each search.  A
+    search running in this process has its QueryNotifyCollect() object under
+    "notify" and its Future() under "future"; other searches are only kept
+    and forgotten.  The folder of reports under "folder", if any, is deleted
+    along with a forgotten search.
+    """
+
+    def __init__(self, spill_folder: str, max_searches: int = DEFAULT_MAX_SEARCHES,
+                 ttl: float = DEFAULT_SEARCH_TTL):
+        """Create Search Registry Object.
+
+        Keyword Arguments:
+        self                   -- This object.
+        spill_folder           -- String containing path of folder to write
+                                  the results of finished searches to.
+        max_searches           -- Maximum number of searches kept.  Running
+                                  searches are never forgotten, so there may
+                                  be more while they all run.
+        ttl                    -- Time (in seconds) a finished search is kept
+                                  after it was last looked at.
+
+        Return Value:
+        Nothing.
+        """
+        self.spill_folder = spill_folder
+        self.max_searches = max_searches
+        self.ttl = ttl
+        self.evicted = 0
+        self.expired = 0
+        self._searches = OrderedDict()
+        self._used = {}
+        self._spilled_bytes = {}
+        self._lock = threading.Lock()
+
+        return
+
+    def __len__(self) -> int:
+        return len(self._searches)
+
+    def __contains__(self, search_id: str) -> bool:
+        return self.get(search_id) is not None
+
+    def add(self, search_id: str, search_info: dict):
+        """Add Search.
+
+        Keyword Arguments:
+        self                   -- This object.
+        search_id              -- String identifying the search.
+        search_info            -- Dictionary describing the search.  The
+                                  results of a search with a "future" are
+                                  spilled to disk once it is done.
+
+        Return Value:
+        Nothing.
+        """
+        with self._lock:
+            self._searches[search_id] = search_info
+            self._used[search_id] = time.monotonic()
+            self._expire()
+            self._evict()
+
+        future = search_info.get("future")
+        if future is not None:
+            future.add_done_callback(lambda future: self.spill(search_id))
+
+        return
+
+    def get(self, search_id: str) -> Optional[dict]:
+        """Get the dictionary describing a search, or None if it is not known."""
+        with self._lock:
+            self._expire()
+            search_info = self._searches.get(search_id)
+            if search_info is not None:
+                self._searches.move_to_end(search_id)
+                self._used[search_id] = time.monotonic()
+            return search_info
+
+    def spill(self, search_id: str):
+        """Spill Results.
+
+        Writes the results of a finished search to disk and drops them, and
+        the results its future resolved to, from memory.
+
+        Keyword Arguments:
+        self                   -- This object.
+        search_id              -- String identifying the search.
+
+        Return Value:
+        Nothing.
+        """
+        with self._lock:
+            search_info = self._searches.get(search_id)
+        if search_info is None or not isinstance(search_info.get("notify"), QueryNotifyCollect):
+            return
+
+        notify = search_info["notify"]
+        results, counts = notify.since(0)
+        os.makedirs(self.spill_folder, exist_ok=True)
+        path = os.path.join(self.spill_folder, f"{search_id}.jsonl")
+        with open(path, "w", encoding="utf-8") as file:
+            for result in results:
+                file.write(json.dumps({
+                    "username": result.username,
+                    "site": result.site_name,
+                    "url_user": result.site_url_user,
+                    "status": result.status.name,
+                    "query_time": result.query_time,
+                    "context": result.context,
+                    "http_status": result.http_status,
+                }) + "\n")
+
+        # Keep only the outcome of the future, not what it resolved to.
+        done = Future()
+        error = search_info["future"].exception()
+        if error is not None:
+            done.set_exception(error)
+        else:
+            done.set_result(None)
+
+        with self._lock:
+            if self._searches.get(search_id) is not search_info:
+                # Forgotten while it was being written.
+                os.remove(path)
+                return
+            search_info["notify"] = SpilledResults(path, list(notify.usernames), counts)
+            search_info["future"] = done
+            self._spilled_bytes[search_id] = os.path.getsize(path)
+
+        return
+
+    def stats(self) -> dict:
+        """Get Statistics.
+
+        Keyword Arguments:
+        self                   -- This object.
+
+        Return Value:
+        Dictionary with the number of searches kept, "running" and "spilled",
+        the number and estimated size in bytes of the results held in memory
+        and of those spilled to disk, the limits of the registry, and the
+        number of searches forgotten because it was full or they expired.
+        """
+        with self._lock:
+            self._expire()
+            searches = list(self._searches.values())
+            spilled_bytes = sum(self._spilled_bytes.values())
+
+        results = [
+            search_info["notify"].snapshot() for search_info in searches
+            if isinstance(search_info.get("notify"), QueryNotifyCollect)
+        ]
+        return {
+            "searches": len(searches),
+            "running": sum(not self._finished(search_info) for search_info in searches),
+            "spilled": sum(isinstance(search_info.get("notify"), SpilledResults) for search_info in searches),
+            "results_in_memory": sum(map(len, results)),
+            "bytes_in_memory": sum(result_size(result) for collected in results for result in collected),
+            "bytes_spilled": spilled_bytes,
+            "max_searches": self.max_searches,
+            "ttl": self.ttl,
+            "evicted": self.evicted,
+            "expired": self.expired,
+        }
+
+    @staticmethod
+    def _finished(search_info: dict) -> bool:
+        if "future" in search_info:
+            return search_info["future"].done()
+        return bool(search_info.get("reported"))
+
+    def _forget(self, search_id: str):
+        search_info = self._searches.pop(search_id)
+        del self._used[search_id]
+        # Its reports can no longer be downloaded.
+        if search_info.get("folder"):
+            shutil.rmtree(search_info["folder"], ignore_errors=True)
+        if self._spilled_bytes.pop(search_id, None) is not None:
+            try:
+                os.remove(os.path.join(self.spill_folder, f"{search_id}.jsonl"))
+            except FileNotFoundError:
+                pass
+
+    def _expire(self):
+        # Searches queued elsewhere keep their state there, so they expire
+        # even if nobody looked at them until they finished.
+        deadline = time.monotonic() - self.ttl
+        for search_id in [search_id for search_id, used in self._used.items()
+                          if used < deadline and (self._finished(self._searches[search_id])
+                                                  or "future" not in self._searches[search_id])]:
+            self._forget(search_id)
+            self.expired += 1
+
+    def _evict(self):
+        # Least recently used first.
+        for search_id in list(self._searches):
+            if len(self._searches) <= self.max_searches:
+                break
+            if self._finished(self._searches[search_id]):
+                self._forget(search_id)
+                self.evicted += 1
@@ -2,6 +2,7 @@
 
 This module defines various objects for recording the results of queries.
 """
+import sys
 from enum import Enum
 
 
@@ -30,10 +31,16 @@ class QueryStatus(Enum):
 class QueryResult():
     """Query Result Object.
 
-    Describes result of query about a given username.
+    Describes result of query about a given username.  A batch may keep
+    millions of them, so they have no __dict__, and the username and site
+    name of every result share a single string each.
     """
+    __slots__ = ("username", "site_name", "site_url_user", "status",
+                 "query_time", "context", "http_status", "retries", "hedges")
+
     def __init__(self, username, site_name, site_url_user, status,
-                 query_time=None, context=None):
+                 query_time=None, context=None, http_status=None,
+                 retries=0, hedges=0):
         """Create Query Result Object.
 
         Contains information about a specific method of detecting usernames on
@@ -57,17 +64,29 @@ class QueryResult():
                                   an error, this might indicate the type of
                                   error that occurred.
                                   Default of None.
+        http_status            -- Integer indicating the HTTP status code of
+                                  the response to the query.
+                                  Default of None if there was no response.
+        retries                -- Number of times the query was sent again
+                                  after a transient failure.
+                                  Default of 0.
+        hedges                 -- Number of duplicate requests sent because
+                                  the query was slower than usual.
+                                  Default of 0.
 
         Return Value:
         Nothing.
         """
 
-        self.username      = username
-        self.site_name     = site_name
+        self.username      = sys.intern(username)
+        self.site_name     = sys.intern(site_name)
         self.site_url_user = site_url_user
         self.status        = status
         self.query_time    = query_time
         self.context       = context
+        self.http_status   = http_status
+        self.retries       = retries
+        self.hedges        = hedges
 
         return
 
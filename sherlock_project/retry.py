@@ -0,0 +1,273 @@
+"""Sherlock Retry Module
+
+This module sends probes again when they fail for reasons which are likely
+to pass, such as a reset connection or an overloaded server, waiting a
+little longer before each attempt.  A probe may also be hedged: once it
+has taken longer than its site usually does, the same request is sent a
+second time, and whichever answers first is used.
+"""
+import heapq
+import itertools
+import random
+import threading
+import time
+from concurrent.futures import Future, InvalidStateError
+from email.utils import parsedate_to_datetime
+from typing import Callable, Optional
+
+import requests
+
+# Default number of times a probe is sent again after a transient failure.
+DEFAULT_RETRIES = 1
+
+# Default time (in seconds) the backoff before the first retry is drawn
+# from.  It doubles for each further retry.
+DEFAULT_BASE_DELAY = 0.5
+
+# Default longest time (in seconds) to wait before a retry.  A server which
+# asks to be left alone for longer is not asked again.
+DEFAULT_MAX_DELAY = 10.0
+
+# HTTP status codes of answers which are worth asking again for.
+RETRY_STATUSES = frozenset({429, 502, 503, 504})
+
+# Quantile of the latencies of a site after which a probe is hedged.
+HEDGE_QUANTILE = 0.95
+
+
+class RetryPolicy:
+    """Retry Policy Object.
+
+    Decides which failures are retried, and how long to wait before each
+    retry.
+    """
+
+    def __init__(self, retries: int = DEFAULT_RETRIES,
+                 base_delay: float = DEFAULT_BASE_DELAY,
+                 max_delay: float = DEFAULT_MAX_DELAY,
+                 hedge: bool = False,
+                 retry_timeouts: bool = False):
+        """Create Retry Policy Object.
+
+        Keyword Arguments:
+        self                   -- This object.
+        retries                -- Number of times a probe may be sent again.
+        base_delay             -- Time (in seconds) the backoff before the
+                                  first retry is drawn from.
+        max_delay              -- Longest time (in seconds) to wait before a
+                                  retry.
+        hedge                  -- Boolean indicating whether to send a second
+                                  request for a probe which is slower than
+                                  HEDGE_QUANTILE of its site's latencies.
+                                  On the threads engine the hedged request
+                                  waits for a worker behind the probes
+                                  queued before it, so it only helps when
+                                  workers are to spare.
+        retry_timeouts         -- Boolean indicating whether to retry a probe
+                                  whose answer timed out.  Default of False,
+                                  as a site which does not answer in time
+                                  would cost the whole timeout again.
+                                  Connection timeouts are always retried.
+
+        Return Value:
+        Nothing.
+        """
+        self.retries = retries
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.hedge = hedge
+        self.retry_timeouts = retry_timeouts
+
+        return
+
+    def retryable(self, response: Optional[requests.Response],
+                  error: Optional[BaseException]) -> bool:
+        """Check whether the outcome of an attempt is a transient failure."""
+        if error is not None:
+            # A failing proxy fails every attempt alike.
+            if isinstance(error, requests.exceptions.ProxyError):
+                return False
+            # ConnectTimeout is a ConnectionError too.
+            if isinstance(error, requests.exceptions.ConnectionError):
+                return True
+            return self.retry_timeouts and isinstance(error, requests.exceptions.Timeout)
+        return response.status_code in RETRY_STATUSES
+
+    def delay(self, retry: int, response: Optional[requests.Response] = None) -> Optional[float]:
+        """Delay.
+
+        Keyword Arguments:
+        self                   -- This object.
+        retry                  -- Number of the retry, from 0.
+        response               -- requests.Response() object of the failed
+                                  attempt, if it was answered.
+
+        Return Value:
+        Time (in seconds) to wait before the retry.  The Retry-After header
+        of the answer is honoured; otherwise the time is drawn at random up
+        to an exponentially growing bound, so that the retries of many
+        probes do not arrive together.  None if the server asked to wait
+        longer than max_delay.
+        """
+        retry_after = None if response is None else retry_after_seconds(response)
+        if retry_after is not None:
+            return retry_after if retry_after <= self.max_delay else None
+        return random.uniform(0, min(self.max_delay, self.base_delay * 2 ** retry))
+
+
+def retry_after_seconds(response: requests.Response) -> Optional[float]:
+    """Get the time (in seconds) a Retry-After header asks to wait, or None."""
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class TimerThread:
+    """Timer Thread Object.
+
+    Runs callbacks after a delay, all on one background thread, so that
+    waiting for hundreds of backoffs does not take hundreds of threads.
+    """
+
+    def __init__(self):
+        self._queue = []
+        self._counter = itertools.count()
+        self._condition = threading.Condition()
+        self._thread = None
+
+    def call_later(self, delay: float, callback: Callable[[], None]):
+        """Run callback after delay seconds."""
+        with self._condition:
+            heapq.heappush(self._queue, (time.monotonic() + delay, next(self._counter), callback))
+            if self._thread is None:
+                self._thread = threading.Thread(target=self._run, name="sherlock-timer", daemon=True)
+                self._thread.start()
+            self._condition.notify()
+
+    def _run(self):
+        while True:
+            with self._condition:
+                while not self._queue or self._queue[0][0] > time.monotonic():
+                    self._condition.wait(
+                        None if not self._queue else self._queue[0][0] - time.monotonic()
+                    )
+                _, _, callback = heapq.heappop(self._queue)
+            try:
+                callback()
+            except Exception:  # noqa: BLE001
+                # A callback has nobody to report to; it must not stop the
+                # callbacks after it.
+                pass
+
+
+timers = TimerThread()
+
+
+class ProbeFuture(Future):
+    """Probe Future Object.
+
+    Future of a probe, resolving to the answer of whichever of its attempts
+    decided it.  It counts the retries and hedged requests sent for it.
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.retries = 0
+        self.hedges = 0
+
+
+class RetryingProbe:
+    """Retrying Probe Object.
+
+    Sends the attempts of one probe, following a RetryPolicy().
+    """
+
+    def __init__(self, send: Callable[..., Future], policy: RetryPolicy,
+                 hedge_after: Optional[float] = None):
+        """Create Retrying Probe Object, and send its first attempt.
+
+        Keyword Arguments:
+        self                   -- This object.
+        send                   -- Function sending one attempt of the probe.
+                                  It is passed on_send, a function to call
+                                  once the request is sent, and returns a
+                                  Future() resolving to requests.Response().
+        policy                 -- RetryPolicy() object.
+        hedge_after            -- Time (in seconds) after the first request
+                                  is sent to send a hedged one.  Default of
+                                  None not to hedge.
+
+        Return Value:
+        Nothing.
+        """
+        self.future = ProbeFuture()
+        self._send = send
+        self._policy = policy
+        self._hedge_after = hedge_after
+        self._in_flight = 0
+        self._lock = threading.Lock()
+
+        self._attempt(first=True)
+
+        return
+
+    def _attempt(self, first: bool = False):
+        with self._lock:
+            if self.future.done():
+                return
+            self._in_flight += 1
+        on_send = self._sent if first and self._hedge_after is not None else None
+        try:
+            attempt = self._send(on_send=on_send)
+        except RuntimeError as error:
+            # Such as a session closed before a retry was due
+            attempt = Future()
+            attempt.set_exception(error)
+        attempt.add_done_callback(self._finished)
+
+    def _sent(self):
+        timers.call_later(self._hedge_after, self._hedge)
+
+    def _hedge(self):
+        with self._lock:
+            if self.future.done() or self._in_flight != 1 or self.future.hedges:
+                return
+            self.future.hedges += 1
+        self._attempt()
+
+    def _finished(self, attempt: Future):
+        error = attempt.exception()
+        response = None if error is not None else attempt.result()
+
+        with self._lock:
+            self._in_flight -= 1
+            if self.future.done():
+                return
+            retryable = self._policy.retryable(response, error)
+            if (retryable or error is not None) and self._in_flight:
+                # The other request may yet succeed.
+                return
+            if retryable:
+                if self.future.retries < self._policy.retries:
+                    delay = self._policy.delay(self.future.retries, response)
+                    if delay is not None:
+                        self.future.retries += 1
+                        timers.call_later(delay, self._attempt)
+                        return
+
+        try:
+            if error is not None:
+                self.future.set_exception(error)
+            else:
+                self.future.set_result(response)
+        except InvalidStateError:
+            # Decided by the other request in the meantime.
+            pass
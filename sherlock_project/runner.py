@@ -0,0 +1,209 @@
+"""Sherlock Runner Module
+
+This module runs searches inside a long lived process, such as the web
+interface.  The manifest is loaded once and all searches share one session,
+so a search starts probing at once rather than paying for a new interpreter,
+a manifest download and a cold connection pool.
+"""
+import os
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Iterable, Optional
+
+from sherlock_project.export import write_csv, write_txt, write_xlsx
+from sherlock_project.latency import LatencyTracker
+from sherlock_project.notify import QueryNotify
+from sherlock_project.probe import ProbePlan
+from sherlock_project.scheduler import HostScheduler
+from sherlock_project.sherlock import open_session, sherlock_batch
+from sherlock_project.sites import SitesInformation
+from sherlock_project.store import ResultStore
+from sherlock_project.warmup import DnsCache
+
+# Default number of searches which may run at the same time.  Further
+# searches wait for one to finish.
+DEFAULT_MAX_SEARCHES = 4
+
+# Default number of requests in flight, shared by all running searches.
+DEFAULT_RUNNER_CONCURRENCY = 64
+
+
+class SearchRunner:
+    """Search Runner Object.
+
+    Runs searches on a pool of worker threads, sharing one loaded manifest
+    and one session between them.  The latencies of every search are
+    learned from together, to adapt the timeout of each site.
+    """
+
+    def __init__(self, sites: Optional[SitesInformation] = None,
+                 max_searches: int = DEFAULT_MAX_SEARCHES,
+                 max_concurrency: int = DEFAULT_RUNNER_CONCURRENCY,
+                 scheduler: Optional[HostScheduler] = None,
+                 store: Optional[ResultStore] = None,
+                 latencies: Optional[LatencyTracker] = None):
+        """Create Search Runner Object.
+
+        Keyword Arguments:
+        self                   -- This object.
+        sites                  -- SitesInformation() object to search.
+                                  Default of None to load the default
+                                  manifest when it is first needed.
+        max_searches           -- Maximum number of searches to run at the
+                                  same time.
+        max_concurrency        -- Maximum number of requests in flight, for
+                                  all searches together.
+        scheduler              -- HostScheduler() object limiting requests to
+                                  each host, for all searches together.
+                                  Default of None for a scheduler applying
+                                  only the limits set in the manifest, which
+                                  never skips a host.
+        store                  -- ResultStore() object to record the results
+                                  of every search in.  Default of None.
+        latencies              -- LatencyTracker() object to adapt the
+                                  timeout of each site to its latencies, for
+                                  all searches together.  Default of None
+                                  for the full timeout on every site.
+
+        Return Value:
+        Nothing.
+        """
+        self.store = store
+        self._sites = sites
+        self._sites_lock = threading.Lock()
+        self._executor = ThreadPoolExecutor(
+            max_workers=max_searches, thread_name_prefix="sherlock-search"
+        )
+        self.latencies = latencies
+        # Probes are not sent again unless a caller sets a RetryPolicy().
+        self.retry_policy = None
+        # The threads engine takes the proxy of each request, so searches
+        # through different proxies can share the session.
+        self.session = open_session(
+            "threads",
+            max_concurrency=max_concurrency,
+            scheduler=scheduler or HostScheduler(),
+            # Searches keep asking for the same hosts, so their addresses
+            # are looked up once for all of them.
+            dns_cache=DnsCache(),
+        )
+
+        return
+
+    @property
+    def sites(self) -> SitesInformation:
+        """SitesInformation() object searched, loaded on first use."""
+        with self._sites_lock:
+            if self._sites is None:
+                self._sites = SitesInformation()
+            return self._sites
+
+    def site_data(self, site_list: Optional[list[str]] = None,
+                  nsfw: bool = False) -> dict[str, ProbePlan]:
+        """Get Site Data.
+
+        Keyword Arguments:
+        self                   -- This object.
+        site_list              -- List of site names to limit the search to,
+                                  compared case insensitively.  Default of
+                                  None for all sites.
+        nsfw                   -- Boolean indicating whether to include NSFW
+                                  sites.  Sites named in site_list are
+                                  included regardless.
+
+        Return Value:
+        Dictionary of site name to ProbePlan() object.
+        """
+        wanted = {site.casefold() for site in site_list or []}
+        return {
+            site.name: site.plan
+            for site in self.sites
+            if (not wanted or site.name.casefold() in wanted)
+            and (nsfw or not site.is_nsfw or site.name.casefold() in wanted)
+        }
+
+    def submit(self, usernames: Iterable[str], query_notify: QueryNotify,
+               site_list: Optional[list[str]] = None, nsfw: bool = False,
+               proxy: Optional[str] = None, timeout: int = 60,
+               output_folder: Optional[str] = None, csv: bool = False,
+               xlsx: bool = False, search_id: Optional[str] = None) -> Future:
+        """Submit Search.
+
+        Keyword Arguments:
+        self                   -- This object.
+        usernames              -- Iterable of strings indicating usernames to
+                                  search for.
+        query_notify           -- Object with base type of QueryNotify().
+                                  It is finished once every username has
+                                  been searched.
+        site_list              -- List of site names to limit the search to.
+                                  Default of None for all sites.
+        nsfw                   -- Boolean indicating whether to include NSFW
+                                  sites.
+        proxy                  -- String indicating the proxy URL.
+        timeout                -- Time in seconds to wait before timing out
+                                  request.
+        output_folder          -- String containing path of folder to write
+                                  a text report of each username to.
+                                  Default of None for no reports.
+        csv                    -- Boolean indicating whether to also write
+                                  csv reports.
+        xlsx                   -- Boolean indicating whether to also write
+                                  xlsx reports.
+        search_id              -- String identifying the search in the
+                                  store.  Default of None.
+
+        Return Value:
+        concurrent.futures.Future() object resolving to a dictionary of
+        username to the results returned by sherlock() for it.
+        """
+        usernames = list(usernames)
+
+        def search():
+            site_data = self.site_data(site_list, nsfw=nsfw)
+            if output_folder is not None:
+                os.makedirs(output_folder, exist_ok=True)
+
+            results_all = {}
+            try:
+                for username, results in sherlock_batch(
+                    usernames, site_data, query_notify, proxy=proxy,
+                    timeout=timeout, session=self.session,
+                    latencies=self.latencies, retry_policy=self.retry_policy,
+                ):
+                    results_all[username] = results
+                    if self.store is not None:
+                        self.store.add(
+                            (results_site["status"] for results_site in results.values()),
+                            search_id=search_id,
+                            manifest_version=self.sites.manifest_version,
+                        )
+                    if output_folder is None:
+                        continue
+                    write_txt(results, os.path.join(output_folder, f"{username}.txt"))
+                    if csv:
+                        write_csv(username, results, os.path.join(output_folder, f"{username}.csv"))
+                    if xlsx:
+                        write_xlsx(username, results, os.path.join(output_folder, f"{username}.xlsx"))
+            finally:
+                query_notify.finish()
+
+            return results_all
+
+        return self._executor.submit(search)
+
+    def close(self):
+        """Close Runner.
+
+        Waits for running searches, then closes the shared session.
+
+        Keyword Arguments:
+        self                   -- This object.
+
+        Return Value:
+        Nothing.
+        """
+        self._executor.shutdown(wait=True)
+        self.session.close()
+
+        return
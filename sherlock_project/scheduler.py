@@ -0,0 +1,489 @@
+"""Sherlock Scheduler Module
+
+This module limits how hard Sherlock probes any one host.  Probes are
+grouped by the host of the site's probe URL, and each group may be limited
+in the number of requests in flight and in the number of requests sent per
+second.  A host which keeps failing to answer may be skipped for a while by
+its circuit breaker, rather than holding up every probe sent to it.
+"""
+import asyncio
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from http.cookiejar import DefaultCookiePolicy
+from typing import Callable, Optional
+from urllib.parse import urlsplit
+
+import requests
+
+from sherlock_project.warmup import DnsCacheAdapter
+
+# Default number of consecutive connection failures or timeouts of a host
+# after which its circuit opens.
+DEFAULT_FAILURE_THRESHOLD = 3
+
+# Default time (in seconds) an open circuit waits before letting a probe
+# through to find out whether the host has recovered.
+DEFAULT_COOLDOWN = 60.0
+
+# Context of the results of probes skipped by an open circuit.
+CIRCUIT_OPEN = "Circuit Open"
+
+
+class CircuitOpenError(requests.exceptions.RequestException):
+    """Raised instead of sending a request to a host whose circuit is open."""
+
+
+def host_key(url_template: str) -> str:
+    """Get Host Key.
+
+    Keyword Arguments:
+    url_template           -- String containing URL format of the site,
+                              with "{}" where the username goes.
+
+    Return Value:
+    String identifying the host group of the site.  Sites which put the
+    username in the host name (e.g. "https://{}.example.com") are grouped
+    together, as every username is served by the same host.
+    """
+    netloc = urlsplit(url_template).netloc.lower()
+    return netloc.rpartition("@")[2]
+
+
+class TokenBucket:
+    """Token Bucket Object.
+
+    Paces requests to a steady rate, while allowing a small burst.
+    """
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        """Create Token Bucket Object.
+
+        Keyword Arguments:
+        self                   -- This object.
+        rate                   -- Number of requests allowed per second.
+        burst                  -- Number of requests which may be sent at
+                                  once after an idle period.
+                                  Default of one second worth of requests,
+                                  and at least one.
+
+        Return Value:
+        Nothing.
+        """
+        self.rate = rate
+        self.capacity = burst if burst is not None else max(rate, 1.0)
+        self._tokens = self.capacity
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+        return
+
+    def reserve(self) -> float:
+        """Reserve Token.
+
+        Takes a token from the bucket, going into debt if there is none left.
+        Callers are served in the order they reserve.
+
+        Keyword Arguments:
+        self                   -- This object.
+
+        Return Value:
+        Time (in seconds) the caller must wait before sending its request.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity,
+                               self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            self._tokens -= 1
+            if self._tokens >= 0:
+                return 0.0
+            return -self._tokens / self.rate
+
+    def take(self) -> float:
+        """Take Token.
+
+        Takes a token from the bucket if there is one, without going into
+        debt.
+
+        Keyword Arguments:
+        self                   -- This object.
+
+        Return Value:
+        0.0 if a token was taken, otherwise the time (in seconds) until
+        there is one.
+        """
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.capacity,
+                               self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            if self._tokens >= 1:
+                self._tokens -= 1
+                return 0.0
+            return (1 - self._tokens) / self.rate
+
+
+class HostLimiter:
+    """Host Limiter Object.
+
+    Enforces the limits of a single host group, for threads and for
+    coroutines alike.  Requests wait for the host in a queue of their own,
+    rather than in a worker thread or a slot of the engine, so that a busy
+    host does not hold up the requests to other hosts.
+    """
+
+    def __init__(self, max_in_flight: Optional[int] = None,
+                 rate: Optional[float] = None):
+        """Create Host Limiter Object.
+
+        Keyword Arguments:
+        self                   -- This object.
+        max_in_flight          -- Maximum number of requests in flight to the
+                                  host.  Default of None for no limit.
+        rate                   -- Maximum number of requests per second to
+                                  the host.  Default of None for no limit.
+
+        Return Value:
+        Nothing.
+        """
+        self.max_in_flight = max_in_flight
+        self.rate = rate
+        self._bucket = TokenBucket(rate) if rate else None
+        self._in_flight = 0
+        self._waiting = deque()
+        self._timer = None
+        self._lock = threading.Lock()
+
+        return
+
+    def submit(self, start: Callable[[], None]):
+        """Submit Request.
+
+        Queues a request for the host, without blocking.
+
+        Keyword Arguments:
+        self                   -- This object.
+        start                  -- Function to call once the request may be
+                                  sent, in whichever thread frees the host.
+                                  It must not block, and release() must be
+                                  called once the request is done.
+
+        Return Value:
+        Nothing.
+        """
+        with self._lock:
+            self._waiting.append(start)
+        self._dispatch()
+
+        return
+
+    def release(self):
+        """Free the slot of a request started by submit(), starting the next one."""
+        with self._lock:
+            self._in_flight -= 1
+        self._dispatch()
+
+    def _dispatch(self):
+        while True:
+            with self._lock:
+                if not self._waiting or self._timer is not None:
+                    return
+                if self.max_in_flight and self._in_flight >= self.max_in_flight:
+                    return
+                if self._bucket is not None:
+                    delay = self._bucket.take()
+                    if delay > 0:
+                        # A timer thread waits for the next token, so that
+                        # no caller sleeps.
+                        self._timer = threading.Timer(delay, self._wake)
+                        self._timer.daemon = True
+                        self._timer.start()
+                        return
+                start = self._waiting.popleft()
+                self._in_flight += 1
+            start()
+
+    def _wake(self):
+        with self._lock:
+            self._timer = None
+        self._dispatch()
+
+    @contextmanager
+    def slot(self):
+        """Wait until a request may be sent to the host, blocking the thread."""
+        granted = threading.Event()
+        self.submit(granted.set)
+        granted.wait()
+        try:
+            yield
+        finally:
+            self.release()
+
+    @asynccontextmanager
+    async def async_slot(self):
+        """Wait until a request may be sent to the host, yielding to the event loop."""
+        loop = asyncio.get_running_loop()
+        granted = loop.create_future()
+
+        def grant():
+            # A coroutine cancelled while waiting gives its slot back.
+            if granted.done():
+                self.release()
+            else:
+                granted.set_result(None)
+
+        def start():
+            try:
+                loop.call_soon_threadsafe(grant)
+            except RuntimeError:
+                # The loop is closed
+                self.release()
+
+        self.submit(start)
+        await granted
+        try:
+            yield
+        finally:
+            self.release()
+
+
+class CircuitBreaker:
+    """Circuit Breaker Object.
+
+    Counts the consecutive failures of a host.  Once there are too many the
+    circuit opens, and requests are refused until the cooldown has passed.
+    A single request is then let through: the circuit closes again if it
+    succeeds, and stays open for another cooldown if it fails.
+    """
+
+    def __init__(self, threshold: int, cooldown: float = DEFAULT_COOLDOWN,
+                 failures: int = 0, opened_at: Optional[float] = None):
+        """Create Circuit Breaker Object.
+
+        Keyword Arguments:
+        self                   -- This object.
+        threshold              -- Number of consecutive failures which open
+                                  the circuit.
+        cooldown               -- Time (in seconds) an open circuit refuses
+                                  requests.
+        failures               -- Number of consecutive failures so far.
+        opened_at              -- Time (as returned by time.time()) the
+                                  circuit opened, or None if it is closed.
+
+        Return Value:
+        Nothing.
+        """
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = failures
+        self.opened_at = opened_at
+        self._probing = False
+        self._lock = threading.Lock()
+
+        return
+
+    def allow(self) -> bool:
+        """Check whether a request may be sent, taking the trial request of an open circuit."""
+        with self._lock:
+            if self.opened_at is None:
+                return True
+            if self._probing or time.time() - self.opened_at < self.cooldown:
+                return False
+            self._probing = True
+            return True
+
+    def record(self, failed: bool):
+        """Record the outcome of a request let through by allow()."""
+        with self._lock:
+            self._probing = False
+            if not failed:
+                self.failures = 0
+                self.opened_at = None
+                return
+            self.failures += 1
+            if self.opened_at is not None or self.failures >= self.threshold:
+                self.opened_at = time.time()
+
+    @contextmanager
+    def guard(self, key: str):
+        """Send a request through the breaker, raising CircuitOpenError if the circuit is open."""
+        if not self.allow():
+            raise CircuitOpenError(f"Circuit open for {key} after {self.failures} failures")
+        failed = False
+        try:
+            yield
+        except (requests.exceptions.ConnectionError, requests.exceptions.Timeout) as error:
+            # A failing proxy says nothing about the host.
+            failed = not isinstance(error, requests.exceptions.ProxyError)
+            raise
+        finally:
+            self.record(failed)
+
+
+def tighter(limit: Optional[float], other: Optional[float]) -> Optional[float]:
+    """Return the stricter of two optional limits."""
+    if limit is None:
+        return other
+    if other is None:
+        return limit
+    return min(limit, other)
+
+
+class HostScheduler:
+    """Host Scheduler Object.
+
+    Keeps a HostLimiter for every host group probed through a session.
+    """
+
+    def __init__(self, max_in_flight: Optional[int] = None,
+                 rate: Optional[float] = None,
+                 failure_threshold: Optional[int] = None,
+                 cooldown: float = DEFAULT_COOLDOWN,
+                 breaker_state: Optional[dict] = None):
+        """Create Host Scheduler Object.
+
+        Keyword Arguments:
+        self                   -- This object.
+        max_in_flight          -- Default maximum number of requests in
+                                  flight to any one host.
+                                  Default of None for no limit.
+        rate                   -- Default maximum number of requests per
+                                  second to any one host.
+                                  Default of None for no limit.
+        failure_threshold      -- Number of consecutive connection failures
+                                  or timeouts of a host which open its
+                                  circuit.  Default of None for no circuit
+                                  breakers.
+        cooldown               -- Time (in seconds) an open circuit skips
+                                  requests before trying the host again.
+        breaker_state          -- Dictionary returned by breaker_state(), to
+                                  carry on with the breakers of an earlier
+                                  run.  Default of None.
+
+        Return Value:
+        Nothing.
+        """
+        self.max_in_flight = max_in_flight
+        self.rate = rate
+        self.failure_threshold = failure_threshold
+        self.cooldown = cooldown
+        self._limiters = {}
+        self._breakers = {}
+        self._lock = threading.Lock()
+
+        self.load_breaker_state(breaker_state or {})
+
+        return
+
+    def load_breaker_state(self, breaker_state: dict):
+        """Carry on with the breakers of a dictionary returned by breaker_state(), replacing those of its hosts."""
+        if not self.failure_threshold:
+            return
+        breakers = {
+            key: CircuitBreaker(
+                self.failure_threshold, self.cooldown,
+                failures=state.get("failures", 0), opened_at=state.get("opened_at"),
+            )
+            for key, state in breaker_state.items()
+        }
+        with self._lock:
+            self._breakers.update(breakers)
+
+    def register(self, key: str, rate_limit: Optional[dict] = None) -> str:
+        """Register Site.
+
+        Creates the limiter for the host group of a site, if there is none
+        yet.  A "rateLimit" entry in the site's manifest entry may tighten
+        the default limits; the first site seen for a host decides them.
+
+        Keyword Arguments:
+        self                   -- This object.
+        key                    -- String returned by host_key() for the
+                                  site's probe URL.
+        rate_limit             -- Dictionary containing the "rateLimit" entry
+                                  of the site's manifest entry, if any.
+
+        Return Value:
+        String identifying the host group, to be passed along with requests.
+        """
+        with self._lock:
+            if key not in self._limiters:
+                override = rate_limit or {}
+                self._limiters[key] = HostLimiter(
+                    max_in_flight=tighter(self.max_in_flight, override.get("maxInFlight")),
+                    rate=tighter(self.rate, override.get("requestsPerSecond")),
+                )
+            if self.failure_threshold and key not in self._breakers:
+                self._breakers[key] = CircuitBreaker(self.failure_threshold, self.cooldown)
+        return key
+
+    def limiter(self, key: str) -> HostLimiter:
+        """Get the limiter of a registered host group."""
+        return self._limiters[key]
+
+    def breaker(self, key: str) -> Optional[CircuitBreaker]:
+        """Get the circuit breaker of a registered host group, or None if there are none."""
+        return self._breakers.get(key)
+
+    def breaker_state(self) -> dict:
+        """Breaker State.
+
+        Keyword Arguments:
+        self                   -- This object.
+
+        Return Value:
+        Dictionary of host group to the "failures" and "opened_at" time of
+        its breaker, for every host which has failed since it last answered.
+        It may be saved as JSON, and passed back to a new HostScheduler().
+        """
+        with self._lock:
+            breakers = list(self._breakers.items())
+        return {
+            key: {"failures": breaker.failures, "opened_at": breaker.opened_at}
+            for key, breaker in breakers if breaker.failures
+        }
+
+
+class ScheduledSession(requests.Session):
+    """Scheduled Session Object.
+
+    A requests session which waits for its host's limits before sending
+    each request.  Requests opt in by passing the key returned by
+    HostScheduler.register() as `limit_key`, and pass `slot_held` if they
+    have taken a slot of the host already.  A function passed as `on_send`
+    is called just before the request is sent.  Host names are
+    resolved through `dns_cache`, if one is given.
+
+    The session is shared by every username, so it keeps no cookies, lest
+    those a site set while probing one username change its answer about
+    the next.  Cookies still follow the redirects of a single request.
+    """
+
+    def __init__(self, scheduler: Optional[HostScheduler] = None, dns_cache=None):
+        super().__init__()
+        self.scheduler = scheduler
+        self.cookies.set_policy(DefaultCookiePolicy(allowed_domains=[]))
+        if dns_cache is not None:
+            self.mount("https://", DnsCacheAdapter(dns_cache))
+            self.mount("http://", DnsCacheAdapter(dns_cache))
+
+    def request(self, method, url, *args, limit_key=None, on_send=None, slot_held=False, **kwargs):
+        if self.scheduler is None or limit_key is None:
+            if on_send is not None:
+                on_send()
+            return super().request(method, url, *args, **kwargs)
+        if not slot_held:
+            # Callers which waited for the host already are not made to
+            # wait again.
+            with self.scheduler.limiter(limit_key).slot():
+                return self.request(method, url, *args, limit_key=limit_key,
+                                    on_send=on_send, slot_held=True, **kwargs)
+        if on_send is not None:
+            on_send()
+        breaker = self.scheduler.breaker(limit_key)
+        if breaker is None:
+            return super().request(method, url, *args, **kwargs)
+        with breaker.guard(limit_key):
+            return super().request(method, url, *args, **kwargs)
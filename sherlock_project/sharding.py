@@ -0,0 +1,259 @@
+"""Sherlock Sharding Module
+
+This module spreads a batch of usernames over several processes on one
+machine, so that decoding and matching the answers of the sites is not
+limited to one core.  The sites are split into shards, each probed for
+every username by its own process, with its own engine and connections.
+The parent process merges the results of each username in order, and
+passes them on to its query notify object.
+"""
+import multiprocessing
+import queue
+import signal
+from typing import Iterable, Iterator, Optional
+
+from sherlock_project.latency import LatencyTracker
+from sherlock_project.notify import QueryNotify
+from sherlock_project.probe import ProbePlan, compile_plans, thaw
+from sherlock_project.result import QueryResult
+from sherlock_project.scheduler import HostScheduler
+from sherlock_project.sherlock import sherlock_batch
+from sherlock_project.verdicts import VerdictCache
+
+# Time (in seconds) to wait for a result before checking that the worker
+# processes are still running.
+POLL_INTERVAL = 1.0
+
+# Number of usernames a worker may get ahead of the results merged so far.
+# Workers wait past that, so a fast shard does not pile up results in the
+# parent process while it waits for a slow one.
+DEFAULT_MAX_AHEAD = 8
+
+
+def shard_by_host(site_data: dict[str, ProbePlan], count: int) -> list[dict[str, ProbePlan]]:
+    """Shard By Host.
+
+    Keyword Arguments:
+    site_data              -- Dictionary of site name to ProbePlan() object.
+    count                  -- Number of shards.
+
+    Return Value:
+    List of at most count non-empty dictionaries of site name to ProbePlan()
+    object.  The sites of a host are kept in one shard, so that its limits
+    and circuit breaker hold across all of them, and the shards have as
+    similar a number of sites as the hosts allow.
+    """
+    hosts = {}
+    for name, plan in site_data.items():
+        hosts.setdefault(plan.host_key, []).append(name)
+
+    shards = [[] for _ in range(max(1, count))]
+    # Largest hosts first, each to the smallest shard so far
+    for names in sorted(hosts.values(), key=len, reverse=True):
+        min(shards, key=len).extend(names)
+    return [{name: site_data[name] for name in names} for names in shards if names]
+
+
+def scan_shard(index: int, usernames: list[str], entries: dict[str, dict],
+               options: dict, results: multiprocessing.Queue, merge_position,
+               merge_moved, max_ahead: int):
+    """Scan Shard.
+
+    Runs in a worker process, probing one shard of the sites for every
+    username, and putting the results of each username on the results
+    queue.
+
+    Keyword Arguments:
+    index                  -- Number of the shard.
+    usernames              -- List of strings indicating usernames to query.
+    entries                -- Dictionary of site name to the manifest entry
+                              of the site, for the sites of the shard.
+    options                -- Dictionary of keyword arguments of
+                              sherlock_batch(), with the settings of the
+                              scheduler, verdicts and latencies in place of
+                              the objects.
+    results                -- Queue to put ("result", index, position,
+                              results) tuples on, then one ("done", index,
+                              states) tuple, or an ("error", index, message)
+                              tuple if the scan failed.
+    merge_position         -- multiprocessing.Value() of the position of the
+                              username the parent is merging.
+    merge_moved            -- multiprocessing.Condition() notified when
+                              merge_position moves on.
+    max_ahead              -- Number of usernames the results put may get
+                              ahead of merge_position.
+
+    Return Value:
+    Nothing.
+    """
+    # Interrupts are handled by the parent, which stops the workers.
+    signal.signal(signal.SIGINT, signal.SIG_IGN)
+
+    options = dict(options)
+    scheduler_options = options.pop("scheduler")
+    verdict_options = options.pop("verdicts")
+    latency_options = options.pop("latencies")
+    scheduler = HostScheduler(**scheduler_options)
+    verdicts = None if verdict_options is None else VerdictCache(**verdict_options)
+    latencies = None if latency_options is None else LatencyTracker(**latency_options)
+
+    try:
+        for position, (_, results_shard) in enumerate(sherlock_batch(
+            usernames, compile_plans(entries), QueryNotify(),
+            scheduler=scheduler, verdicts=verdicts, latencies=latencies, **options,
+        )):
+            with merge_moved:
+                merge_moved.wait_for(lambda position=position: position < merge_position.value + max_ahead)
+            results.put(("result", index, position, results_shard))
+        results.put(("done", index, {
+            "breakers": scheduler.breaker_state(),
+            "latencies": None if latencies is None else latencies.state(),
+        }))
+    except Exception as error:  # noqa: BLE001 - reported to the parent, which raises it
+        results.put(("error", index, f"{type(error).__name__}: {error}"))
+    finally:
+        if verdicts is not None:
+            verdicts.close()
+
+
+def sherlock_sharded(
+    usernames: Iterable[str],
+    site_data: dict[str, dict[str, str] | ProbePlan],
+    query_notify: QueryNotify,
+    workers: int,
+    scheduler: Optional[HostScheduler] = None,
+    verdicts: Optional[VerdictCache] = None,
+    latencies: Optional[LatencyTracker] = None,
+    max_ahead: int = DEFAULT_MAX_AHEAD,
+    **options,
+) -> Iterator[tuple[str, dict[str, dict[str, str | QueryResult]]]]:
+    """Run Sherlock Analysis For Many Usernames In Several Processes.
+
+    Keyword Arguments:
+    usernames              -- Iterable of strings indicating usernames that
+                              reports should be created against.  It is
+                              read in full before the first query.
+    site_data              -- Dictionary containing all of the site data.
+                              Values may be manifest entries, or ProbePlan()
+                              objects such as those of SitesInformation().
+    query_notify           -- Object with base type of QueryNotify().
+                              It is notified about each username in turn,
+                              in the order the usernames were given, once
+                              every shard is done with it.
+    workers                -- Number of worker processes.
+    scheduler              -- HostScheduler() object whose limits each
+                              worker applies to its hosts.  The circuit
+                              breakers of the workers are loaded back into
+                              it at the end.  Default of None for the
+                              limits set in the manifest only.
+    verdicts               -- VerdictCache() object, whose database each
+                              worker opens.  Default of None.
+    latencies              -- LatencyTracker() object, whose histograms
+                              each worker starts from.  Those of the workers
+                              are loaded back into it at the end.
+                              Default of None.
+    max_ahead              -- Number of usernames a worker may get ahead of
+                              the username being merged, bounding the
+                              results held for the slower workers.
+    options                -- Other keyword arguments of sherlock_batch(),
+                              such as timeout or engine.  max_concurrency
+                              applies to each worker.
+
+    Return Value:
+    Generator of (username, results) tuples, in the order the usernames were
+    given, as returned by sherlock_batch().  A RuntimeError is raised if a
+    worker fails.
+    """
+    usernames = list(usernames)
+    site_data = compile_plans(site_data)
+    shards = shard_by_host(site_data, workers)
+
+    options["scheduler"] = {} if scheduler is None else {
+        "max_in_flight": scheduler.max_in_flight,
+        "rate": scheduler.rate,
+        "failure_threshold": scheduler.failure_threshold,
+        "cooldown": scheduler.cooldown,
+        "breaker_state": scheduler.breaker_state(),
+    }
+    options["verdicts"] = None if verdicts is None else {
+        "path": verdicts.path,
+        "ttls": verdicts.ttls,
+    }
+    options["latencies"] = None if latencies is None else {
+        "margin": latencies.margin,
+        "state": latencies.state(),
+    }
+
+    # Worker processes are started afresh rather than forked, as this
+    # process may be running threads.
+    context = multiprocessing.get_context("spawn")
+    results = context.Queue()
+    merge_position = context.Value("i", 0)
+    merge_moved = context.Condition(merge_position.get_lock())
+    processes = [
+        context.Process(
+            target=scan_shard,
+            args=(index, usernames,
+                  {name: thaw(plan.information) for name, plan in shard.items()},
+                  options, results, merge_position, merge_moved, max(1, max_ahead)),
+            name=f"sherlock-shard-{index}",
+            daemon=True,
+        )
+        for index, shard in enumerate(shards)
+    ]
+    for process in processes:
+        process.start()
+
+    def receive() -> tuple:
+        while True:
+            try:
+                message = results.get(timeout=POLL_INTERVAL)
+            except queue.Empty:
+                for process in processes:
+                    if process.exitcode not in (None, 0):
+                        raise RuntimeError(f"Worker {process.name} exited with code {process.exitcode}")
+                continue
+            if message[0] == "error":
+                raise RuntimeError(f"Worker sherlock-shard-{message[1]} failed: {message[2]}")
+            return message
+
+    try:
+        received = {}
+        states = []
+        for position, username in enumerate(usernames):
+            # Only once the caller asks for the next username, so a slow
+            # caller slows the workers down too.
+            with merge_moved:
+                merge_position.value = position
+                merge_moved.notify_all()
+            while len(received.get(position, ())) < len(shards):
+                message = receive()
+                if message[0] == "result":
+                    _, index, at, results_shard = message
+                    received.setdefault(at, {})[index] = results_shard
+                else:
+                    states.append(message[2])
+
+            merged = {}
+            for results_shard in received.pop(position).values():
+                merged.update(results_shard)
+            results_total = {name: merged[name] for name in site_data if name in merged}
+
+            query_notify.start(username)
+            for results_site in results_total.values():
+                query_notify.update(results_site["status"])
+            yield username, results_total
+
+        while len(states) < len(shards):
+            states.append(receive()[2])
+        for state in states:
+            if scheduler is not None:
+                scheduler.load_breaker_state(state["breakers"])
+            if latencies is not None and state["latencies"] is not None:
+                latencies.load_state(state["latencies"])
+    finally:
+        for process in processes:
+            if process.is_alive():
+                process.terminate()
+            process.join()
+        results.close()
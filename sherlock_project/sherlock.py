@@ -10,39 +10,71 @@ networks.
 import sys
 
 try:
-    from sherlock_project.__init__ import import_error_test_var # noqa: F401
+    from sherlock_project.__init__ import import_error_test_var  # noqa: F401
 except ImportError:
     print("Did you run Sherlock with `python3 sherlock/sherlock.py ...`?")
     print("This is an outdated method. Please see https://sherlockproject.xyz/installation for up to date instructions.")
     sys.exit(1)
 
-import csv
-import signal
-import pandas as pd
+import hashlib
 import os
-import re
-from argparse import ArgumentParser, RawDescriptionHelpFormatter
+import signal
+from argparse import (
+    ArgumentParser,
+    ArgumentTypeError,
+    BooleanOptionalAction,
+    RawDescriptionHelpFormatter,
+)
+from collections import deque
+from concurrent.futures import Future
+from contextlib import suppress
+from json import dumps as json_dumps
 from json import loads as json_loads
 from time import monotonic
-from typing import Optional
+from typing import Iterable, Iterator, Optional
 
 import requests
+from colorama import init
 from requests_futures.sessions import FuturesSession
 
 from sherlock_project.__init__ import (
     __longname__,
     __shortname__,
     __version__,
-    forge_api_latest_release,
 )
-
-from sherlock_project.result import QueryStatus
-from sherlock_project.result import QueryResult
-from sherlock_project.notify import QueryNotify
-from sherlock_project.notify import QueryNotifyPrint
-from sherlock_project.sites import SitesInformation
-from colorama import init
-from argparse import ArgumentTypeError
+from sherlock_project.cache import DEFAULT_TTL, cache_dir, write_atomic
+from sherlock_project.export import CsvWriter, NdjsonWriter, TxtWriter, XlsxWriter
+from sherlock_project.latency import (
+    DEFAULT_TIMEOUT_MARGIN,
+    LatencyTracker,
+    request_timeout,
+)
+from sherlock_project.matcher import ERROR, WAF
+from sherlock_project.notify import QueryNotify, QueryNotifyGroup, QueryNotifyPrint
+from sherlock_project.probe import (
+    REQUEST_METHODS,
+    ProbePlan,
+    compile_plans,
+    interpolate_string,  # noqa: F401
+)
+from sherlock_project.result import QueryResult, QueryStatus
+from sherlock_project.retry import HEDGE_QUANTILE, RetryingProbe, RetryPolicy
+from sherlock_project.scheduler import (
+    CIRCUIT_OPEN,
+    DEFAULT_COOLDOWN,
+    DEFAULT_FAILURE_THRESHOLD,
+    CircuitOpenError,
+    HostScheduler,
+    ScheduledSession,
+)
+from sherlock_project.sites import LOCAL_MANIFEST_PATH, SitesInformation
+from sherlock_project.streaming import BodyReader
+from sherlock_project.update import (
+    UPDATE_CHECK_ENV,
+    start_update_check,
+    update_check_disabled,
+)
+from sherlock_project.warmup import DnsCache, warm_up_session
 
 
 class SherlockFuturesSession(FuturesSession):
@@ -62,7 +94,9 @@ class SherlockFuturesSession(FuturesSession):
         hooks                  -- Dictionary containing hooks to execute after
                                   request finishes.
         args                   -- Arguments.
-        kwargs                 -- Keyword arguments.
+        kwargs                 -- Keyword arguments.  A BodyReader() object
+                                  may be passed as body_reader to stream the
+                                  body through it.
 
         Return Value:
         Request object.
@@ -83,6 +117,9 @@ class SherlockFuturesSession(FuturesSession):
             Return Value:
             Nothing.
             """
+            # Time to the response headers, as measured by requests,
+            # excluding the time spent waiting for a worker thread.
+            resp.latency = resp.elapsed.total_seconds()
             resp.elapsed = monotonic() - start
 
             return
@@ -105,9 +142,129 @@ class SherlockFuturesSession(FuturesSession):
             # No response hook was already defined, so install it ourselves.
             hooks["response"] = [response_time]
 
-        return super(SherlockFuturesSession, self).request(
-            method, url, hooks=hooks, *args, **kwargs
+        # Read the body in the worker thread, stopping as soon as the reader
+        # has seen enough of it.
+        body_reader = kwargs.pop("body_reader", None)
+        if body_reader is not None:
+            kwargs["stream"] = True
+            follow_redirects = kwargs.get("allow_redirects", True)
+
+            def read_body(resp, *args, **kwargs):
+                # Hooks run for every hop of a redirect chain, but only the
+                # final response is read, as the async engine does.
+                if follow_redirects and resp.is_redirect:
+                    return
+                body_reader.read_response(resp)
+
+            hooks["response"].insert(1, read_body)
+
+        limit_key = kwargs.get("limit_key")
+        if self.scheduler is None or limit_key is None:
+            return super(SherlockFuturesSession, self).request(
+                method, url, hooks=hooks, *args, **kwargs
+            )
+
+        # Wait for the host before taking a worker thread, so that requests
+        # queued for a busy host do not hold up requests to other hosts.
+        limiter = self.scheduler.limiter(limit_key)
+        future = Future()
+
+        def finished(request_future):
+            limiter.release()
+            if request_future.cancelled():
+                future.cancel()
+            elif request_future.exception() is not None:
+                future.set_exception(request_future.exception())
+            else:
+                future.set_result(request_future.result())
+
+        def dispatch():
+            if not future.set_running_or_notify_cancel():
+                limiter.release()
+                return
+            try:
+                request_future = super(SherlockFuturesSession, self).request(
+                    method, url, hooks=hooks, *args, slot_held=True, **kwargs
+                )
+            except RuntimeError as error:
+                # Such as a session closed while the request waited
+                limiter.release()
+                future.set_exception(error)
+                return
+            request_future.add_done_callback(finished)
+
+        limiter.submit(dispatch)
+        return future
+
+    @property
+    def scheduler(self):
+        """HostScheduler() of the underlying session, if any."""
+        return getattr(self.session, "scheduler", None)
+
+
+# Probe engines which may be selected to run requests.
+ENGINES = ["threads", "async", "http2"]
+
+# Default number of worker threads for the "threads" engine.
+# This is probably vastly overkill.
+DEFAULT_MAX_WORKERS = 20
+
+# Number of usernames whose queries may run at the same time in a batch.
+BATCH_LOOKAHEAD = 4
+
+
+def open_session(
+    engine: str,
+    max_concurrency: Optional[int] = None,
+    proxy: Optional[str] = None,
+    scheduler: Optional[HostScheduler] = None,
+    dns_cache: Optional[DnsCache] = None,
+):
+    """Open Session For Probe Engine.
+
+    Keyword Arguments:
+    engine                 -- String indicating the probe engine to use.
+                              "threads" runs each request in a pool of
+                              worker threads, and "async" runs all requests
+                              on a single event loop.  "http2" is "async"
+                              offering HTTP/2, so that the requests to a
+                              host share one connection.
+    max_concurrency        -- Maximum number of requests in flight.  Default
+                              of None for DEFAULT_MAX_WORKERS threads, or
+                              DEFAULT_MAX_IN_FLIGHT requests on the event
+                              loop.
+    proxy                  -- String indicating the proxy URL.
+    scheduler              -- HostScheduler() object limiting requests to
+                              each host.  Default of None for no limits.
+    dns_cache              -- DnsCache() object to resolve host names
+                              through.  Only the "threads" engine uses it.
+                              Default of None to resolve them for each
+                              connection.
+
+    Return Value:
+    Session object whose request methods return futures.
+    """
+    if engine in ("async", "http2"):
+        # httpx is only imported by runs which use it.
+        from sherlock_project.aio import DEFAULT_MAX_IN_FLIGHT, SherlockAsyncSession
+
+        return SherlockAsyncSession(
+            max_in_flight=max_concurrency or DEFAULT_MAX_IN_FLIGHT,
+            proxy=proxy,
+            scheduler=scheduler,
+            http2=engine == "http2",
         )
+    if engine != "threads":
+        raise ValueError(f"Unsupported engine '{engine}'")
+
+    # Normal requests, waiting for the limits of each host
+    underlying_session = ScheduledSession(scheduler, dns_cache=dns_cache)
+
+    # Create multi-threaded session for all requests.
+    return SherlockFuturesSession(
+        max_workers=max_concurrency or DEFAULT_MAX_WORKERS,
+        session=underlying_session,
+    )
 
 
 def get_response(request_future, error_type, social_network):
@@ -121,6 +278,10 @@ def get_response(request_future, error_type, social_network):
         if response.status_code:
             # Status code exists in response object
             error_context = None
+    except CircuitOpenError as errb:
+        # The host kept failing, so it was not asked again.
+        error_context = CIRCUIT_OPEN
+        exception_text = str(errb)
     except requests.exceptions.HTTPError as errh:
         error_context = "HTTP Error"
         exception_text = str(errh)
@@ -140,16 +301,6 @@ def get_response(request_future, error_type, social_network):
     return response, error_context, exception_text
 
 
-def interpolate_string(input_object, username):
-    if isinstance(input_object, str):
-        return input_object.replace("{}", username)
-    elif isinstance(input_object, dict):
-        return {k: interpolate_string(v, username) for k, v in input_object.items()}
-    elif isinstance(input_object, list):
-        return [interpolate_string(i, username) for i in input_object]
-    return input_object
-
-
 def check_for_parameter(username):
     """checks if {?} exists in the username
     if exist it means that sherlock is looking for more multiple username"""
@@ -169,11 +320,22 @@ def multiple_usernames(username):
 
 def sherlock(
     username: str,
-    site_data: dict[str, dict[str, str]],
+    site_data: dict[str, dict[str, str] | ProbePlan],
     query_notify: QueryNotify,
     dump_response: bool = False,
     proxy: Optional[str] = None,
     timeout: int = 60,
+    engine: str = "threads",
+    max_concurrency: Optional[int] = None,
+    scheduler: Optional[HostScheduler] = None,
+    session=None,
+    verdicts=None,
+    connect_timeout: Optional[float] = None,
+    latencies=None,
+    retry_policy=None,
+    retain_bodies: bool | int = False,
+    digest_bodies: bool = False,
+    warm_up: bool = False,
 ) -> dict[str, dict[str, str | QueryResult]]:
     """Run Sherlock Analysis.
 
@@ -183,12 +345,59 @@ def sherlock(
     username               -- String indicating username that report
                               should be created against.
     site_data              -- Dictionary containing all of the site data.
+                              Values may be manifest entries, or ProbePlan()
+                              objects such as those of SitesInformation().
+                              It is only read, so one dictionary may be
+                              shared by searches running at the same time.
     query_notify           -- Object with base type of QueryNotify().
                               This will be used to notify the caller about
                               query results.
     proxy                  -- String indicating the proxy URL
     timeout                -- Time in seconds to wait before timing out request.
                               Default is 60 seconds.
+    engine                 -- String indicating the probe engine to use, one
+                              of ENGINES.  Default is "threads".
+    max_concurrency        -- Maximum number of requests in flight.
+                              Default of None for the engine's default.
+    scheduler              -- HostScheduler() object limiting requests to
+                              each host.  Default of None for a scheduler
+                              applying only the limits set in the manifest.
+    session                -- Session returned by open_session(), to share
+                              its connections with other searches.  It is
+                              left open, and engine, max_concurrency and
+                              scheduler are ignored.  Default of None to
+                              open a session for this search only.
+    verdicts               -- VerdictCache() object.  Sites with a recent
+                              verdict in it are not probed again, and new
+                              verdicts are added to it.  Default of None
+                              to probe every site.
+    connect_timeout        -- Time in seconds to wait for a connection to be
+                              made.  Default of None for timeout.
+    latencies              -- LatencyTracker() object.  The latency of every
+                              answer is recorded in it, and the timeout of
+                              each site is derived from the latencies seen
+                              so far, up to timeout.  Default of None to
+                              wait timeout seconds for every site.
+    retry_policy           -- RetryPolicy() object deciding which failed
+                              probes are sent again, and whether slow
+                              probes are hedged.  Default of None to send
+                              every probe once.
+    retain_bodies          -- Boolean indicating whether to keep the body of
+                              each response as response_text, or the
+                              number of bytes of each body to keep.
+                              Default of False to keep none, so that a
+                              search holds no pages once it is done.
+                              Bodies are always kept with dump_response.
+    digest_bodies          -- Boolean indicating whether to keep a short
+                              hash of the body of each response as
+                              body_digest, which shows whether a page has
+                              changed without keeping it.  Default of False.
+    warm_up                -- Boolean indicating whether to resolve the host
+                              of every site and open a connection to it
+                              before the first query, keeping the
+                              addresses for the whole session.  Skipped
+                              when a proxy is used, so that no name is
+                              looked up outside of it.  Default of False.
 
     Return Value:
     Dictionary containing results from report. Key of dictionary is the name
@@ -200,54 +409,251 @@ def sherlock(
                        account existence.
         http_status:   HTTP status code of query which checked for existence on
                        site.
-        response_text: Text that came back from request.  May be None if
-                       there was an HTTP error when checking for existence.
+        response_text: Text that came back from request, if retain_bodies
+                       is set.  May be None if there was an HTTP error when
+                       checking for existence.
+        body_digest:   Hash of the text that came back from request, if
+                       digest_bodies is set.
     """
 
     # Notify caller that we are starting the query.
     query_notify.start(username)
 
-    # Normal requests
-    underlying_session = requests.session()
+    site_data = compile_plans(site_data)
+    warm_up = warm_up and proxy is None
+    owns_session = session is None
+    if owns_session:
+        session = open_session(
+            engine,
+            max_concurrency=max_concurrency,
+            proxy=proxy,
+            scheduler=scheduler or HostScheduler(),
+            dns_cache=DnsCache() if warm_up else None,
+        )
+    try:
+        if warm_up:
+            # The probe URL of "{}" is the template of the URL.
+            warm_up_session(session, [plan.probe_url("{}") for plan in site_data.values()],
+                            connect_timeout or timeout)
+        results_total, pending = submit_queries(
+            username, site_data, session, proxy=proxy, timeout=timeout,
+            dump_response=dump_response, verdicts=verdicts,
+            connect_timeout=connect_timeout, latencies=latencies,
+            retry_policy=retry_policy,
+        )
+        return collect_queries(
+            username, site_data, query_notify, results_total, pending,
+            dump_response=dump_response, verdicts=verdicts, latencies=latencies,
+            retain_bodies=retain_bodies, digest_bodies=digest_bodies,
+        )
+    finally:
+        if owns_session:
+            session.close()
 
-    # Limit number of workers to 20.
-    # This is probably vastly overkill.
-    if len(site_data) >= 20:
-        max_workers = 20
-    else:
-        max_workers = len(site_data)
 
-    # Create multi-threaded session for all requests.
-    session = SherlockFuturesSession(
-        max_workers=max_workers, session=underlying_session
-    )
+def sherlock_batch(
+    usernames: Iterable[str],
+    site_data: dict[str, dict[str, str] | ProbePlan],
+    query_notify: QueryNotify,
+    dump_response: bool = False,
+    proxy: Optional[str] = None,
+    timeout: int = 60,
+    engine: str = "threads",
+    max_concurrency: Optional[int] = None,
+    scheduler: Optional[HostScheduler] = None,
+    lookahead: int = BATCH_LOOKAHEAD,
+    session=None,
+    verdicts=None,
+    connect_timeout: Optional[float] = None,
+    latencies=None,
+    retry_policy=None,
+    retain_bodies: bool | int = False,
+    digest_bodies: bool = False,
+    warm_up: bool = False,
+) -> Iterator[tuple[str, dict[str, dict[str, str | QueryResult]]]]:
+    """Run Sherlock Analysis For Many Usernames.
+
+    Checks for existence of each username on various social media sites.
+    All queries share one session, so connections are reused between
+    usernames.  While the results for one username are being collected,
+    the queries for the next usernames are already running, so a slow site
+    does not hold up the usernames after it.
+
+    Keyword Arguments:
+    usernames              -- Iterable of strings indicating usernames that
+                              reports should be created against.  It is
+                              consumed lazily, so it may be a generator
+                              reading from a file.
+    site_data              -- Dictionary containing all of the site data.
+                              Values may be manifest entries, or ProbePlan()
+                              objects such as those of SitesInformation().
+                              It is only read, so one dictionary may be
+                              shared by searches running at the same time.
+    query_notify           -- Object with base type of QueryNotify().
+                              It is notified about each username in turn,
+                              in the order the usernames were given.
+    dump_response          -- Boolean indicating whether to dump the HTTP
+                              responses to stdout.
+    proxy                  -- String indicating the proxy URL
+    timeout                -- Time in seconds to wait before timing out request.
+                              Default is 60 seconds.
+    engine                 -- String indicating the probe engine to use, one
+                              of ENGINES.  Default is "threads".
+    max_concurrency        -- Maximum number of requests in flight.
+                              Default of None for the engine's default.
+    scheduler              -- HostScheduler() object limiting requests to
+                              each host.  Default of None for a scheduler
+                              applying only the limits set in the manifest.
+    session                -- Session returned by open_session(), to share
+                              its connections with other searches.  It is
+                              left open, and engine, max_concurrency and
+                              scheduler are ignored.  Default of None to
+                              open a session for this search only.
+    lookahead              -- Number of usernames whose queries may be
+                              running at the same time.
+    verdicts               -- VerdictCache() object.  Sites with a recent
+                              verdict in it are not probed again, and new
+                              verdicts are added to it.  Default of None
+                              to probe every site.
+    connect_timeout        -- Time in seconds to wait for a connection to be
+                              made.  Default of None for timeout.
+    latencies              -- LatencyTracker() object.  The latency of every
+                              answer is recorded in it, and the timeout of
+                              each site is derived from the latencies seen
+                              so far, up to timeout.  Default of None to
+                              wait timeout seconds for every site.
+    retry_policy           -- RetryPolicy() object deciding which failed
+                              probes are sent again, and whether slow
+                              probes are hedged.  Default of None to send
+                              every probe once.
+    retain_bodies          -- Boolean indicating whether to keep the body of
+                              each response as response_text, or the
+                              number of bytes of each body to keep.
+                              Default of False to keep none, so that a
+                              search holds no pages once it is done.
+                              Bodies are always kept with dump_response.
+    digest_bodies          -- Boolean indicating whether to keep a short
+                              hash of the body of each response as
+                              body_digest, which shows whether a page has
+                              changed without keeping it.  Default of False.
+    warm_up                -- Boolean indicating whether to resolve the host
+                              of every site and open a connection to it
+                              before the first query, keeping the
+                              addresses for the whole session.  Skipped
+                              when a proxy is used, so that no name is
+                              looked up outside of it.  Default of False.
+
+    Return Value:
+    Generator of (username, results) tuples, in the order the usernames were
+    given.  Each results dictionary has the same format as the one returned
+    by sherlock().
+    """
+    site_data = compile_plans(site_data)
+    warm_up = warm_up and proxy is None
+    owns_session = session is None
+    if owns_session:
+        session = open_session(
+            engine,
+            max_concurrency=max_concurrency,
+            proxy=proxy,
+            scheduler=scheduler or HostScheduler(),
+            dns_cache=DnsCache() if warm_up else None,
+        )
+    try:
+        if warm_up:
+            # The probe URL of "{}" is the template of the URL.
+            warm_up_session(session, [plan.probe_url("{}") for plan in site_data.values()],
+                            connect_timeout or timeout)
+        usernames = iter(usernames)
+        submitted = deque()
+
+        def submit_next() -> bool:
+            username = next(usernames, None)
+            if username is None:
+                return False
+            submitted.append(
+                (username, *submit_queries(username, site_data, session, proxy=proxy,
+                                           timeout=timeout, dump_response=dump_response,
+                                           verdicts=verdicts, connect_timeout=connect_timeout,
+                                           latencies=latencies, retry_policy=retry_policy))
+            )
+            return True
+
+        while len(submitted) < max(lookahead, 1) and submit_next():
+            pass
+
+        while submitted:
+            username, results_total, pending = submitted.popleft()
+            # Keep the session busy with the next username while this one
+            # is collected.
+            submit_next()
+
+            query_notify.start(username)
+            yield username, collect_queries(
+                username, site_data, query_notify, results_total, pending,
+                dump_response=dump_response, verdicts=verdicts, latencies=latencies,
+                retain_bodies=retain_bodies, digest_bodies=digest_bodies,
+            )
+    finally:
+        if owns_session:
+            session.close()
+
+
+def submit_queries(username, site_data, session, proxy=None, timeout=60,
+                   dump_response=False, verdicts=None, connect_timeout=None,
+                   latencies=None, retry_policy=None):
+    """Submit Queries.
+
+    Starts the request for every site, without waiting for any of them.
+
+    Keyword Arguments:
+    username               -- String indicating username to query.
+    site_data              -- Dictionary of site name to ProbePlan() object.
+    session                -- Session returned by open_session().
+    proxy                  -- String indicating the proxy URL
+    timeout                -- Time in seconds to wait before timing out request.
+    dump_response          -- Boolean indicating whether the responses will be
+                              dumped, in which case bodies are read in full,
+                              and no cached verdict is used.
+    verdicts               -- VerdictCache() object to look up recent
+                              verdicts in.  Default of None.
+    connect_timeout        -- Time in seconds to wait for a connection to be
+                              made.  Default of None for timeout.
+    latencies              -- LatencyTracker() object to derive the timeout
+                              of each site from, and when to hedge its
+                              probes.  Default of None.
+    retry_policy           -- RetryPolicy() object.  Default of None.
+
+    Return Value:
+    Tuple of the partial results dictionary, and a dictionary of request
+    futures keyed by site name.  Sites that need no request (because the
+    username is not allowed there, or it has a recent verdict) already have
+    their status recorded.
+    """
 
     # Results from analysis of all sites
     results_total = {}
 
-    # First create futures for all requests. This allows for the requests to run in parallel
-    for social_network, net_info in site_data.items():
-        # Results from analysis of this specific site
-        results_site = {"url_main": net_info.get("urlMain")}
+    # Futures for requests which are still running
+    pending = {}
 
-        # Record URL of main site
-
-        # A user agent is needed because some sites don't return the correct
-        # information since they think that we are bots (Which we actually are...)
-        headers = {
-            "User-Agent": "Mozilla/5.0 (X11; Linux x86_64; rv:129.0) Gecko/20100101 Firefox/129.0",
-        }
+    # Recent verdicts, decided by the current manifest entries
+    cached = {}
+    if verdicts is not None and not dump_response:
+        cached = verdicts.lookup(
+            username, {name: plan.revision for name, plan in site_data.items()}
+        )
 
-        if "headers" in net_info:
-            # Override/append any extra headers required by a given site.
-            headers.update(net_info["headers"])
+    # First create futures for all requests. This allows for the requests to run in parallel
+    for social_network, plan in site_data.items():
+        # Results from analysis of this specific site
+        results_site = {"url_main": plan.url_main}
 
         # URL of user on site (if it exists)
-        url = interpolate_string(net_info["url"], username.replace(' ', '%20'))
+        url = plan.user_url(username)
 
         # Don't make request if username is invalid for the site
-        regex_check = net_info.get("regexCheck")
-        if regex_check and re.search(regex_check, username) is None:
+        if not plan.allows(username):
             # No need to do the check at the site: this username is not allowed.
             results_site["status"] = QueryResult(
                 username, social_network, url, QueryStatus.ILLEGAL
@@ -255,88 +661,115 @@ def sherlock(
             results_site["url_user"] = ""
             results_site["http_status"] = ""
             results_site["response_text"] = ""
-            query_notify.update(results_site["status"])
+        elif social_network in cached:
+            # A recent verdict stands in for the request.
+            results_site["status"] = cached[social_network]
+            results_site["url_user"] = cached[social_network].site_url_user
+            results_site["http_status"] = cached[social_network].http_status
+            results_site["response_text"] = ""
+            results_site["cached"] = True
         else:
             # URL of user on site (if it exists)
             results_site["url_user"] = url
-            url_probe = net_info.get("urlProbe")
-            request_method = net_info.get("request_method")
-            request_payload = net_info.get("request_payload")
-            request = None
-
-            if request_method is not None:
-                if request_method == "GET":
-                    request = session.get
-                elif request_method == "HEAD":
-                    request = session.head
-                elif request_method == "POST":
-                    request = session.post
-                elif request_method == "PUT":
-                    request = session.put
-                else:
-                    raise RuntimeError(f"Unsupported request_method for {url}")
-
-            if request_payload is not None:
-                request_payload = interpolate_string(request_payload, username)
-
-            if url_probe is None:
-                # Probe URL is normal one seen by people out on the web.
-                url_probe = url
-            else:
-                # There is a special URL for probing existence separate
-                # from where the user profile normally can be found.
-                url_probe = interpolate_string(url_probe, username)
-
-            if request is None:
-                if net_info["errorType"] == "status_code":
-                    # In most cases when we are detecting by status code,
-                    # it is not necessary to get the entire body:  we can
-                    # detect fine with just the HEAD response.
-                    request = session.head
-                else:
-                    # Either this detect method needs the content associated
-                    # with the GET response, or this specific website will
-                    # not respond properly unless we request the whole page.
-                    request = session.get
-
-            if net_info["errorType"] == "response_url":
-                # Site forwards request to a different URL if username not
-                # found.  Disallow the redirect so we can capture the
-                # http status from the original URL request.
-                allow_redirects = False
+
+            if plan.method not in REQUEST_METHODS:
+                raise RuntimeError(f"Unsupported request_method for {url}")
+            request = getattr(session, plan.method.lower())
+
+            # Stream the body through a reader which stops as soon as an error
+            # message or WAF fingerprint shows up, or the site's byte cap is
+            # reached, rather than downloading whole profile pages.
+            stream = plan.stream and not dump_response
+
+            # Group the request with others to the same host, so that the
+            # limits of the host are respected.
+            limit_key = None
+            if session.scheduler is not None:
+                limit_key = session.scheduler.register(plan.host_key, plan.rate_limit)
+
+            # A site which usually answers quickly is not waited on for the
+            # full timeout.
+            if latencies is not None:
+                site_timeout = latencies.timeout(social_network, timeout, connect_timeout)
             else:
-                # Allow whatever redirect that the site wants to do.
-                # The final result of the request will be what is available.
-                allow_redirects = True
+                site_timeout = request_timeout(timeout, connect_timeout)
+
+            request_kwargs = {
+                "url": plan.probe_url(username),
+                "headers": plan.headers,
+                "allow_redirects": plan.allow_redirects,
+                "timeout": site_timeout,
+                "json": plan.request_payload(username),
+                "limit_key": limit_key,
+            }
+            if proxy is not None:
+                request_kwargs["proxies"] = {"http": proxy, "https": proxy}
+
+            def send(on_send=None, request=request, plan=plan, stream=stream,
+                     request_kwargs=request_kwargs):
+                # Every attempt reads its own body.
+                body_reader = None
+                if stream:
+                    body_reader = BodyReader(plan.matcher, max_bytes=plan.max_body_bytes)
+                if on_send is not None:
+                    return request(**request_kwargs, body_reader=body_reader, on_send=on_send)
+                return request(**request_kwargs, body_reader=body_reader)
 
             # This future starts running the request in a new thread, doesn't block the main thread
-            if proxy is not None:
-                proxies = {"http": proxy, "https": proxy}
-                future = request(
-                    url=url_probe,
-                    headers=headers,
-                    proxies=proxies,
-                    allow_redirects=allow_redirects,
-                    timeout=timeout,
-                    json=request_payload,
-                )
+            if retry_policy is None:
+                future = send()
             else:
-                future = request(
-                    url=url_probe,
-                    headers=headers,
-                    allow_redirects=allow_redirects,
-                    timeout=timeout,
-                    json=request_payload,
-                )
+                # Probes slower than their site usually is are sent twice.
+                hedge_after = None
+                if retry_policy.hedge and latencies is not None:
+                    hedge_after = latencies.quantile(social_network, HEDGE_QUANTILE)
+                future = RetryingProbe(send, retry_policy, hedge_after).future
 
-            # Store future in data for access later
-            net_info["request_future"] = future
+            # Store future for access later
+            pending[social_network] = future
 
         # Add this site's results into final dictionary with all the other results.
         results_total[social_network] = results_site
 
+    return results_total, pending
+
+
+def collect_queries(username, site_data, query_notify, results_total, pending,
+                    dump_response=False, verdicts=None, latencies=None,
+                    retain_bodies=False, digest_bodies=False):
+    """Collect Queries.
+
+    Waits for the requests started by submit_queries() and classifies them.
+
+    Keyword Arguments:
+    username               -- String indicating username that was queried.
+    site_data              -- Dictionary of site name to ProbePlan() object.
+    query_notify           -- Object with base type of QueryNotify().
+    results_total          -- Partial results returned by submit_queries().
+    pending                -- Futures returned by submit_queries().
+    dump_response          -- Boolean indicating whether to dump the HTTP
+                              responses to stdout.
+    verdicts               -- VerdictCache() object to add the verdicts of
+                              the requests to.  Default of None.
+    latencies              -- LatencyTracker() object to record the latency
+                              of every answer in.  Default of None.
+    retain_bodies          -- Boolean indicating whether to keep the body of
+                              each response, or the number of bytes of each
+                              body to keep.  Default of False.
+    digest_bodies          -- Boolean indicating whether to keep a hash of
+                              the body of each response.  Default of False.
+
+    Return Value:
+    Dictionary containing results from report.  See sherlock().
+    """
+
+    # Report sites where no request was needed first
+    for results_site in results_total.values():
+        if results_site.get("status") is not None:
+            query_notify.update(results_site["status"])
+
     # Open the file containing account links
-    for social_network, net_info in site_data.items():
+    for social_network, plan in site_data.items():
         # Retrieve results again
         results_site = results_total.get(social_network)
 
@@ -348,12 +781,10 @@ def sherlock(
             continue
 
         # Get the expected error type
-        error_type = net_info["errorType"]
-        if isinstance(error_type, str):
-            error_type: list[str] = [error_type]
+        error_type = list(plan.error_type)
 
         # Retrieve future and ensure it has finished
-        future = net_info["request_future"]
+        future = pending.pop(social_network)
         r, error_text, exception_text = get_response(
             request_future=future, error_type=error_type, social_network=social_network
         )
@@ -364,35 +795,56 @@ def sherlock(
         except AttributeError:
             response_time = None
 
+        if latencies is not None:
+            latency = getattr(r, "latency", None)
+            if latency is not None:
+                latencies.observe(social_network, latency)
+            elif error_text == "Timeout Error":
+                # Slower than any latency, so the site keeps its full timeout
+                # until timeouts are rare.
+                latencies.observe(social_network, float("inf"))
+
         # Attempt to get request information
         try:
             http_status = r.status_code
         except Exception:
             http_status = "?"
+        # Decode the body once, as requests decodes it again on every access
         try:
-            response_text = r.text.encode(r.encoding or "UTF-8")
+            text = r.text
         except Exception:
-            response_text = ""
+            text = ""
+        # Bodies are only kept when asked for, as those of a batch of
+        # usernames would otherwise fill the memory.
+        response_text = None
+        body_digest = None
+        if retain_bodies or digest_bodies or dump_response:
+            try:
+                body = text.encode(getattr(r, "encoding", None) or "UTF-8")
+            except (LookupError, UnicodeError):
+                body = b""
+            if retain_bodies is True or dump_response:
+                response_text = body
+            elif retain_bodies:
+                response_text = body[:retain_bodies]
+            if digest_bodies:
+                body_digest = hashlib.blake2b(body, digest_size=16).hexdigest()
 
         query_status = QueryStatus.UNKNOWN
         error_context = None
 
-        # As WAFs advance and evolve, they will occasionally block Sherlock and
-        # lead to false positives and negatives. Fingerprints should be added
-        # here to filter results that fail to bypass WAFs. Fingerprints should
-        # be highly targetted. Comment at the end of each fingerprint to
-        # indicate target and date fingerprinted.
-        WAFHitMsgs = [
-            r'.loading-spinner{visibility:hidden}body.no-js .challenge-running{display:none}body.dark{background-color:#222;color:#d9d9d9}body.dark a{color:#fff}body.dark a:hover{color:#ee730a;text-decoration:underline}body.dark .lds-ring div{border-color:#999 transparent transparent}body.dark .font-red{color:#b20f03}body.dark', # 2024-05-13 Cloudflare
-            r'<span id="challenge-error-text">', # 2024-11-11 Cloudflare error page
-            r'AwsWafIntegration.forceRefreshToken', # 2024-11-11 Cloudfront (AWS)
-            r'{return l.onPageView}}),Object.defineProperty(r,"perimeterxIdentifiers",{enumerable:' # 2024-04-09 PerimeterX / Human Security
-        ]
+        # Find every WAF fingerprint and error message in one scan.  A
+        # streamed body was already searched as it was read.
+        found = {}
+        if error_text is None:
+            found = getattr(r, "body_matches", None)
+            if found is None:
+                found = plan.matcher.scan(text)
 
         if error_text is not None:
             error_context = error_text
 
-        elif any(hitMsg in r.text for hitMsg in WAFHitMsgs):
+        elif WAF in found:
             query_status = QueryStatus.WAF
 
         else:
@@ -401,39 +853,18 @@ def sherlock(
                 query_status = QueryStatus.UNKNOWN
             else:
                 if "message" in error_type:
-                    # error_flag True denotes no error found in the HTML
-                    # error_flag False denotes error found in the HTML
-                    error_flag = True
-                    errors = net_info.get("errorMsg")
-                    # errors will hold the error message
-                    # it can be string or list
-                    # by isinstance method we can detect that
-                    # and handle the case for strings as normal procedure
-                    # and if its list we can iterate the errors
-                    if isinstance(errors, str):
-                        # Checks if the error message is in the HTML
-                        # if error is present we will set flag to False
-                        if errors in r.text:
-                            error_flag = False
+                    # The error message is in the HTML if the username was
+                    # not found.  The manifest may give a single error
+                    # message or a list of them.
+                    if ERROR in found:
+                        query_status = QueryStatus.AVAILABLE
                     else:
-                        # If it's list, it will iterate all the error message
-                        for error in errors:
-                            if error in r.text:
-                                error_flag = False
-                                break
-                    if error_flag:
                         query_status = QueryStatus.CLAIMED
-                    else:
-                        query_status = QueryStatus.AVAILABLE
 
                 if "status_code" in error_type and query_status is not QueryStatus.AVAILABLE:
-                    error_codes = net_info.get("errorCode")
+                    error_codes = plan.error_codes
                     query_status = QueryStatus.CLAIMED
 
-                    # Type consistency, allowing for both singlets and lists in manifest
-                    if isinstance(error_codes, int):
-                        error_codes = [error_codes]
-
                     if error_codes is not None and r.status_code in error_codes:
                         query_status = QueryStatus.AVAILABLE
                     elif r.status_code >= 300 or r.status_code < 200:
@@ -457,7 +888,7 @@ def sherlock(
             print(f"TARGET URL    : {url}")
             print(f"TEST METHOD   : {error_type}")
             try:
-                print(f"STATUS CODES  : {net_info['errorCode']}")
+                print(f"STATUS CODES  : {plan.information['errorCode']}")
             except KeyError:
                 pass
             print("Results...")
@@ -466,12 +897,12 @@ def sherlock(
             except Exception:
                 pass
             try:
-                print(f"ERROR TEXT    : {net_info['errorMsg']}")
+                print(f"ERROR TEXT    : {plan.information['errorMsg']}")
             except KeyError:
                 pass
             print(">>>>> BEGIN RESPONSE TEXT")
             try:
-                print(r.text)
+                print(text)
             except Exception:
                 pass
             print("<<<<< END RESPONSE TEXT")
@@ -486,6 +917,9 @@ def sherlock(
             status=query_status,
             query_time=response_time,
             context=error_context,
+            http_status=http_status if isinstance(http_status, int) else None,
+            retries=getattr(future, "retries", 0),
+            hedges=getattr(future, "hedges", 0),
         )
         query_notify.update(result)
 
@@ -495,10 +929,21 @@ def sherlock(
         # Save results from request
         results_site["http_status"] = http_status
         results_site["response_text"] = response_text
+        if digest_bodies:
+            results_site["body_digest"] = body_digest
 
         # Add this site's results into final dictionary with all of the other results.
         results_total[social_network] = results_site
 
+    if verdicts is not None:
+        verdicts.add(
+            (site_data[social_network].revision, results_site["status"])
+            for social_network, results_site in results_total.items()
+            if results_site["status"].status is not QueryStatus.ILLEGAL
+            and results_site["status"].context != CIRCUIT_OPEN
+            and not results_site.get("cached")
+        )
+
     return results_total
 
 
@@ -527,6 +972,33 @@ def timeout_check(value):
     return float_value
 
 
+def report_update(update_check) -> bool:
+    """Report Update.
+
+    Prints the result of an update check, if it has finished.
+
+    Keyword Arguments:
+    update_check           -- Future returned by start_update_check(), or
+                              None if the check is disabled.
+
+    Return Value:
+    Boolean indicating whether the check has been reported.
+    """
+    if update_check is None or not update_check.done():
+        return False
+
+    try:
+        message = update_check.result()
+    except Exception as error:
+        print(f"A problem occurred while checking for an update: {error}")
+        return True
+
+    if message is not None:
+        print(message)
+
+    return True
+
+
 def handler(signal_received, frame):
     """Exit gracefully without throwing errors
 
@@ -582,6 +1054,13 @@ def main():
         default=False,
         help="Create the standard file for the modern Microsoft Excel spreadsheet (xlsx).",
     )
+    parser.add_argument(
+        "--ndjson",
+        action="store_true",
+        dest="ndjson",
+        default=False,
+        help="Create a Newline Delimited JSON (NDJSON) file, with one result per line.",
+    )
     parser.add_argument(
         "--site",
         action="append",
@@ -623,6 +1102,132 @@ def main():
         default=60,
         help="Time (in seconds) to wait for response to requests (Default: 60)",
     )
+    parser.add_argument(
+        "--connect-timeout",
+        action="store",
+        metavar="SECONDS",
+        dest="connect_timeout",
+        type=timeout_check,
+        default=None,
+        help="Time (in seconds) to wait for a connection to be made (Default: the timeout)",
+    )
+    parser.add_argument(
+        "--adaptive-timeouts",
+        action=BooleanOptionalAction,
+        dest="adaptive_timeouts",
+        default=False,
+        help="Wait on each site for the 99th percentile of its latencies so far plus "
+        f"{DEFAULT_TIMEOUT_MARGIN:g} seconds, once it has answered a few times, rather than the full timeout "
+        "(Default: off, unless --hedge is given)",
+    )
+    parser.add_argument(
+        "--keep-latency",
+        action="store_true",
+        dest="keep_latency",
+        default=False,
+        help="Remember the latencies of each site between runs, so that timeouts are adapted from the start.",
+    )
+    parser.add_argument(
+        "--retries",
+        action="store",
+        metavar="RETRIES",
+        dest="retries",
+        type=int,
+        default=0,
+        help="Number of times to send a probe again after a connection error or 429/502/503/504 answer, "
+        "waiting a random, growing time or as long as Retry-After asks. Probes whose answer timed out are "
+        "not sent again (Default: 0)",
+    )
+    parser.add_argument(
+        "--hedge",
+        action="store_true",
+        dest="hedge",
+        default=False,
+        help="Send a probe a second time once it is slower than 95%% of the earlier answers of its site, "
+        "and use whichever answer comes first. Turns on --adaptive-timeouts. With the threads engine the second "
+        "request waits for a free worker like any other.",
+    )
+    parser.add_argument(
+        "--warm-up",
+        action="store_true",
+        dest="warm_up",
+        default=False,
+        help="Resolve the host of every site and open a connection to it before the first probe, "
+        "keeping the addresses for the whole run. Ignored with a proxy, and with the async engine.",
+    )
+    parser.add_argument(
+        "--engine",
+        action="store",
+        dest="engine",
+        choices=ENGINES,
+        default="threads",
+        help="Probe engine used to run requests. 'async' runs every request on a single event loop, and 'http2' "
+        "does the same over HTTP/2 where servers offer it, sending all requests to a host over one connection. "
+        "'http2' needs the h2 package (Default: threads)",
+    )
+    parser.add_argument(
+        "--max-concurrency",
+        action="store",
+        metavar="REQUESTS",
+        dest="max_concurrency",
+        type=int,
+        default=None,
+        help="Maximum number of requests in flight (Default: 20 for threads, 1000 for async)",
+    )
+    parser.add_argument(
+        "--workers",
+        action="store",
+        metavar="PROCESSES",
+        dest="workers",
+        type=int,
+        default=1,
+        help="Number of processes to split the sites between, each with its own engine and connections. "
+        "The sites of a host stay in one process, and --max-concurrency applies to each (Default: 1)",
+    )
+    parser.add_argument(
+        "--host-concurrency",
+        action="store",
+        metavar="REQUESTS",
+        dest="host_concurrency",
+        type=int,
+        default=None,
+        help="Maximum number of requests in flight to any one host (Default: no limit)",
+    )
+    parser.add_argument(
+        "--host-rate",
+        action="store",
+        metavar="REQUESTS_PER_SECOND",
+        dest="host_rate",
+        type=float,
+        default=None,
+        help="Maximum number of requests per second to any one host (Default: no limit)",
+    )
+    parser.add_argument(
+        "--circuit-breaker",
+        action="store",
+        metavar="FAILURES",
+        dest="circuit_breaker",
+        type=int,
+        default=0,
+        help="Skip a host for a while after this many consecutive connection errors or timeouts, "
+        f"reporting its sites as unknown, such as {DEFAULT_FAILURE_THRESHOLD}. 0 never skips a host (Default: 0)",
+    )
+    parser.add_argument(
+        "--circuit-cooldown",
+        action="store",
+        metavar="SECONDS",
+        dest="circuit_cooldown",
+        type=float,
+        default=DEFAULT_COOLDOWN,
+        help=f"Time (in seconds) a failing host is skipped before it is tried again (Default: {DEFAULT_COOLDOWN:g})",
+    )
+    parser.add_argument(
+        "--keep-circuits",
+        action="store_true",
+        dest="keep_circuits",
+        default=False,
+        help="Remember failing hosts between runs, so that a host which is down is skipped from the start.",
+    )
     parser.add_argument(
         "--print-all",
         action="store_true",
@@ -646,11 +1251,19 @@ def main():
     )
     parser.add_argument(
         "username",
-        nargs="+",
+        nargs="*",
         metavar="USERNAMES",
         action="store",
         help="One or more usernames to check with social networks. Check similar usernames using {?} (replace to '_', '-', '.').",
     )
+    parser.add_argument(
+        "--username-file",
+        "-uf",
+        metavar="USERNAME_FILE",
+        dest="username_file",
+        default=None,
+        help="Read usernames to check from this file, one per line. All usernames share one connection pool.",
+    )
     parser.add_argument(
         "--browse",
         "-b",
@@ -668,6 +1281,43 @@ def main():
         help="Force the use of the local data.json file.",
     )
 
+    parser.add_argument(
+        "--store",
+        action="store",
+        metavar="DATABASE_URL",
+        dest="store",
+        default=None,
+        help="Record every result in a database for later lookups: postgresql://... or sqlite:///path",
+    )
+
+    parser.add_argument(
+        "--cache",
+        action=BooleanOptionalAction,
+        dest="cache",
+        default=False,
+        help="Reuse recent verdicts for the same username and site instead of probing the site again, "
+        "and keep the new ones. Verdicts expire sooner for errors than for found or available accounts, "
+        "and whenever the site's entry in data.json changes (Default: --no-cache)",
+    )
+
+    parser.add_argument(
+        "--no-update-check",
+        action="store_true",
+        dest="no_update_check",
+        default=False,
+        help=f"Do not check for a newer release of Sherlock. Setting {UPDATE_CHECK_ENV} has the same effect.",
+    )
+
+    parser.add_argument(
+        "--manifest-ttl",
+        action="store",
+        metavar="SECONDS",
+        dest="manifest_ttl",
+        type=float,
+        default=DEFAULT_TTL,
+        help=f"Time (in seconds) the downloaded data.json and exclusions are used from the cache before checking for changes. 0 checks on every run (Default: {DEFAULT_TTL})",
+    )
+
     parser.add_argument(
         "--nsfw",
         action="store_true",
@@ -701,25 +1351,32 @@ def main():
         help="Ignore upstream exclusions (may return more false positives)",
     )
 
-    args = parser.parse_args()
+    # Intermixed, so that usernames may follow options, as in
+    # "sherlock alice --csv bob".
+    args, unrecognized = parser.parse_known_intermixed_args()
+
+    usernames = list(args.username)
+    if args.username_file:
+        try:
+            with open(args.username_file, "r", encoding="utf-8") as file:
+                usernames.extend(line.strip() for line in file if line.strip())
+        except OSError as error:
+            parser.error(f"could not read username file: {error}")
+    if not usernames:
+        parser.error("the following arguments are required: USERNAMES")
+    if unrecognized:
+        parser.error(f"unrecognized arguments: {' '.join(unrecognized)}")
+    if args.workers < 1:
+        parser.error("--workers must be at least 1")
 
     # If the user presses CTRL-C, exit gracefully without throwing errors
     signal.signal(signal.SIGINT, handler)
 
-    # Check for newer version of Sherlock. If it exists, let the user know about it
-    try:
-        latest_release_raw = requests.get(forge_api_latest_release, timeout=10).text
-        latest_release_json = json_loads(latest_release_raw)
-        latest_remote_tag = latest_release_json["tag_name"]
-
-        if latest_remote_tag[1:] != __version__:
-            print(
-                f"Update available! {__version__} --> {latest_remote_tag[1:]}"
-                f"\n{latest_release_json['html_url']}"
-            )
-
-    except Exception as error:
-        print(f"A problem occurred while checking for an update: {error}")
+    # Check for newer version of Sherlock in the background, while the
+    # manifest loads. If it exists, let the user know about it
+    update_check = None
+    if not args.no_update_check and not update_check_disabled():
+        update_check = start_update_check()
 
     # Make prompts
     if args.proxy is not None:
@@ -738,7 +1395,7 @@ def main():
         sys.exit(1)
 
     # Check validity for single username output.
-    if args.output is not None and len(args.username) != 1:
+    if args.output is not None and len(usernames) != 1:
         print("You can only use --output with a single username")
         sys.exit(1)
 
@@ -746,7 +1403,7 @@ def main():
     try:
         if args.local:
             sites = SitesInformation(
-                os.path.join(os.path.dirname(__file__), "resources/data.json"),
+                LOCAL_MANIFEST_PATH,
                 honor_exclusions=False,
             )
         else:
@@ -771,18 +1428,22 @@ def main():
                 data_file_path=json_file_location,
                 honor_exclusions=not args.ignore_exclusions,
                 do_not_exclude=args.site_list,
+                cache_ttl=args.manifest_ttl,
             )
     except Exception as error:
         print(f"ERROR:  {error}")
         sys.exit(1)
 
+    if report_update(update_check):
+        update_check = None
+
     if not args.nsfw:
         sites.remove_nsfw_sites(do_not_remove=args.site_list)
 
     # Create original dictionary from SitesInformation() object.
     # Eventually, the rest of the code will be updated to use the new object
     # directly, but this will glue the two pieces together.
-    site_data_all = {site.name: site.information for site in sites}
+    site_data_all = {site.name: site.plan for site in sites}
     if args.site_list == []:
         # Not desired to look at a sub-set of sites
         site_data = site_data_all
@@ -812,131 +1473,161 @@ def main():
         result=None, verbose=args.verbose, print_all=args.print_all, browse=args.browse
     )
 
+    # Reports are written as the results arrive, one file per username.
+    # Only found sites are reported with --print-found, unless --print-all
+    # overrides it.
+    found_only = args.print_found and not args.print_all
+    url_mains = {name: plan.url_main for name, plan in site_data.items()}
+    writers = []
+    if args.output_txt:
+        writers.append(TxtWriter(folder=args.folderoutput, path=args.output, url_mains=url_mains))
+    if args.csv:
+        writers.append(CsvWriter(folder=args.folderoutput, url_mains=url_mains, found_only=found_only))
+    if args.ndjson:
+        writers.append(NdjsonWriter(folder=args.folderoutput, url_mains=url_mains, found_only=found_only))
+    if args.xlsx:
+        writers.append(XlsxWriter(folder=args.folderoutput, url_mains=url_mains, found_only=found_only))
+    if writers:
+        query_notify = QueryNotifyGroup(query_notify, *writers)
+
+    # Open the database recording the results, if any.
+    store = None
+    if args.store:
+        # Imported here, as most runs record nothing.
+        from sherlock_project.store import StoreError, open_store
+
+        try:
+            store = open_store(args.store)
+        except StoreError as error:
+            print(f"ERROR:  Could not open result store:  {error}")
+            sys.exit(1)
+
+    # Open the cache of recent verdicts, if enabled.
+    verdicts = None
+    if args.cache:
+        # Imported here, as most runs use no cache.
+        import sqlite3
+
+        from sherlock_project.verdicts import VerdictCache
+
+        try:
+            verdicts = VerdictCache()
+        except (OSError, sqlite3.Error) as error:
+            print(f"ERROR:  Could not open verdict cache:  {error}")
+            sys.exit(1)
+
+    # Probes failing for passing reasons are sent again.
+    retry_policy = None
+    if args.retries > 0 or args.hedge:
+        retry_policy = RetryPolicy(retries=max(args.retries, 0), hedge=args.hedge)
+
+    # Latencies may be remembered from earlier runs.
+    latency_path = os.path.join(cache_dir(), "latency.json")
+    latencies = None
+    if args.adaptive_timeouts or args.hedge:
+        latency_state = None
+        if args.keep_latency:
+            try:
+                with open(latency_path, encoding="utf-8") as file:
+                    latency_state = json_loads(file.read())
+            except (OSError, ValueError):
+                latency_state = None
+        latencies = LatencyTracker(state=latency_state)
+
+    # Failing hosts may be remembered from earlier runs.
+    circuits_path = os.path.join(cache_dir(), "circuits.json")
+    breaker_state = None
+    if args.keep_circuits:
+        try:
+            with open(circuits_path, encoding="utf-8") as file:
+                breaker_state = json_loads(file.read())
+        except (OSError, ValueError):
+            breaker_state = None
+    scheduler = HostScheduler(
+        max_in_flight=args.host_concurrency,
+        rate=args.host_rate,
+        failure_threshold=args.circuit_breaker or None,
+        cooldown=args.circuit_cooldown,
+        breaker_state=breaker_state,
+    )
+
     # Run report on all specified users.
     all_usernames = []
-    for username in args.username:
+    for username in usernames:
         if check_for_parameter(username):
             for name in multiple_usernames(username):
                 all_usernames.append(name)
         else:
             all_usernames.append(username)
-    for username in all_usernames:
-        results = sherlock(
-            username,
+    search = sherlock_batch
+    options = {}
+    if args.workers > 1:
+        # Only sharded runs load the multiprocessing machinery.
+        from sherlock_project.sharding import sherlock_sharded
+
+        search = sherlock_sharded
+        options["workers"] = args.workers
+    try:
+        for username, results in search(
+            all_usernames,
             site_data,
             query_notify,
+            **options,
             dump_response=args.dump_response,
             proxy=args.proxy,
             timeout=args.timeout,
-        )
-
-        if args.output:
-            result_file = args.output
-        elif args.folderoutput:
-            # The usernames results should be stored in a targeted folder.
-            # If the folder doesn't exist, create it first
-            os.makedirs(args.folderoutput, exist_ok=True)
-            result_file = os.path.join(args.folderoutput, f"{username}.txt")
-        else:
-            result_file = f"{username}.txt"
-
-        if args.output_txt:
-            with open(result_file, "w", encoding="utf-8") as file:
-                exists_counter = 0
-                for website_name in results:
-                    dictionary = results[website_name]
-                    if dictionary.get("status").status == QueryStatus.CLAIMED:
-                        exists_counter += 1
-                        file.write(dictionary["url_user"] + "\n")
-                file.write(f"Total Websites Username Detected On : {exists_counter}\n")
-
-        if args.csv:
-            result_file = f"{username}.csv"
-            if args.folderoutput:
-                # The usernames results should be stored in a targeted folder.
-                # If the folder doesn't exist, create it first
-                os.makedirs(args.folderoutput, exist_ok=True)
-                result_file = os.path.join(args.folderoutput, result_file)
-
-            with open(result_file, "w", newline="", encoding="utf-8") as csv_report:
-                writer = csv.writer(csv_report)
-                writer.writerow(
-                    [
-                        "username",
-                        "name",
-                        "url_main",
-                        "url_user",
-                        "exists",
-                        "http_status",
-                        "response_time_s",
-                    ]
-                )
-                for site in results:
-                    if (
-                        args.print_found
-                        and not args.print_all
-                        and results[site]["status"].status != QueryStatus.CLAIMED
-                    ):
-                        continue
-
-                    response_time_s = results[site]["status"].query_time
-                    if response_time_s is None:
-                        response_time_s = ""
-                    writer.writerow(
-                        [
-                            username,
-                            site,
-                            results[site]["url_main"],
-                            results[site]["url_user"],
-                            str(results[site]["status"].status),
-                            results[site]["http_status"],
-                            response_time_s,
-                        ]
+            engine=args.engine,
+            max_concurrency=args.max_concurrency,
+            scheduler=scheduler,
+            verdicts=verdicts,
+            connect_timeout=args.connect_timeout,
+            latencies=latencies,
+            retry_policy=retry_policy,
+            warm_up=args.warm_up,
+        ):
+
+            if store is not None:
+                try:
+                    store.add(
+                        (results_site["status"] for results_site in results.values()),
+                        manifest_version=sites.manifest_version,
                     )
-        if args.xlsx:
-            usernames = []
-            names = []
-            url_main = []
-            url_user = []
-            exists = []
-            http_status = []
-            response_time_s = []
-
-            for site in results:
-                if (
-                    args.print_found
-                    and not args.print_all
-                    and results[site]["status"].status != QueryStatus.CLAIMED
-                ):
-                    continue
-
-                if response_time_s is None:
-                    response_time_s.append("")
-                else:
-                    response_time_s.append(results[site]["status"].query_time)
-                usernames.append(username)
-                names.append(site)
-                url_main.append(results[site]["url_main"])
-                url_user.append(results[site]["url_user"])
-                exists.append(str(results[site]["status"].status))
-                http_status.append(results[site]["http_status"])
-
-            DataFrame = pd.DataFrame(
-                {
-                    "username": usernames,
-                    "name": names,
-                    "url_main": [f'=HYPERLINK(\"{u}\")' for u in url_main],
-                    "url_user": [f'=HYPERLINK(\"{u}\")' for u in url_user],
-                    "exists": exists,
-                    "http_status": http_status,
-                    "response_time_s": response_time_s,
-                }
-            )
-            DataFrame.to_excel(f"{username}.xlsx", sheet_name="sheet1", index=False)
-
-        print()
+                except store.connection.Error as error:
+                    # The scan carries on without recording the rest.
+                    print(f"ERROR:  Could not record results, no longer recording:  {error}")
+                    with suppress(store.connection.Error):
+                        store.close()
+                    store = None
+
+            print()
+    finally:
+        # An interrupted run still leaves complete reports of the usernames
+        # done so far.
+        for writer in writers:
+            writer.close()
     query_notify.finish()
 
+    if store is not None:
+        store.close()
+    if verdicts is not None:
+        verdicts.close()
+    if args.keep_circuits:
+        try:
+            os.makedirs(os.path.dirname(circuits_path), exist_ok=True)
+            write_atomic(circuits_path, json_dumps(scheduler.breaker_state()).encode("utf-8"))
+        except OSError as error:
+            print(f"A problem occurred while saving the failing hosts: {error}")
+    if latencies is not None and args.keep_latency:
+        try:
+            os.makedirs(os.path.dirname(latency_path), exist_ok=True)
+            write_atomic(latency_path, json_dumps(latencies.state()).encode("utf-8"))
+        except OSError as error:
+            print(f"A problem occurred while saving the latencies: {error}")
+
+    # A check which was slower than the manifest is reported if it finished
+    # during the scan, but is never waited for.
+    report_update(update_check)
+
 
 if __name__ == "__main__":
     main()
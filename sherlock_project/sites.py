@@ -3,13 +3,19 @@
 This module supports storing information about websites.
 This is the raw data that will be used to search for usernames.
 """
+import hashlib
 import json
-import requests
+import os
+import re
 import secrets
 
+from sherlock_project.cache import DEFAULT_TTL, CachedDownload
+from sherlock_project.probe import ProbePlan
 
 MANIFEST_URL = "https://raw.githubusercontent.com/sherlock-project/sherlock/master/sherlock_project/resources/data.json"
 EXCLUSIONS_URL = "https://raw.githubusercontent.com/sherlock-project/sherlock/refs/heads/exclusions/false_positive_exclusions.txt"
+# Manifest shipped with the package, used when the live one cannot be fetched.
+LOCAL_MANIFEST_PATH = os.path.join(os.path.dirname(__file__), "resources", "data.json")
 
 class SiteInformation:
     def __init__(self, name, url_home, url_username_format, username_claimed,
@@ -45,6 +51,11 @@ class SiteInformation:
                                          be needed by the detection method,
                                          but it is only recorded in this
                                          object for future use.
+                                         It is compiled once into the
+                                         ProbePlan() object kept as plan,
+                                         and kept as a read-only view, so
+                                         that concurrent searches can share
+                                         it.
         is_nsfw                -- Boolean indicating if site is Not Safe For Work.
 
         Return Value:
@@ -57,9 +68,12 @@ class SiteInformation:
 
         self.username_claimed = username_claimed
         self.username_unclaimed = secrets.token_urlsafe(32)
-        self.information = information
         self.is_nsfw  = is_nsfw
 
+        self.plan = ProbePlan.compile(name, information)
+        # Read-only, as the plan compiled from it is shared by every search.
+        self.information = self.plan.information
+
         return
 
     def __str__(self):
@@ -81,6 +95,7 @@ class SitesInformation:
             data_file_path: str|None = None,
             honor_exclusions: bool = True,
             do_not_exclude: list[str] = [],
+            cache_ttl: float = DEFAULT_TTL,
         ):
         """Create Sites Information Object.
 
@@ -110,6 +125,17 @@ class SitesInformation:
 
                                   If this option is not specified, then a
                                   default site list will be used.
+        honor_exclusions       -- Boolean indicating whether to drop the
+                                  sites listed in the upstream exclusions.
+        do_not_exclude         -- List of site names to keep even if they
+                                  are excluded upstream.
+        cache_ttl              -- Time (in seconds) a downloaded manifest or
+                                  exclusions list is used from the cache
+                                  before it is revalidated with the server.
+                                  If the server cannot be reached, the cached
+                                  copy is used regardless of its age, and the
+                                  default manifest falls back to the one
+                                  shipped with Sherlock.
 
         Return Value:
         Nothing.
@@ -129,18 +155,16 @@ class SitesInformation:
         if data_file_path.lower().startswith("http"):
             # Reference is to a URL.
             try:
-                response = requests.get(url=data_file_path, timeout=30)
-            except Exception as error:
-                raise FileNotFoundError(
-                    f"Problem while attempting to access data file URL '{data_file_path}':  {error}"
-                )
+                content = CachedDownload(data_file_path).fetch(ttl=cache_ttl, timeout=30)
+            except FileNotFoundError as error:
+                if data_file_path != MANIFEST_URL:
+                    raise
+                print(f"Warning: {error}\nUsing the manifest shipped with Sherlock instead.")
+                with open(LOCAL_MANIFEST_PATH, "rb") as file:
+                    content = file.read()
 
-            if response.status_code != 200:
-                raise FileNotFoundError(f"Bad response while accessing "
-                                        f"data file URL '{data_file_path}'."
-                                        )
             try:
-                site_data = response.json()
+                site_data = json.loads(content)
             except Exception as error:
                 raise ValueError(
                     f"Problem parsing json contents at '{data_file_path}':  {error}."
@@ -149,9 +173,10 @@ class SitesInformation:
         else:
             # Reference is to a file.
             try:
-                with open(data_file_path, "r", encoding="utf-8") as file:
+                with open(data_file_path, "rb") as file:
+                    content = file.read()
                     try:
-                        site_data = json.load(file)
+                        site_data = json.loads(content.decode("utf-8"))
                     except Exception as error:
                         raise ValueError(
                             f"Problem parsing json contents at '{data_file_path}':  {error}."
@@ -164,22 +189,24 @@ class SitesInformation:
 
         site_data.pop('$schema', None)
 
+        # Identifies the manifest the results of a search were decided by.
+        self.manifest_version = hashlib.sha256(content).hexdigest()[:12]
+
         if honor_exclusions:
             try:
-                response = requests.get(url=EXCLUSIONS_URL, timeout=10)
-                if response.status_code == 200:
-                    exclusions = response.text.splitlines()
-                    exclusions = [exclusion.strip() for exclusion in exclusions]
+                content = CachedDownload(EXCLUSIONS_URL).fetch(ttl=cache_ttl, timeout=10)
+                exclusions = content.decode("utf-8").splitlines()
+                exclusions = [exclusion.strip() for exclusion in exclusions]
 
-                    for site in do_not_exclude:
-                        if site in exclusions:
-                            exclusions.remove(site)
+                for site in do_not_exclude:
+                    if site in exclusions:
+                        exclusions.remove(site)
 
-                    for exclusion in exclusions:
-                        try:
-                            site_data.pop(exclusion, None)
-                        except KeyError:
-                            pass
+                for exclusion in exclusions:
+                    try:
+                        site_data.pop(exclusion, None)
+                    except KeyError:
+                        pass
 
             except Exception:
                 # If there was any problem loading the exclusions, just continue without them
@@ -207,6 +234,8 @@ class SitesInformation:
                 )
             except TypeError:
                 print(f"Encountered TypeError parsing json contents for target '{site_name}' at {data_file_path}\nSkipping target.\n")
+            except re.error as error:
+                print(f"Encountered invalid regexCheck ({error}) for target '{site_name}' at {data_file_path}\nSkipping target.\n")
 
         return
 
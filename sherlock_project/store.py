@@ -0,0 +1,292 @@
+"""Sherlock Store Module
+
+This module keeps the history of query results in a database, so that past
+searches can be looked up without reading report files.  PostgreSQL is used
+for shared deployments, and SQLite for local use.
+"""
+import csv
+import io
+import sqlite3
+import threading
+import time
+from contextlib import contextmanager, suppress
+from typing import Iterable, Optional
+
+from sherlock_project.result import QueryResult, QueryStatus
+
+# Columns of the results table, in the order rows are inserted.
+COLUMNS = (
+    "search_id",
+    "username",
+    "site",
+    "url_user",
+    "status",
+    "http_status",
+    "query_time",
+    "context",
+    "manifest_version",
+    "checked_at",
+)
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS query_results (
+    search_id        TEXT,
+    username         TEXT NOT NULL,
+    site             TEXT NOT NULL,
+    url_user         TEXT,
+    status           TEXT NOT NULL,
+    http_status      INTEGER,
+    query_time       DOUBLE PRECISION,
+    context          TEXT,
+    manifest_version TEXT,
+    checked_at       DOUBLE PRECISION NOT NULL
+);
+CREATE INDEX IF NOT EXISTS query_results_username ON query_results (username, status, site);
+CREATE INDEX IF NOT EXISTS query_results_site ON query_results (site, status, username);
+"""
+
+
+class StoreError(Exception):
+    """Raised by open_store() when the database cannot be opened."""
+
+
+def result_row(result: QueryResult, search_id: Optional[str],
+               manifest_version: Optional[str], checked_at: float) -> tuple:
+    """Convert a QueryResult() object to a row of the results table."""
+    return (
+        search_id,
+        result.username,
+        result.site_name,
+        result.site_url_user,
+        result.status.value,
+        result.http_status,
+        result.query_time,
+        result.context,
+        manifest_version,
+        checked_at,
+    )
+
+
+class ResultStore:
+    """Result Store Object.
+
+    Base class of the stores, holding the queries common to every database.
+    Use open_store() to get the store for a database URL.
+    """
+
+    # Parameter marker of the database driver.
+    placeholder = "?"
+
+    def __init__(self, connection):
+        """Create Result Store Object.
+
+        Keyword Arguments:
+        self                   -- This object.
+        connection             -- DB-API connection to the database.
+
+        Return Value:
+        Nothing.
+        """
+        self.connection = connection
+        self._lock = threading.Lock()
+
+        with self._transaction() as cursor:
+            for statement in SCHEMA.split(";"):
+                if statement.strip():
+                    cursor.execute(statement)
+
+        return
+
+    def _reconnect(self):
+        """Open the connection again if it was lost, for drivers which can tell."""
+
+    @contextmanager
+    def _transaction(self):
+        """Run statements on a cursor under the lock, committing them, or rolling them back if one fails."""
+        with self._lock:
+            self._reconnect()
+            try:
+                yield self.connection.cursor()
+                self.connection.commit()
+            except BaseException:
+                # PostgreSQL refuses every statement of an aborted
+                # transaction, so it is ended either way.  A connection
+                # which was lost cannot roll back, and is opened again.
+                with suppress(self.connection.Error):
+                    self.connection.rollback()
+                raise
+
+    def add(self, results: Iterable[QueryResult], search_id: Optional[str] = None,
+            manifest_version: Optional[str] = None) -> int:
+        """Add Results.
+
+        Keyword Arguments:
+        self                   -- This object.
+        results                -- Iterable of QueryResult() objects.
+        search_id              -- String identifying the search the results
+                                  belong to.  Default of None.
+        manifest_version       -- String identifying the manifest the results
+                                  were decided by, such as the
+                                  manifest_version of SitesInformation().
+                                  Default of None.
+
+        Return Value:
+        Number of results added.
+        """
+        checked_at = time.time()
+        rows = [result_row(result, search_id, manifest_version, checked_at) for result in results]
+        if not rows:
+            return 0
+
+        with self._transaction() as cursor:
+            self._insert(cursor, rows)
+
+        return len(rows)
+
+    def _insert(self, cursor, rows: list[tuple]):
+        markers = ", ".join([self.placeholder] * len(COLUMNS))
+        cursor.executemany(
+            f"INSERT INTO query_results ({', '.join(COLUMNS)}) VALUES ({markers})", rows
+        )
+
+    def _select(self, query: str, parameters: tuple) -> list[tuple]:
+        with self._transaction() as cursor:
+            cursor.execute(query.replace("?", self.placeholder), parameters)
+            return cursor.fetchall()
+
+    def claimed_sites(self, username: str) -> list[tuple[str, str, float]]:
+        """Claimed Sites.
+
+        Keyword Arguments:
+        self                   -- This object.
+        username               -- String indicating username to look up.
+
+        Return Value:
+        List of (site, url_user, checked_at) tuples for every site the
+        username was ever found on, with the time it was last found there.
+        """
+        return self._select(
+            "SELECT site, url_user, MAX(checked_at) FROM query_results"
+            " WHERE username = ? AND status = ?"
+            " GROUP BY site, url_user ORDER BY site",
+            (username, QueryStatus.CLAIMED.value),
+        )
+
+    def site_usernames(self, site: str) -> list[tuple[str, float]]:
+        """Site Usernames.
+
+        Keyword Arguments:
+        self                   -- This object.
+        site                   -- String which identifies site.
+
+        Return Value:
+        List of (username, checked_at) tuples for every username ever found
+        on the site, with the time it was last found there.
+        """
+        return self._select(
+            "SELECT username, MAX(checked_at) FROM query_results"
+            " WHERE site = ? AND status = ?"
+            " GROUP BY username ORDER BY username",
+            (site, QueryStatus.CLAIMED.value),
+        )
+
+    def close(self):
+        """Close the connection to the database."""
+        self.connection.close()
+
+
+class SQLiteResultStore(ResultStore):
+    """SQLite Result Store Object."""
+
+    def __init__(self, path: str):
+        """Create SQLite Result Store Object.
+
+        Keyword Arguments:
+        self                   -- This object.
+        path                   -- String containing path of the database
+                                  file, or ":memory:".
+
+        Return Value:
+        Nothing.
+        """
+        try:
+            connection = sqlite3.connect(path, check_same_thread=False)
+            connection.execute("PRAGMA journal_mode=WAL")
+        except sqlite3.Error as error:
+            raise StoreError(f"Could not open {path}: {error}") from error
+        super().__init__(connection)
+
+        return
+
+
+class PostgresResultStore(ResultStore):
+    """PostgreSQL Result Store Object.
+
+    Rows are loaded with COPY, which is much faster than INSERT statements
+    for the hundreds of results of each username.
+    """
+
+    placeholder = "%s"
+
+    def __init__(self, url: str):
+        """Create PostgreSQL Result Store Object.
+
+        Keyword Arguments:
+        self                   -- This object.
+        url                    -- String containing the PostgreSQL URL.
+
+        Return Value:
+        Nothing.
+        """
+        # Optional; only needed by deployments with PostgreSQL.
+        try:
+            import psycopg2
+        except ImportError as error:
+            raise StoreError("PostgreSQL needs the psycopg2 package") from error
+
+        self.url = url
+        self._connect = psycopg2.connect
+        try:
+            connection = psycopg2.connect(url)
+        except psycopg2.Error as error:
+            raise StoreError(f"Could not connect to PostgreSQL: {error}") from error
+        super().__init__(connection)
+
+        return
+
+    def _reconnect(self):
+        if self.connection.closed:
+            self.connection = self._connect(self.url)
+
+    def _insert(self, cursor, rows: list[tuple]):
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in rows:
+            # Unquoted empty fields are NULL in the csv format of COPY.
+            writer.writerow(["" if value is None else value for value in row])
+        buffer.seek(0)
+        cursor.copy_expert(
+            f"COPY query_results ({', '.join(COLUMNS)}) FROM STDIN WITH (FORMAT csv)",
+            buffer,
+        )
+
+
+def open_store(url: str) -> ResultStore:
+    """Open Store.
+
+    Keyword Arguments:
+    url                    -- String containing the database URL:
+                              "postgresql://..." for PostgreSQL, or
+                              "sqlite:///path" (or a plain path) for SQLite.
+
+    Return Value:
+    ResultStore() object.  StoreError is raised if the database cannot be
+    opened.
+    """
+    if url.startswith(("postgres://", "postgresql://")):
+        return PostgresResultStore(url)
+    if url.startswith("sqlite://"):
+        url = url[len("sqlite://"):]
+        # "sqlite:///file.db" is relative, "sqlite:////tmp/file.db" absolute.
+        url = url[1:] if url.startswith("/") else url
+    return SQLiteResultStore(url or ":memory:")
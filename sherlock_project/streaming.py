@@ -0,0 +1,172 @@
+"""Sherlock Streaming Module
+
+This module reads response bodies in chunks, so that a probe can stop
+downloading as soon as its verdict is known.
+"""
+import codecs
+from typing import Optional
+
+from sherlock_project.matcher import ERROR, WAF, SignatureMatcher
+
+# Number of bytes read from the response at a time.
+CHUNK_SIZE = 16384
+
+# Number of bytes searched for WAF fingerprints before an error message is
+# trusted.  Challenge pages are small, and their fingerprints sit near the
+# top, so a page which shows an error message this far in is not one.
+WAF_SCAN_BYTES = 65536
+
+
+class BodyReader:
+    """Body Reader Object.
+
+    Accumulates a response body chunk by chunk, and tells the caller to stop
+    reading once a WAF fingerprint has been seen, once an error message has
+    been seen and the first WAF_SCAN_BYTES have shown no WAF fingerprint, or
+    once the byte cap has been reached.  Each call of start() begins a new
+    response.
+    """
+
+    def __init__(self, matcher: SignatureMatcher, max_bytes: Optional[int] = None):
+        """Create Body Reader Object.
+
+        Keyword Arguments:
+        self                   -- This object.
+        matcher                -- SignatureMatcher() object for the strings
+                                  which decide the verdict when they appear
+                                  in the body, such as error messages and WAF
+                                  fingerprints.
+        max_bytes              -- Maximum number of bytes to read.
+                                  Default of None for no limit.
+
+        Return Value:
+        Nothing.
+        """
+        self.matcher = matcher
+        self.max_bytes = max_bytes
+        self._overlap = max(matcher.max_length - 1, 0)
+        self._decoder = None
+        self.reset()
+
+        return
+
+    def reset(self):
+        """Forget what was read, so that another response can be read."""
+        self.encoding = "utf-8"
+        self.match = None
+        self.stopped = False
+
+        self._found = {}
+        self._chunks = []
+        self._size = 0
+        self._tail = ""
+
+    def start(self, encoding: Optional[str]):
+        """Start Reading.
+
+        Keyword Arguments:
+        self                   -- This object.
+        encoding               -- String indicating the encoding of the body,
+                                  as declared by the response headers.
+                                  Default of UTF-8 if None or unknown.
+
+        Return Value:
+        Nothing.
+        """
+        self.reset()
+        try:
+            self._decoder = codecs.getincrementaldecoder(encoding or "utf-8")(errors="replace")
+            self.encoding = encoding or "utf-8"
+        except LookupError:
+            self._decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+
+        return
+
+    def feed(self, chunk: bytes) -> bool:
+        """Feed Chunk.
+
+        Keyword Arguments:
+        self                   -- This object.
+        chunk                  -- Bytes read from the response.
+
+        Return Value:
+        Boolean indicating whether reading should stop.
+        """
+        if self.stopped:
+            return True
+        if self._decoder is None:
+            self.start(None)
+
+        if self.max_bytes is not None:
+            chunk = chunk[:self.max_bytes - self._size]
+        self._chunks.append(chunk)
+        self._size += len(chunk)
+
+        # Search the end of the previous chunk too, in case a signature
+        # straddles the boundary.
+        text = self._tail + self._decoder.decode(chunk)
+        for kind, signature in self.matcher.scan(text).items():
+            self._found.setdefault(kind, signature)
+        self._tail = text[-self._overlap:] if self._overlap else ""
+
+        # A WAF fingerprint decides the verdict whatever else is on the page,
+        # so an error message only does once a WAF has been ruled out.
+        waf_ruled_out = WAF not in self.matcher.kinds or self._size >= WAF_SCAN_BYTES
+        if WAF in self._found or (ERROR in self._found and waf_ruled_out):
+            self.match = self._found.get(WAF, self._found.get(ERROR))
+            self.stopped = True
+            return True
+
+        if self.max_bytes is not None and self._size >= self.max_bytes:
+            self.match = self._found.get(WAF, self._found.get(ERROR))
+            self.stopped = True
+            return True
+
+        return False
+
+    @property
+    def content(self) -> bytes:
+        """Bytes read so far."""
+        return b"".join(self._chunks)
+
+    @property
+    def found(self) -> dict[str, str]:
+        """Dictionary of each signature kind found so far to its first match."""
+        return dict(self._found)
+
+    def read_response(self, response, *args, **kwargs):
+        """Read Response.
+
+        Response hook for a requests.Response() opened with stream=True.
+        Reads the body until reading should stop, and stores what was read
+        as the content of the response, and the signatures found in it as
+        its body_matches.
+
+        Keyword Arguments:
+        self                   -- This object.
+        response               -- requests.Response() object.
+        args                   -- Arguments.
+        kwargs                 -- Keyword arguments.
+
+        Return Value:
+        Nothing.
+        """
+        self.start(response.encoding)
+        try:
+            for chunk in response.iter_content(CHUNK_SIZE):
+                if self.feed(chunk):
+                    break
+        finally:
+            # Drops the connection if the body was not read to the end.
+            response.close()
+
+        response._content = self.content
+        response._content_consumed = True
+        # What was read has been searched, so it need not be again.
+        response.body_matches = self.found
+        if self.stopped and response.encoding is None:
+            # Decode the partial body the way it was searched, rather than
+            # guessing its encoding from a fragment.
+            response.encoding = self.encoding
+
+        return
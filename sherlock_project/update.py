@@ -0,0 +1,134 @@
+"""Sherlock Update Module
+
+This module checks whether a newer release of Sherlock is available.  The
+check runs in the background, and its answer is cached on disk, so that
+frequent runs neither wait for nor repeat the request to the forge API.
+"""
+import json
+import os
+import threading
+import time
+from concurrent.futures import Future
+from typing import Optional
+
+import requests
+
+from sherlock_project.__init__ import __version__, forge_api_latest_release
+from sherlock_project.cache import cache_dir, write_atomic
+
+# Time (in seconds) the latest release is remembered before asking again.
+UPDATE_CHECK_TTL = 24 * 60 * 60
+
+# Time (in seconds) a failed check is remembered before asking again, so
+# that runs do not all query a forge API which is down or rate limiting.
+UPDATE_FAILURE_TTL = 60 * 60
+
+# Setting this environment variable to a non-empty value disables the check.
+UPDATE_CHECK_ENV = "SHERLOCK_NO_UPDATE_CHECK"
+
+
+class UpdateCheckError(Exception):
+    """Raised by latest_release() when the latest release cannot be found."""
+
+
+def latest_release(ttl: float = UPDATE_CHECK_TTL, timeout: float = 10,
+                   failure_ttl: float = UPDATE_FAILURE_TTL) -> dict:
+    """Get Latest Release.
+
+    Keyword Arguments:
+    ttl                    -- Time (in seconds) a cached answer is used.
+    timeout                -- Time (in seconds) to wait for the forge API.
+    failure_ttl            -- Time (in seconds) a cached failure is used.
+
+    Return Value:
+    Dictionary with the "tag_name" and "html_url" of the latest release.
+    UpdateCheckError is raised if the forge API cannot be queried, or
+    could not be recently, and there is no fresh answer in the cache.
+    """
+    path = os.path.join(cache_dir(), "latest_release.json")
+    cached = {}
+    try:
+        with open(path, "r", encoding="utf-8") as file:
+            cached = json.load(file)
+        if time.time() - cached["fetched_at"] < ttl:
+            return cached
+    except (OSError, ValueError, KeyError, TypeError):
+        pass
+    if not isinstance(cached, dict):
+        cached = {}
+    if time.time() - cached.get("failed_at", float("-inf")) < failure_ttl:
+        raise UpdateCheckError(cached.get("error", "the last check failed"))
+
+    try:
+        latest_release_json = requests.get(forge_api_latest_release, timeout=timeout).json()
+        release = {
+            "tag_name": latest_release_json["tag_name"],
+            "html_url": latest_release_json["html_url"],
+            "fetched_at": time.time(),
+        }
+    except (requests.exceptions.RequestException, ValueError, KeyError, TypeError) as error:
+        # Such as a rate limited answer, which has no release in it.  The
+        # failure is kept next to the last answer, which stays stale.
+        message = f"{type(error).__name__}: {error}"
+        failure = {**cached, "failed_at": time.time(), "error": message}
+        try:
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            write_atomic(path, json.dumps(failure).encode("utf-8"))
+        except OSError:
+            pass
+        raise UpdateCheckError(message) from error
+
+    try:
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        write_atomic(path, json.dumps(release).encode("utf-8"))
+    except OSError:
+        pass
+
+    return release
+
+
+def update_message(release: dict) -> Optional[str]:
+    """Get the message announcing a release, or None if it is the running version."""
+    latest_remote_tag = release["tag_name"]
+    if latest_remote_tag[1:] == __version__:
+        return None
+    return (
+        f"Update available! {__version__} --> {latest_remote_tag[1:]}"
+        f"\n{release['html_url']}"
+    )
+
+
+def start_update_check(ttl: float = UPDATE_CHECK_TTL, timeout: float = 10,
+                       failure_ttl: float = UPDATE_FAILURE_TTL) -> Future:
+    """Start Update Check.
+
+    Runs latest_release() on a daemon thread, so that a slow forge API never
+    delays the scan, nor the exit of Sherlock.
+
+    Keyword Arguments:
+    ttl                    -- Time (in seconds) a cached answer is used.
+    timeout                -- Time (in seconds) to wait for the forge API.
+    failure_ttl            -- Time (in seconds) a cached failure is used.
+
+    Return Value:
+    concurrent.futures.Future() object resolving to the message for the
+    user (None if Sherlock is up to date), or to the exception raised by
+    the check.
+    """
+    future = Future()
+
+    def check():
+        try:
+            release = latest_release(ttl=ttl, timeout=timeout, failure_ttl=failure_ttl)
+            future.set_result(update_message(release))
+        except Exception as error:  # noqa: BLE001 - raised by the future
+            future.set_exception(error)
+
+    threading.Thread(target=check, name="sherlock-update-check", daemon=True).start()
+
+    return future
+
+
+def update_check_disabled() -> bool:
+    """Check whether the update check was turned off through the environment."""
+    return bool(os.environ.get(UPDATE_CHECK_ENV))
@@ -0,0 +1,161 @@
+"""Sherlock Verdicts Module
+
+This module keeps the verdicts of recent queries in a local SQLite database,
+so that checking a username again soon after does not probe every site
+again.  Each verdict is tied to the revision of the manifest entry it was
+decided by, and is ignored once the entry changes.
+"""
+import os
+import sqlite3
+import threading
+import time
+from typing import Iterable, Optional
+
+from sherlock_project.cache import cache_dir
+from sherlock_project.result import QueryResult, QueryStatus
+
+# Default time (in seconds) a verdict is reused, by status.  Accounts come
+# and go slowly, while errors and blocks are often gone within minutes.
+DEFAULT_VERDICT_TTLS = {
+    QueryStatus.CLAIMED: 24 * 60 * 60,
+    QueryStatus.AVAILABLE: 6 * 60 * 60,
+    QueryStatus.UNKNOWN: 10 * 60,
+    QueryStatus.WAF: 10 * 60,
+}
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS verdicts (
+    username    TEXT NOT NULL,
+    site        TEXT NOT NULL,
+    revision    TEXT NOT NULL,
+    status      TEXT NOT NULL,
+    http_status INTEGER,
+    url_user    TEXT,
+    context     TEXT,
+    checked_at  REAL NOT NULL,
+    PRIMARY KEY (username, site)
+)
+"""
+
+
+def default_verdicts_path() -> str:
+    """Get the path of the verdict database in Sherlock's cache directory."""
+    return os.path.join(cache_dir(), "verdicts.sqlite3")
+
+
+class VerdictCache:
+    """Verdict Cache Object.
+
+    Verdicts are keyed by username and site, and kept together with the
+    revision of the site's manifest entry.
+    """
+
+    def __init__(self, path: Optional[str] = None, ttls: Optional[dict] = None):
+        """Create Verdict Cache Object.
+
+        Keyword Arguments:
+        self                   -- This object.
+        path                   -- String containing path of the database
+                                  file, or ":memory:".  Default of None for
+                                  default_verdicts_path().
+        ttls                   -- Dictionary of QueryStatus() to the time (in
+                                  seconds) verdicts with that status are
+                                  reused.  Statuses missing from it are not
+                                  cached.  Default of None for
+                                  DEFAULT_VERDICT_TTLS.
+
+        Return Value:
+        Nothing.
+        """
+        path = path or default_verdicts_path()
+        if path != ":memory:":
+            os.makedirs(os.path.dirname(os.path.abspath(path)), exist_ok=True)
+        self.path = path
+        self.ttls = dict(DEFAULT_VERDICT_TTLS if ttls is None else ttls)
+        self.connection = sqlite3.connect(path, check_same_thread=False)
+        self.connection.execute("PRAGMA journal_mode=WAL")
+        self.connection.execute(SCHEMA)
+        self.connection.commit()
+        self._lock = threading.Lock()
+
+        return
+
+    def lookup(self, username: str, revisions: dict[str, str]) -> dict[str, QueryResult]:
+        """Look Up Verdicts.
+
+        Keyword Arguments:
+        self                   -- This object.
+        username               -- String indicating username to look up.
+        revisions              -- Dictionary of site name to the revision of
+                                  its manifest entry, as in the revision of
+                                  its ProbePlan().
+
+        Return Value:
+        Dictionary of site name to QueryResult() object, for every site with
+        a verdict which has not expired and was decided by the same revision
+        of the site's manifest entry.
+        """
+        with self._lock:
+            rows = self.connection.execute(
+                "SELECT site, revision, status, http_status, url_user, context, checked_at"
+                " FROM verdicts WHERE username = ?",
+                (username,),
+            ).fetchall()
+
+        now = time.time()
+        verdicts = {}
+        for site, revision, status, http_status, url_user, context, checked_at in rows:
+            status = QueryStatus[status]
+            if revisions.get(site) != revision or now - checked_at > self.ttls.get(status, -1):
+                continue
+            verdicts[site] = QueryResult(
+                username=username,
+                site_name=site,
+                site_url_user=url_user,
+                status=status,
+                context=context,
+                http_status=http_status,
+            )
+        return verdicts
+
+    def add(self, results: Iterable[tuple[str, QueryResult]]) -> int:
+        """Add Verdicts.
+
+        Keyword Arguments:
+        self                   -- This object.
+        results                -- Iterable of (revision, QueryResult()) tuples,
+                                  giving the revision of the manifest entry
+                                  of the site each result was decided by.
+
+        Return Value:
+        Number of verdicts added.  Results with a status which is not cached
+        are left out.
+        """
+        now = time.time()
+        rows = [
+            (result.username, result.site_name, revision, result.status.name,
+             result.http_status, result.site_url_user, result.context, now)
+            for revision, result in results if result.status in self.ttls
+        ]
+        if not rows:
+            return 0
+
+        with self._lock:
+            self.connection.executemany(
+                "INSERT OR REPLACE INTO verdicts"
+                " (username, site, revision, status, http_status, url_user, context, checked_at)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                rows,
+            )
+            # Drop the verdicts which can no longer be reused.
+            self.connection.execute(
+                "DELETE FROM verdicts WHERE checked_at < ?",
+                (now - max(self.ttls.values()),),
+            )
+            self.connection.commit()
+
+        return len(rows)
+
+    def close(self):
+        """Close the connection to the database."""
+        self.connection.close()
@@ -0,0 +1,263 @@
+"""Sherlock Warm-up Module
+
+This module takes the name lookups and handshakes of a search off the path
+of its probes.  Host names are resolved once into an in-process cache, kept
+for a while, and shared by every connection of a session.  Before the
+first probe, one connection may be opened to every host of the manifest, so
+that the probes find it waiting in the pool.  The warm-up only gets a
+couple of seconds, so that a host which does not answer cannot hold up the
+probes.
+"""
+import socket
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
+from typing import Iterable, Optional
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+from urllib3.connection import HTTPConnection, HTTPSConnection
+from urllib3.connectionpool import HTTPConnectionPool, HTTPSConnectionPool
+from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+from urllib3.util.connection import allowed_gai_family
+
+# Default time (in seconds) an address is kept.  The resolver does not tell
+# the TTL of its answers, so every address is kept alike.
+DEFAULT_DNS_TTL = 300.0
+
+# Time (in seconds) a failed lookup is remembered, so that a host which
+# does not resolve is not looked up again for every username.
+NEGATIVE_DNS_TTL = 30.0
+
+# Number of hosts connected to at the same time while warming up.
+DEFAULT_WARMUP_WORKERS = 32
+
+# Longest time (in seconds) the first probe waits for the warm-up.  Hosts
+# which have not answered by then are left to connect when probed.
+DEFAULT_WARMUP_BUDGET = 2.0
+
+
+class DnsCache:
+    """DNS Cache Object.
+
+    Keeps the address of each host name it has resolved.  It may be shared
+    by any number of threads.
+    """
+
+    def __init__(self, ttl: float = DEFAULT_DNS_TTL,
+                 negative_ttl: float = NEGATIVE_DNS_TTL):
+        """Create DNS Cache Object.
+
+        Keyword Arguments:
+        self                   -- This object.
+        ttl                    -- Time (in seconds) to keep each address.
+        negative_ttl           -- Time (in seconds) to remember that a host
+                                  name could not be resolved.
+
+        Return Value:
+        Nothing.
+        """
+        self.ttl = ttl
+        self.negative_ttl = negative_ttl
+        self._entries = {}
+        self._lock = threading.Lock()
+
+        return
+
+    def addresses(self, host: str) -> list[str]:
+        """Addresses.
+
+        Keyword Arguments:
+        self                   -- This object.
+        host                   -- String containing host name to resolve.
+
+        Return Value:
+        List of strings containing the addresses of the host, IPv6 and IPv4
+        alike, in the order the resolver prefers them.  They are looked up
+        unless recent ones are kept.  The OSError of the lookup is raised if
+        it failed.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(host)
+        if entry is None or entry[0] <= now:
+            try:
+                infos = socket.getaddrinfo(host, None, allowed_gai_family(), socket.SOCK_STREAM)
+                entry = (now + self.ttl, list(dict.fromkeys(info[4][0] for info in infos)))
+            except OSError as error:
+                entry = (now + self.negative_ttl, error)
+            with self._lock:
+                self._entries[host] = entry
+
+        if isinstance(entry[1], OSError):
+            raise entry[1]
+        return entry[1]
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._entries)
+
+
+class CachedResolution:
+    """Connection which looks up its host in the dns_cache of its class.
+
+    Each address of the host is tried in turn, as socket.create_connection()
+    does for the addresses it looks up itself.
+    """
+
+    dns_cache: DnsCache = None
+
+    def _new_conn(self):
+        try:
+            addresses = self.dns_cache.addresses(self._dns_host)
+        except OSError as error:
+            raise NewConnectionError(self, f"Failed to resolve '{self.host}' ({error})") from error
+        # The host name is still used for the Host header and for TLS, so
+        # each address stands in for it only while connecting.
+        host = self._dns_host
+        try:
+            for address in addresses[:-1]:
+                self._dns_host = address
+                try:
+                    return super()._new_conn()
+                except (NewConnectionError, ConnectTimeoutError):
+                    continue
+            self._dns_host = addresses[-1]
+            return super()._new_conn()
+        finally:
+            self._dns_host = host
+
+
+def cached_pool_classes(dns_cache: DnsCache) -> dict:
+    """Get the connection pool classes of each scheme, resolving hosts through dns_cache."""
+    http_connection = type("CachedHTTPConnection", (CachedResolution, HTTPConnection),
+                           {"dns_cache": dns_cache})
+    https_connection = type("CachedHTTPSConnection", (CachedResolution, HTTPSConnection),
+                            {"dns_cache": dns_cache})
+    return {
+        "http": type("CachedHTTPConnectionPool", (HTTPConnectionPool,),
+                     {"ConnectionCls": http_connection}),
+        "https": type("CachedHTTPSConnectionPool", (HTTPSConnectionPool,),
+                      {"ConnectionCls": https_connection}),
+    }
+
+
+class DnsCacheAdapter(HTTPAdapter):
+    """DNS Cache Adapter Object.
+
+    A requests transport adapter whose connections resolve their hosts
+    through a DnsCache().  Connections through a proxy are left alone, as
+    the proxy resolves the hosts.
+    """
+
+    def __init__(self, dns_cache: DnsCache, **kwargs):
+        # The pools are set up by the constructor of HTTPAdapter.
+        self.dns_cache = dns_cache
+        super().__init__(**kwargs)
+
+    def init_poolmanager(self, *args, **kwargs):
+        super().init_poolmanager(*args, **kwargs)
+        self.poolmanager.pool_classes_by_scheme = cached_pool_classes(self.dns_cache)
+
+
+def origins(url_templates: Iterable[str]) -> list[str]:
+    """Get the distinct origins of URL templates, skipping those whose host holds the username."""
+    found = {}
+    for template in url_templates:
+        parts = urlsplit(template)
+        if not parts.scheme or not parts.netloc or "{}" in parts.netloc:
+            continue
+        found.setdefault(f"{parts.scheme}://{parts.netloc.lower()}/", None)
+    return list(found)
+
+
+def preconnect(session: requests.Session, url_templates: Iterable[str], timeout: float,
+               max_workers: int = DEFAULT_WARMUP_WORKERS,
+               budget: float = DEFAULT_WARMUP_BUDGET) -> int:
+    """Preconnect.
+
+    Keyword Arguments:
+    session                -- requests.Session() object to open connections
+                              in the pools of.
+    url_templates          -- Iterable of strings containing the URLs to be
+                              probed, with "{}" in place of the username.
+    timeout                -- Time (in seconds) to wait for each connection.
+    max_workers            -- Number of connections to open at the same time.
+    budget                 -- Time (in seconds) to wait for all connections.
+                              Connections still opening by then are not
+                              waited for, and none takes longer than this.
+
+    Return Value:
+    Number of connections opened in time.  Hosts which cannot be reached
+    are skipped, and fail again when probed.
+    """
+    timeout = min(timeout, budget)
+
+    def connect(origin: str) -> bool:
+        settings = session.merge_environment_settings(origin, {}, None, None, None)
+        if settings["proxies"]:
+            # Requests through a proxy do not use these pools.
+            return False
+        request = requests.Request("GET", origin).prepare()
+        adapter = session.get_adapter(origin)
+        try:
+            if hasattr(adapter, "get_connection_with_tls_context"):
+                pool = adapter.get_connection_with_tls_context(
+                    request, settings["verify"], cert=settings["cert"]
+                )
+            else:
+                pool = adapter.get_connection(origin)
+        except (requests.exceptions.RequestException, ValueError):
+            return False
+        # urllib3 has no public way to open a pooled connection without
+        # sending a request, so this relies on the pool methods of urllib3
+        # 1.26 and 2.x, and does nothing if they are gone.
+        if not (hasattr(pool, "_get_conn") and hasattr(pool, "_put_conn")):
+            return False
+        connection = pool._get_conn()
+        try:
+            connection.timeout = timeout
+            connection.connect()
+            return True
+        except OSError:
+            # urllib3 connection errors are OSErrors too.
+            connection.close()
+            return False
+        finally:
+            pool._put_conn(connection)
+
+    targets = origins(url_templates)
+    if not targets:
+        return 0
+    pool = ThreadPoolExecutor(max_workers=min(max_workers, len(targets)),
+                              thread_name_prefix="sherlock-warmup")
+    try:
+        futures = [pool.submit(connect, origin) for origin in targets]
+        done, _ = wait(futures, timeout=budget)
+        return sum(future.result() for future in done if future.exception() is None)
+    finally:
+        # Hosts not connected to yet are left for the probes.
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def warm_up_session(session, url_templates: Iterable[str], timeout: float,
+                    budget: float = DEFAULT_WARMUP_BUDGET) -> Optional[int]:
+    """Warm Up Session.
+
+    Keyword Arguments:
+    session                -- Session returned by open_session().
+    url_templates          -- Iterable of strings containing the URLs to be
+                              probed, with "{}" in place of the username.
+    timeout                -- Time (in seconds) to wait for each connection.
+    budget                 -- Time (in seconds) to wait for all connections.
+
+    Return Value:
+    Number of connections opened, or None if the session cannot be warmed
+    up.  Sessions of the async engine are not, as httpx offers no way to
+    open a connection without sending a request.
+    """
+    underlying = getattr(session, "session", None) or session
+    if not isinstance(underlying, requests.Session):
+        return None
+    return preconnect(underlying, url_templates, timeout, budget=budget)
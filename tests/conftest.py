@@ -1,9 +1,15 @@
-import os
 import json
+import os
+import threading
+import time
 import urllib
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
 import pytest
+
 from sherlock_project.sites import SitesInformation
 
+
 def fetch_local_manifest(honor_exclusions: bool = True) -> dict[str, dict[str, str]]:
     sites_obj = SitesInformation(data_file_path=os.path.join(os.path.dirname(__file__), "../sherlock_project/resources/data.json"), honor_exclusions=honor_exclusions)
     sites_iterable: dict[str, dict[str, str]] = {site.name: site.information for site in sites_obj}
@@ -49,3 +55,162 @@ def pytest_generate_tests(metafunc):
         params = [{name: data} for name, data in sites_info.items()]
         ids = list(sites_info.keys())
         metafunc.parametrize("chunked_sites", params, ids=ids)
+
+
+class LocalTargetHandler(BaseHTTPRequestHandler):
+    """Serves a handful of fake targets, so that probes can be tested offline.
+
+    /status/<username>   404 unless the username starts with "taken"
+    /message/<username>  200, with an error message unless the username starts with "taken"
+    /redirect/<username> 302 unless the username starts with "taken"
+    /moved/<username>    301 to /message/<username>, with a body holding the error message
+    /big/<username>      like /message, padded to a few megabytes
+    /slow/<username>     200 after a short delay
+    /flaky/<username>    503 with Retry-After the first time a username is asked for, then like /status
+    /sluggish/<username> like /status, after a second the first time a username is asked for
+    /manifest/data.json  a one site manifest, revalidated with its ETag
+    /cookie/<username>   200 setting a cookie, or 409 if the request carried one
+    """
+    protocol_version = "HTTP/1.1"
+    manifest_requests: list[str | None] = []
+    seen: set[str] = set()
+    seen_lock = threading.Lock()
+
+    @classmethod
+    def first_time(cls, path: str) -> bool:
+        with cls.seen_lock:
+            first = path not in cls.seen
+            cls.seen.add(path)
+        return first
+
+    def _reply(self, code: int, body: bytes = b"", headers: dict | None = None):
+        self.send_response(code)
+        self.send_header("Content-Type", "text/html; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in (headers or {}).items():
+            self.send_header(name, value)
+        self.end_headers()
+        if self.command != "HEAD":
+            try:
+                self.wfile.write(body)
+            except (BrokenPipeError, ConnectionResetError):
+                # Client stopped reading early
+                pass
+
+    def do_GET(self):
+        _, kind, username = (self.path.split("/", 2) + [""])[:3]
+        taken = username.startswith("taken")
+        if kind == "status":
+            self._reply(200 if taken else 404, b"<html>profile</html>")
+        elif kind == "message":
+            body = b"<html>profile</html>" if taken else b"<html><h1>User not found</h1></html>"
+            self._reply(200, body)
+        elif kind == "redirect":
+            if taken:
+                self._reply(200, b"<html>profile</html>")
+            else:
+                self._reply(302, headers={"Location": "/"})
+        elif kind == "moved":
+            self._reply(301, b"<html>User not found here, redirecting to profile page</html>",
+                        headers={"Location": f"/message/{username}"})
+        elif kind == "big":
+            marker = b"profile" if taken else b"User not found"
+            self._reply(200, b"<html>" + marker + b"." * 4_000_000 + b"</html>")
+        elif kind == "slow":
+            time.sleep(0.5)
+            self._reply(200, b"<html>profile</html>")
+        elif kind == "flaky":
+            if LocalTargetHandler.first_time(self.path):
+                self._reply(503, headers={"Retry-After": "0"})
+            else:
+                self._reply(200 if taken else 404, b"<html>profile</html>")
+        elif kind == "sluggish":
+            if LocalTargetHandler.first_time(self.path):
+                time.sleep(1)
+            self._reply(200 if taken else 404, b"<html>profile</html>")
+        elif kind == "cookie":
+            code = 409 if self.headers.get("Cookie") else 200
+            self._reply(code, b"<html>profile</html>", headers={"Set-Cookie": f"visitor={username}; Path=/"})
+        elif kind == "manifest":
+            validator = self.headers.get("If-None-Match")
+            LocalTargetHandler.manifest_requests.append(validator)
+            if validator == '"v1"':
+                self._reply(304, headers={"ETag": '"v1"'})
+            else:
+                body = json.dumps({"Example": {
+                    "errorType": "status_code",
+                    "url": "https://example.com/{}",
+                    "urlMain": "https://example.com/",
+                    "username_claimed": "blue",
+                }}).encode()
+                self._reply(200, body, headers={"ETag": '"v1"'})
+        else:
+            self._reply(404)
+
+    do_HEAD = do_GET
+    do_POST = do_GET
+
+    def log_message(self, *args):
+        return
+
+
+class LocalTargetServer(ThreadingHTTPServer):
+    daemon_threads = True
+    request_queue_size = 256
+
+
+@pytest.fixture(scope="session")
+def local_server():
+    server = LocalTargetServer(("127.0.0.1", 0), LocalTargetHandler)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+
+
+@pytest.fixture(scope="session")
+def local_sites(local_server):
+    """Manifest entries covering each detection method against the local server."""
+    return {
+        "LocalStatus": {
+            "errorType": "status_code",
+            "url": local_server + "/status/{}",
+            "urlMain": local_server + "/",
+            "username_claimed": "taken",
+        },
+        "LocalMessage": {
+            "errorMsg": ["User not found", "Gone"],
+            "errorType": "message",
+            "url": local_server + "/message/{}",
+            "urlMain": local_server + "/",
+            "username_claimed": "taken",
+        },
+        "LocalRedirect": {
+            "errorType": "response_url",
+            "errorUrl": local_server + "/",
+            "url": local_server + "/redirect/{}",
+            "urlMain": local_server + "/",
+            "username_claimed": "taken",
+        },
+        "LocalIllegal": {
+            "errorType": "status_code",
+            "regexCheck": "^[a-z]+$",
+            "url": local_server + "/status/{}",
+            "urlMain": local_server + "/",
+            "username_claimed": "taken",
+        },
+        "LocalRefused": {
+            "errorType": "status_code",
+            "url": "http://127.0.0.1:9/{}",
+            "urlMain": "http://127.0.0.1:9/",
+            "username_claimed": "taken",
+        },
+    }
+
+
+@pytest.fixture()
+def local_manifest(tmp_path, local_sites):
+    """SitesInformation() object loaded from the local_sites entries."""
+    path = tmp_path / "data.json"
+    path.write_text(json.dumps(local_sites))
+    return SitesInformation(str(path), honor_exclusions=False)
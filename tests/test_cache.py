@@ -0,0 +1,47 @@
+import os
+
+import pytest
+from conftest import LocalTargetHandler
+
+from sherlock_project import sites as sites_module
+from sherlock_project.cache import CachedDownload, cache_dir
+from sherlock_project.sites import SitesInformation
+
+
+@pytest.fixture()
+def xdg_cache(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+    LocalTargetHandler.manifest_requests.clear()
+    return tmp_path
+
+
+def test_cache_dir_follows_xdg(xdg_cache):
+    assert cache_dir() == os.path.join(str(xdg_cache), 'sherlock')
+
+
+def test_manifest_is_served_from_cache_then_revalidated(xdg_cache, local_server):
+    url = local_server + '/manifest/data.json'
+    for _ in range(3):
+        sites = SitesInformation(url, honor_exclusions=False)
+    assert [site.name for site in sites] == ['Example']
+    # Only the first load went to the server
+    assert LocalTargetHandler.manifest_requests == [None]
+
+    sites = SitesInformation(url, honor_exclusions=False, cache_ttl=0)
+    assert [site.name for site in sites] == ['Example']
+    assert LocalTargetHandler.manifest_requests == [None, '"v1"']
+
+
+def test_stale_copy_is_used_when_offline(xdg_cache, local_server):
+    CachedDownload(local_server + '/manifest/data.json').fetch()
+    offline = CachedDownload('http://127.0.0.1:9/data.json')
+    offline.store(CachedDownload(local_server + '/manifest/data.json').cached()[0], {'fetched_at': 0})
+    assert b'Example' in offline.fetch(timeout=1)
+    with pytest.raises(FileNotFoundError):
+        CachedDownload('http://127.0.0.1:9/other.json').fetch(timeout=1)
+
+
+def test_default_manifest_falls_back_to_bundled(xdg_cache, monkeypatch):
+    monkeypatch.setattr(sites_module, 'MANIFEST_URL', 'http://127.0.0.1:9/data.json')
+    sites = SitesInformation(honor_exclusions=False)
+    assert len(sites) > 100
@@ -0,0 +1,99 @@
+import threading
+import time
+
+import pytest
+
+from sherlock_project.distributed import (
+    RedisJobQueue,
+    ScanWorker,
+    collect_results,
+    shard_sites,
+)
+from sherlock_project.result import QueryStatus
+from sherlock_project.runner import SearchRunner
+
+fakeredis = pytest.importorskip('fakeredis')
+
+
+def test_shards_cover_every_site_once():
+    sites = {f'Site{i}': i for i in range(10)}
+    shards = [shard_sites(sites, index, 3) for index in range(3)]
+    assert sorted(name for shard in shards for name in shard) == sorted(sites)
+
+
+def test_workers_complete_queued_search(local_manifest):
+    queue = RedisJobQueue(fakeredis.FakeRedis(), prefix='test')
+    assert queue.submit('s1', ['taken', 'nobody'], shards=2, timeout=5) == 4
+    assert queue.progress('s1')['status'] == 'running'
+
+    runner = SearchRunner(local_manifest)
+    stop = threading.Event()
+    workers = [threading.Thread(target=ScanWorker(queue, runner).run, args=(stop, 0.1)) for _ in range(2)]
+    for worker in workers:
+        worker.start()
+    try:
+        deadline = time.monotonic() + 30
+        while queue.progress('s1')['status'] == 'running' and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        stop.set()
+        for worker in workers:
+            worker.join()
+        runner.close()
+
+    progress = queue.progress('s1')
+    assert progress['status'] == 'completed'
+    assert progress['jobs_done'] == 4
+    results = collect_results(progress['records'])
+    assert set(results['taken']) == set(local_manifest.sites)
+    assert results['taken']['LocalStatus']['status'].status is QueryStatus.CLAIMED
+    assert results['nobody']['LocalStatus']['status'].status is QueryStatus.AVAILABLE
+    assert len(queue.progress('s1', start=len(progress['records']))['records']) == 0
+    assert sum(progress['counts'].values()) == len(progress['records'])
+    assert progress['counts'][QueryStatus.CLAIMED] == sum(
+        record['status'] == 'CLAIMED' for record in progress['records'])
+    assert queue.progress('unknown') is None
+
+
+def test_job_of_dead_worker_is_queued_again():
+    queue = RedisJobQueue(fakeredis.FakeRedis(), prefix='test', visibility_timeout=0.2)
+    queue.submit('s1', ['alice'], shards=1)
+
+    # Taken by a worker which dies before completing it
+    job = queue.next_job(timeout=1)
+    assert queue.next_job(timeout=0.1) is None
+    time.sleep(0.3)
+
+    again = queue.next_job(timeout=1)
+    assert again == job
+    assert queue.complete(again, [])
+    # The late completion of the first worker is not counted again
+    assert not queue.complete(job, [])
+    progress = queue.progress('s1')
+    assert progress['status'] == 'completed'
+    assert progress['jobs_done'] == 1
+    assert queue.client.llen(queue.processing_key) == 0
+    assert queue.client.zcard(queue.leases_key) == 0
+
+
+def test_renewed_lease_is_kept():
+    queue = RedisJobQueue(fakeredis.FakeRedis(), prefix='test', visibility_timeout=0.2)
+    queue.submit('s1', ['alice'], shards=1)
+    job = queue.next_job(timeout=1)
+    for _ in range(3):
+        time.sleep(0.1)
+        assert queue.renew(job)
+    assert queue.next_job(timeout=0.1) is None
+    assert queue.complete(job, [])
+    assert not queue.renew(job)
+
+
+def test_stalled_search_is_incomplete():
+    queue = RedisJobQueue(fakeredis.FakeRedis(), prefix='test', stall_timeout=0.1)
+    queue.submit('s1', ['alice'], shards=2)
+    assert queue.progress('s1')['status'] == 'running'
+    queue.complete(queue.next_job(timeout=1), [])
+    time.sleep(0.2)
+    progress = queue.progress('s1')
+    assert progress['status'] == 'incomplete'
+    assert '1 of 2 jobs done' in progress['error']
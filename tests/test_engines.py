@@ -0,0 +1,130 @@
+import time
+
+import pytest
+
+from sherlock_project.notify import QueryNotify
+from sherlock_project.result import QueryStatus
+from sherlock_project.sherlock import ENGINES, open_session, sherlock, sherlock_batch
+
+
+def statuses(results: dict) -> dict[str, QueryStatus]:
+    return {site: result['status'].status for site, result in results.items()}
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+@pytest.mark.parametrize('username,expected', [
+    ('taken', QueryStatus.CLAIMED),
+    ('nobody', QueryStatus.AVAILABLE),
+])
+def test_detection_methods(local_sites, engine, username, expected):
+    site_data = {site: local_sites[site] for site in ('LocalStatus', 'LocalMessage', 'LocalRedirect')}
+    results = sherlock(username, site_data, QueryNotify(), timeout=5, engine=engine)
+    assert set(statuses(results).values()) == {expected}
+
+
+def test_engines_agree(local_sites):
+    # LocalIllegal rejects the digits, and nothing listens on LocalRefused
+    results = {
+        engine: sherlock('taken1', local_sites, QueryNotify(), timeout=5, engine=engine, retain_bodies=True)
+        for engine in ENGINES
+    }
+    assert statuses(results['threads']) == statuses(results['async']) == statuses(results['http2'])
+    assert statuses(results['async'])['LocalIllegal'] is QueryStatus.ILLEGAL
+    assert results['async']['LocalRefused']['status'].context == results['threads']['LocalRefused']['status'].context == "Error Connecting"
+    for site in ('LocalStatus', 'LocalMessage', 'LocalRedirect'):
+        assert results['threads'][site]['http_status'] == results['async'][site]['http_status']
+        assert results['threads'][site]['response_text'] == results['async'][site]['response_text']
+        assert isinstance(results['async'][site]['status'].query_time, float)
+
+
+def test_async_engine_single_wave(local_server):
+    # 100 slow sites would take five waves on the 20 thread pool
+    site_data = {
+        f"Slow{i}": {
+            "errorType": "status_code",
+            "url": local_server + f"/slow/{{}}{i}",
+            "urlMain": local_server + "/",
+            "username_claimed": "taken",
+        }
+        for i in range(100)
+    }
+    start = time.monotonic()
+    results = sherlock('taken', site_data, QueryNotify(), timeout=10, engine='async')
+    assert time.monotonic() - start < 2
+    assert set(statuses(results).values()) == {QueryStatus.CLAIMED}
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_cookies_are_not_kept_between_usernames(local_server, engine):
+    site_data = {'LocalCookie': {
+        'errorType': 'status_code',
+        'url': local_server + '/cookie/{}',
+        'urlMain': local_server + '/',
+        'username_claimed': 'taken',
+    }}
+    session = open_session(engine)
+    try:
+        results = [sherlock(username, site_data, QueryNotify(), timeout=5, session=session)
+                   for username in ('taken', 'taken2')]
+    finally:
+        session.close()
+    assert [result['LocalCookie']['http_status'] for result in results] == [200, 200]
+
+
+class RecordingNotify(QueryNotify):
+    def __init__(self):
+        super().__init__()
+        self.events = []
+
+    def start(self, message=None):
+        self.events.append(('start', message))
+
+    def update(self, result):
+        self.events.append(('update', result.username))
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_batch_matches_single_scans(local_sites, engine):
+    usernames = ['taken', 'nobody', 'taken2', 'nobody2', 'taken3']
+    notify = RecordingNotify()
+    batch = list(sherlock_batch(iter(usernames), local_sites, notify, timeout=5, engine=engine, lookahead=2))
+
+    assert [username for username, _ in batch] == usernames
+    for username, results in batch:
+        assert statuses(results) == statuses(sherlock(username, local_sites, QueryNotify(), timeout=5, engine=engine))
+
+    # Each username is reported as a block, in order
+    starts = [message for event, message in notify.events if event == 'start']
+    assert starts == usernames
+    current = None
+    for event, username in notify.events:
+        if event == 'start':
+            current = username
+        else:
+            assert username == current
+
+
+def test_batch_interleaves_usernames(local_server):
+    site_data = {
+        f"Slow{i}": {
+            "errorType": "status_code",
+            "url": local_server + f"/slow/{{}}{i}",
+            "urlMain": local_server + "/",
+            "username_claimed": "taken",
+        }
+        for i in range(10)
+    }
+    start = time.monotonic()
+    results = list(sherlock_batch(['a', 'b', 'c', 'd'], site_data, QueryNotify(), timeout=10, engine='async'))
+    assert len(results) == 4
+    # Serial scans would take at least four times the slowest site
+    assert time.monotonic() - start < 1.5
+
+
+@pytest.mark.online
+def test_http2_engine_negotiates_http2():
+    with open_session('http2') as session:
+        futures = [session.get(f'https://github.com/{name}', timeout=30)
+                   for name in ('torvalds', 'gvanrossum', 'octocat')]
+        responses = [future.result() for future in futures]
+    assert {response.http_version for response in responses} == {'HTTP/2'}
@@ -0,0 +1,102 @@
+import csv
+import json
+
+import pytest
+
+from sherlock_project.export import (
+    CsvWriter,
+    NdjsonWriter,
+    ReportWriter,
+    TxtWriter,
+    XlsxWriter,
+    write_csv,
+)
+from sherlock_project.notify import QueryNotifyGroup
+from sherlock_project.result import QueryResult, QueryStatus
+from sherlock_project.sherlock import sherlock_batch
+
+
+def test_reports_are_written_as_usernames_finish(local_sites, tmp_path):
+    url_mains = {site: info['urlMain'] for site, info in local_sites.items()}
+    writers = [cls(folder=str(tmp_path), url_mains=url_mains) for cls in (TxtWriter, CsvWriter, NdjsonWriter)]
+    batch = sherlock_batch(['taken', 'nobody'], local_sites, QueryNotifyGroup(*writers), timeout=5, lookahead=1)
+
+    username, results = next(batch)
+    # The first report is complete before the next username is collected
+    with open(tmp_path / 'taken.csv', newline='', encoding='utf-8') as file:
+        rows = list(csv.DictReader(file))
+    assert sorted(row['name'] for row in rows) == sorted(results)
+    assert not (tmp_path / 'nobody.csv').exists()
+
+    list(batch)
+    for writer in writers:
+        writer.finish()
+
+    lines = (tmp_path / 'nobody.ndjson').read_text(encoding='utf-8').splitlines()
+    records = {record['name']: record for record in map(json.loads, lines)}
+    assert records['LocalStatus']['url_main'] == url_mains['LocalStatus']
+    assert records['LocalStatus']['exists'] == str(QueryStatus.AVAILABLE)
+
+    claimed = [site for site, info in results.items() if info['status'].status is QueryStatus.CLAIMED]
+    text = (tmp_path / 'taken.txt').read_text(encoding='utf-8')
+    assert text.endswith(f'Total Websites Username Detected On : {len(claimed)}\n')
+
+
+def test_xlsx_report(local_sites, tmp_path):
+    from openpyxl import load_workbook
+
+    writer = XlsxWriter(folder=str(tmp_path), found_only=True)
+    for _, results in sherlock_batch(['taken'], local_sites, writer, timeout=5):
+        pass
+    writer.finish()
+
+    sheet = load_workbook(tmp_path / 'taken.xlsx')['sheet1']
+    rows = list(sheet.values)
+    assert rows[0][:2] == ('username', 'name')
+    claimed = {site for site, info in results.items() if info['status'].status is QueryStatus.CLAIMED}
+    assert {row[1] for row in rows[1:]} == claimed
+    assert rows[1][3].startswith('=HYPERLINK(')
+
+
+def test_illegal_username_has_no_profile_url(local_sites, tmp_path):
+    writer = CsvWriter(folder=str(tmp_path))
+    for _, results in sherlock_batch(['taken_1'], local_sites, writer, timeout=5):
+        pass
+    writer.finish()
+
+    assert results['LocalIllegal']['status'].status is QueryStatus.ILLEGAL
+    with open(tmp_path / 'taken_1.csv', newline='', encoding='utf-8') as file:
+        rows = {row['name']: row for row in csv.DictReader(file)}
+    assert rows['LocalIllegal']['url_user'] == ''
+    assert rows['LocalStatus']['url_user'] != ''
+
+
+def test_report_is_closed_when_writing_fails(tmp_path, monkeypatch):
+    class Broken:
+        status = QueryStatus.CLAIMED
+
+        def __getattr__(self, name):
+            raise KeyboardInterrupt
+
+    results = {
+        'A': {'url_main': 'https://A.example/',
+              'status': QueryResult('taken', 'A', 'https://A.example/taken', QueryStatus.CLAIMED)},
+        'B': {'url_main': 'https://B.example/', 'status': Broken()},
+    }
+    opened = []
+    real_open = CsvWriter.open
+
+    def spy(writer, path):
+        real_open(writer, path)
+        opened.append(writer.file)
+    monkeypatch.setattr(CsvWriter, 'open', spy)
+
+    with pytest.raises(KeyboardInterrupt):
+        write_csv('taken', results, str(tmp_path / 'taken.csv'))
+    assert opened[0].closed
+    assert 'https://A.example/taken' in (tmp_path / 'taken.csv').read_text(encoding='utf-8')
+
+
+def test_report_writer_is_abstract():
+    with pytest.raises(TypeError):
+        ReportWriter()
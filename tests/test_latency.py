@@ -0,0 +1,53 @@
+import time
+
+import pytest
+
+from sherlock_project.latency import MIN_SAMPLES, LatencyTracker
+from sherlock_project.notify import QueryNotify
+from sherlock_project.result import QueryStatus
+from sherlock_project.sherlock import ENGINES, sherlock
+
+
+def test_timeout_follows_latencies():
+    latencies = LatencyTracker(margin=1.0)
+    for _ in range(MIN_SAMPLES - 1):
+        latencies.observe('Fast', 0.2)
+    assert latencies.timeout('Fast', 60) == 60
+
+    latencies.observe('Fast', 0.2)
+    assert 1.2 <= latencies.timeout('Fast', 60) < 1.3
+    assert latencies.timeout('Fast', 1.0) == 1.0
+    assert latencies.timeout('Fast', 60, connect_timeout=90)[0] == 60
+
+    # A site which keeps timing out gets the full timeout again
+    latencies.observe('Fast', float('inf'))
+    assert latencies.timeout('Fast', 60) == 60
+
+    restored = LatencyTracker(margin=1.0, state=latencies.state())
+    assert restored.quantile('Fast', 0.5) == latencies.quantile('Fast', 0.5)
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_hanging_fast_site_fails_early(local_server, engine):
+    site_data = {'Slow': {
+        'errorType': 'status_code',
+        'url': local_server + '/slow/{}',
+        'urlMain': local_server + '/',
+        'username_claimed': 'taken',
+    }}
+    latencies = LatencyTracker(margin=0.1)
+    for _ in range(MIN_SAMPLES):
+        latencies.observe('Slow', 0.01)
+
+    start = time.monotonic()
+    results = sherlock('taken', site_data, QueryNotify(), timeout=10, engine=engine, latencies=latencies)
+    assert time.monotonic() - start < 0.45
+    assert results['Slow']['status'].status is QueryStatus.UNKNOWN
+    assert results['Slow']['status'].context == 'Timeout Error'
+
+
+def test_answers_are_recorded(local_sites):
+    latencies = LatencyTracker()
+    sherlock('taken', local_sites, QueryNotify(), timeout=5, latencies=latencies)
+    # Refused connections have no latency
+    assert set(latencies.state()) == set(local_sites) - {'LocalRefused'}
@@ -0,0 +1,40 @@
+import pytest
+
+from sherlock_project import matcher as matcher_module
+from sherlock_project.matcher import ERROR, WAF, WAF_FINGERPRINTS, SignatureMatcher
+
+
+@pytest.fixture(params=['substring', 'automaton'])
+def strategy(request, monkeypatch):
+    if request.param == 'automaton':
+        pytest.importorskip('ahocorasick')
+        monkeypatch.setattr(matcher_module, 'AUTOMATON_THRESHOLD', 1)
+    return request.param
+
+
+def test_reports_each_kind(strategy):
+    matcher = SignatureMatcher({WAF: WAF_FINGERPRINTS, ERROR: ['User not found', 'Gone']})
+    assert matcher.scan('<html>all good</html>') == {}
+    assert matcher.scan('<h1>Gone</h1>') == {ERROR: 'Gone'}
+    page = '<span id="challenge-error-text"> User not found'
+    assert matcher.scan(page) == {WAF: '<span id="challenge-error-text">', ERROR: 'User not found'}
+    assert matcher.search('<h1>Gone</h1>') == (ERROR, 'Gone')
+    assert matcher.search('nothing') is None
+
+
+def test_overlapping_signatures(strategy):
+    matcher = SignatureMatcher({WAF: ['abc'], ERROR: ['bcd']})
+    assert matcher.scan('xabcdx') == {WAF: 'abc', ERROR: 'bcd'}
+
+
+def test_empty_signature_matches_everything(strategy):
+    matcher = SignatureMatcher({WAF: ['abc'], ERROR: ['']})
+    assert matcher.scan('xyz') == {ERROR: ''}
+
+
+def test_automaton_used_for_large_sets():
+    pytest.importorskip('ahocorasick')
+    signatures = [f'<sig{i}>' for i in range(matcher_module.AUTOMATON_THRESHOLD)]
+    matcher = SignatureMatcher({ERROR: signatures})
+    assert matcher._automaton is not None
+    assert matcher.scan('... <sig17> ...') == {ERROR: '<sig17>'}
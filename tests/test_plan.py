@@ -0,0 +1,113 @@
+import copy
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+import pytest
+
+from sherlock_project.notify import QueryNotify
+from sherlock_project.probe import ProbePlan, compile_plans
+from sherlock_project.sherlock import ENGINES, sherlock
+from sherlock_project.sites import SitesInformation
+
+
+def test_plan_resolves_request_defaults():
+    status = ProbePlan.compile('S', {'url': 'https://s.example/{}', 'errorType': 'status_code'})
+    message = ProbePlan.compile('M', {'url': 'https://m.example/{}', 'errorType': 'message', 'errorMsg': 'gone'})
+    redirect = ProbePlan.compile('R', {'url': 'https://r.example/{}', 'errorType': 'response_url'})
+    assert (status.method, status.allow_redirects, status.stream) == ('HEAD', True, False)
+    assert (message.method, message.allow_redirects, message.stream) == ('GET', True, True)
+    assert (redirect.method, redirect.allow_redirects) == ('GET', False)
+    with pytest.raises(TypeError):
+        status.headers['User-Agent'] = 'changed'
+
+
+def test_plan_fills_templates():
+    plan = ProbePlan.compile('P', {
+        'url': 'https://p.example/{}',
+        'urlProbe': 'https://api.p.example/{}?q={}',
+        'errorType': 'status_code',
+        'regexCheck': '^[a-z ]+$',
+        'request_method': 'POST',
+        'request_payload': {'query': ['{}'], 'limit': 1},
+    })
+    assert plan.user_url('a b') == 'https://p.example/a%20b'
+    assert plan.probe_url('ab') == 'https://api.p.example/ab?q=ab'
+    assert plan.request_payload('ab') == {'query': ['ab'], 'limit': 1}
+    assert plan.allows('ab') and not plan.allows('a1')
+    assert plan.host_key == 'api.p.example'
+
+    static = ProbePlan.compile('Q', {'url': 'https://q.example/{}', 'errorType': 'status_code',
+                                     'request_payload': {'limit': 1}})
+    # A copy each time, so that no caller can change the shared plan
+    assert static.request_payload('ab') == static.request_payload('cd') == {'limit': 1}
+    assert static.request_payload('ab') is not static.request_payload('cd')
+
+
+def test_sites_information_compiles_plans():
+    sites = SitesInformation(
+        data_file_path=os.path.join(os.path.dirname(__file__), "../sherlock_project/resources/data.json"),
+        honor_exclusions=False,
+    )
+    for site in sites:
+        assert site.plan.name == site.name
+        assert site.plan.information is site.information
+
+
+def test_plans_and_entries_agree(local_sites):
+    plans = compile_plans(local_sites)
+    assert compile_plans(plans)['LocalStatus'] is plans['LocalStatus']
+    from_entries = sherlock('taken1', local_sites, QueryNotify(), timeout=5)
+    from_plans = sherlock('taken1', plans, QueryNotify(), timeout=5)
+    assert {site: result['status'].status for site, result in from_entries.items()} == \
+        {site: result['status'].status for site, result in from_plans.items()}
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_concurrent_searches_share_site_data(local_sites, engine):
+    site_data = copy.deepcopy(local_sites)
+    usernames = ['taken', 'nobody', 'taken2', 'nobody2']
+    with ThreadPoolExecutor(len(usernames)) as pool:
+        searches = [pool.submit(sherlock, username, site_data, QueryNotify(), timeout=5, engine=engine)
+                    for username in usernames]
+        results = [search.result() for search in searches]
+
+    # Each search only sees its own username, and the entries are untouched
+    for username, result in zip(usernames, results):
+        assert {status['status'].username for status in result.values()} == {username}
+    assert site_data == local_sites
+
+    plan = ProbePlan.compile('LocalStatus', site_data['LocalStatus'])
+    with pytest.raises(TypeError):
+        plan.information['url'] = 'changed'
+
+
+def test_nested_plan_data_is_read_only():
+    entry = {
+        'errorType': 'status_code',
+        'url': 'https://example.com/{}',
+        'headers': {'Accept': 'text/html'},
+        'request_payload': {'query': '{}', 'fields': ['id']},
+        'rateLimit': {'rate': 1},
+        'errorCode': [404, 410],
+    }
+    plan = ProbePlan.compile('Example', entry)
+    with pytest.raises(TypeError):
+        plan.headers['Accept'] = '*/*'
+    with pytest.raises(TypeError):
+        plan.information['headers']['Accept'] = '*/*'
+    with pytest.raises(TypeError):
+        plan.information['request_payload']['query'] = 'changed'
+    with pytest.raises(AttributeError):
+        plan.information['errorCode'].append(500)
+    with pytest.raises(TypeError):
+        plan.rate_limit['rate'] = 100
+    assert entry['headers'] == {'Accept': 'text/html'}
+
+    # Callers get a body of their own to send
+    payload = plan.request_payload('alice')
+    assert payload == {'query': 'alice', 'fields': ['id']}
+    payload['fields'].append('name')
+    assert plan.request_payload('bob') == {'query': 'bob', 'fields': ['id']}
+    # Compiling a plan's own entry again gives the same plan
+    assert ProbePlan.compile('Example', plan.information).revision == plan.revision
+    assert ProbePlan.compile('Example', plan.information).payload_templated
@@ -0,0 +1,80 @@
+from concurrent.futures import Future
+
+from sherlock_project.notify import QueryNotifyCollect
+from sherlock_project.registry import SearchRegistry, SpilledResults, new_search_id
+from sherlock_project.result import QueryResult, QueryStatus
+
+
+def running_search():
+    return {'notify': QueryNotifyCollect(), 'future': Future(), 'folder': None}
+
+
+def test_search_ids_are_unique():
+    assert len({new_search_id() for _ in range(1000)}) == 1000
+
+
+def test_least_recently_used_finished_search_is_evicted(tmp_path):
+    registry = SearchRegistry(str(tmp_path), max_searches=2)
+    first, second, third = running_search(), running_search(), running_search()
+    registry.add('first', first)
+    registry.add('second', second)
+    registry.add('third', third)
+    # Running searches are kept over the limit
+    assert len(registry) == 3
+
+    for search in (first, second, third):
+        search['future'].set_result({})
+    registry.get('first')
+    registry.add('fourth', running_search())
+    assert 'second' not in registry and 'third' not in registry
+    assert 'first' in registry and 'fourth' in registry
+    assert registry.stats()['evicted'] == 2
+
+
+def test_finished_results_are_spilled(tmp_path):
+    registry = SearchRegistry(str(tmp_path / 'spill'))
+    search = running_search()
+    registry.add('s1', search)
+    notify = search['notify']
+    notify.start('taken')
+    for site, status in (('A', QueryStatus.CLAIMED), ('B', QueryStatus.AVAILABLE)):
+        notify.update(QueryResult('taken', site, f'https://{site}.example/taken', status, http_status=200))
+    assert registry.stats()['results_in_memory'] == 2
+    notify.finish()
+    search['future'].set_result({'taken': {'A': {'response_text': 'x' * 10000}}})
+
+    spilled = registry.get('s1')['notify']
+    assert isinstance(spilled, SpilledResults) and spilled.usernames == ['taken']
+    assert registry.get('s1')['future'].result() is None
+    results, counts = spilled.since(1)
+    assert [(result.site_name, result.status, result.http_status) for result in results] == [
+        ('B', QueryStatus.AVAILABLE, 200)]
+    assert counts == {QueryStatus.CLAIMED: 1, QueryStatus.AVAILABLE: 1}
+    stats = registry.stats()
+    assert stats['spilled'] == 1 and stats['results_in_memory'] == 0 and stats['bytes_spilled'] > 0
+
+
+def test_finished_searches_expire(tmp_path):
+    registry = SearchRegistry(str(tmp_path), ttl=0)
+    search = running_search()
+    registry.add('s1', search)
+    assert 's1' in registry
+    search['future'].set_result({})
+    assert 's1' not in registry
+    assert list(tmp_path.iterdir()) == []
+    assert registry.stats()['expired'] == 1
+
+
+def test_reports_of_forgotten_searches_are_deleted(tmp_path):
+    registry = SearchRegistry(str(tmp_path / 'spill'), max_searches=1)
+    folders = []
+    for search_id in ('s1', 's2'):
+        search = running_search()
+        search['folder'] = str(tmp_path / search_id)
+        (tmp_path / search_id).mkdir()
+        (tmp_path / search_id / 'taken.txt').write_text('report')
+        registry.add(search_id, search)
+        search['future'].set_result({})
+        folders.append(tmp_path / search_id)
+    registry.add('s3', running_search())
+    assert not folders[0].exists() and not folders[1].exists()
@@ -0,0 +1,74 @@
+import time
+import uuid
+
+import pytest
+import requests
+
+from sherlock_project.latency import MIN_SAMPLES, LatencyTracker
+from sherlock_project.notify import QueryNotify
+from sherlock_project.result import QueryStatus
+from sherlock_project.retry import RetryPolicy
+from sherlock_project.sherlock import ENGINES, open_session, sherlock
+
+
+def site(local_server, kind):
+    return {'Site': {
+        'errorType': 'status_code',
+        'url': local_server + f'/{kind}/{{}}',
+        'urlMain': local_server + '/',
+        'username_claimed': 'taken',
+    }}
+
+
+def answer(status, retry_after=None):
+    response = requests.Response()
+    response.status_code = status
+    if retry_after is not None:
+        response.headers['Retry-After'] = retry_after
+    return response
+
+
+def test_retry_delays():
+    policy = RetryPolicy(base_delay=1, max_delay=5)
+    assert 0 <= policy.delay(0) <= 1
+    assert all(policy.delay(10) <= 5 for _ in range(20))
+    assert policy.delay(0, answer(429, '3')) == 3
+    # Asked to wait longer than allowed, so not retried
+    assert policy.delay(0, answer(429, '60')) is None
+    assert policy.retryable(answer(503), None) and not policy.retryable(answer(404), None)
+    assert policy.retryable(None, requests.exceptions.ConnectTimeout())
+    # A site which did not answer in time is not waited on again, unless asked
+    assert not policy.retryable(None, requests.exceptions.ReadTimeout())
+    assert RetryPolicy(retry_timeouts=True).retryable(None, requests.exceptions.ReadTimeout())
+    assert not policy.retryable(None, requests.exceptions.ProxyError())
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_transient_failure_is_retried(local_server, engine):
+    username = f'taken-{uuid.uuid4().hex}'
+    results = sherlock(username, site(local_server, 'flaky'), QueryNotify(), timeout=5,
+                       engine=engine, retry_policy=RetryPolicy(retries=2))
+    result = results['Site']['status']
+    assert result.status is QueryStatus.CLAIMED
+    assert (result.retries, result.hedges) == (1, 0)
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_slow_probe_is_hedged(local_server, engine):
+    latencies = LatencyTracker()
+    for _ in range(MIN_SAMPLES):
+        latencies.observe('Site', 0.05)
+
+    # Closing a session waits for the request which lost
+    session = open_session(engine)
+    try:
+        start = time.monotonic()
+        results = sherlock(f'taken-{uuid.uuid4().hex}', site(local_server, 'sluggish'), QueryNotify(),
+                           timeout=5, session=session, latencies=latencies,
+                           retry_policy=RetryPolicy(retries=0, hedge=True))
+        assert time.monotonic() - start < 0.9
+    finally:
+        session.close()
+    result = results['Site']['status']
+    assert result.status is QueryStatus.CLAIMED
+    assert (result.retries, result.hedges) == (0, 1)
@@ -0,0 +1,70 @@
+import os
+import threading
+
+from sherlock_project.notify import QueryNotify, QueryNotifyCollect
+from sherlock_project.result import QueryResult, QueryStatus
+from sherlock_project.runner import SearchRunner
+from sherlock_project.sherlock import open_session, sherlock
+
+
+def test_shared_session_stays_open(local_sites):
+    session = open_session('threads')
+    try:
+        for username in ('taken', 'nobody'):
+            results = sherlock(username, local_sites, QueryNotify(), timeout=5, session=session)
+            assert results['LocalStatus']['status'].status is not QueryStatus.UNKNOWN
+    finally:
+        session.close()
+
+
+def test_runner_collects_results_and_reports(local_manifest, tmp_path):
+    runner = SearchRunner(local_manifest)
+    try:
+        notify = QueryNotifyCollect()
+        folder = str(tmp_path / 'out')
+        results = runner.submit(['taken', 'nobody'], notify, site_list=['localstatus', 'LocalMessage'],
+                                timeout=5, output_folder=folder, csv=True).result(timeout=30)
+    finally:
+        runner.close()
+
+    assert list(results) == ['taken', 'nobody']
+    assert notify.finished and notify.usernames == ['taken', 'nobody']
+    collected = notify.snapshot()
+    assert {(result.username, result.site_name) for result in collected} == {
+        (username, site) for username in ('taken', 'nobody') for site in ('LocalStatus', 'LocalMessage')
+    }
+    assert all(result.status is QueryStatus.CLAIMED for result in collected if result.username == 'taken')
+    assert sorted(os.listdir(folder)) == ['nobody.csv', 'nobody.txt', 'taken.csv', 'taken.txt']
+
+
+def test_collect_wait_wakes_on_results():
+    notify = QueryNotifyCollect()
+    assert notify.wait(0, timeout=0.05) == []
+
+    result = QueryResult('a', 'Site', 'https://example.com/a', QueryStatus.CLAIMED)
+    timer = threading.Timer(0.05, notify.update, args=(result,))
+    timer.start()
+    assert notify.wait(0, timeout=5) == [result]
+    notify.finish()
+    assert notify.wait(1) == []
+
+
+def test_collect_since_returns_delta_and_counts():
+    notify = QueryNotifyCollect()
+    for site, status in (('A', QueryStatus.CLAIMED), ('B', QueryStatus.AVAILABLE), ('C', QueryStatus.CLAIMED)):
+        notify.update(QueryResult('a', site, f'https://{site}.example/a', status))
+
+    results, counts = notify.since(1)
+    assert [result.site_name for result in results] == ['B', 'C']
+    assert counts == {QueryStatus.CLAIMED: 2, QueryStatus.AVAILABLE: 1}
+    assert notify.since(3)[0] == []
+
+
+def test_runner_defaults_keep_every_site(local_manifest):
+    runner = SearchRunner(local_manifest)
+    try:
+        assert runner.session.scheduler.failure_threshold is None
+        # Every site gets the full timeout
+        assert runner.latencies is None
+    finally:
+        runner.close()
@@ -0,0 +1,82 @@
+from sherlock_project.notify import QueryNotify
+from sherlock_project.probe import compile_plans
+from sherlock_project.scheduler import HostScheduler
+from sherlock_project.sharding import shard_by_host, sherlock_sharded
+from sherlock_project.sherlock import sherlock_batch
+
+
+class RecordingNotify(QueryNotify):
+    def __init__(self):
+        super().__init__()
+        self.events = []
+
+    def start(self, message=None):
+        self.events.append(('start', message))
+
+    def update(self, result):
+        self.events.append(('update', result.username, result.site_name, result.status))
+
+
+def two_host_sites(local_sites):
+    # The same server under a second host name, so that there are two shards.
+    site_data = dict(local_sites)
+    for name, info in local_sites.items():
+        site_data[name + 'Again'] = {
+            key: value.replace('127.0.0.1', 'localhost') if isinstance(value, str) else value
+            for key, value in info.items()
+        }
+    return site_data
+
+
+def test_sites_of_a_host_share_a_shard():
+    plans = compile_plans({
+        f'{host}{index}': {'url': f'https://{host}.example/{index}/{{}}', 'errorType': 'status_code'}
+        for host, count in (('a', 3), ('b', 2), ('c', 1)) for index in range(count)
+    })
+    shards = shard_by_host(plans, 2)
+    assert [sorted(shard) for shard in shards] == [['a0', 'a1', 'a2'], ['b0', 'b1', 'c0']]
+    assert len(shard_by_host(plans, 8)) == 3
+
+
+def test_sharded_run_matches_batch(local_sites):
+    site_data = two_host_sites(local_sites)
+    usernames = ['taken', 'nobody', 'Taken1']
+
+    expected_notify = RecordingNotify()
+    expected = [
+        (username, {site: info['status'].status for site, info in results.items()})
+        for username, results in sherlock_batch(usernames, site_data, expected_notify, timeout=5)
+    ]
+
+    notify = RecordingNotify()
+    scheduler = HostScheduler(failure_threshold=5)
+    found = [
+        (username, {site: info['status'].status for site, info in results.items()})
+        for username, results in sherlock_sharded(usernames, site_data, notify, 2,
+                                                  scheduler=scheduler, timeout=5)
+    ]
+    assert found == expected
+    assert [list(results) for _, results in found] == [list(site_data)] * len(usernames)
+    # Each username is started, then updated for all of its sites
+    starts = [index for index, event in enumerate(notify.events) if event[0] == 'start']
+    assert starts == [0, len(site_data) + 1, 2 * (len(site_data) + 1)]
+    assert sorted(notify.events, key=repr) == sorted(expected_notify.events, key=repr)
+    for index, username in zip(starts, usernames):
+        assert notify.events[index] == ('start', username)
+        assert {event[1] for event in notify.events[index + 1:index + len(site_data) + 1]} == {username}
+
+
+def test_workers_wait_for_the_merge(local_sites):
+    site_data = two_host_sites(local_sites)
+    usernames = ['taken', 'nobody', 'Taken1', 'nobody2']
+    expected = [
+        (username, {site: info['status'].status for site, info in results.items()})
+        for username, results in sherlock_batch(usernames, site_data, QueryNotify(), timeout=5)
+    ]
+    # Neither shard may get a username ahead, so they keep in step
+    found = [
+        (username, {site: info['status'].status for site, info in results.items()})
+        for username, results in sherlock_sharded(usernames, site_data, QueryNotify(), 2,
+                                                  max_ahead=1, timeout=5)
+    ]
+    assert found == expected
@@ -0,0 +1,29 @@
+import subprocess
+import sys
+
+# Cumulative import time allowed for the CLI module, in microseconds.  This is
+# generous, so that slow CI machines pass, but pulling in pandas alone exceeds it.
+STARTUP_BUDGET_US = 400_000
+
+# Imported only by the features which use them.
+LAZY_MODULES = ('pandas', 'numpy', 'httpx', 'tomli', 'openpyxl')
+
+
+def import_times(module: str) -> dict[str, int]:
+    process = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', f'import {module}'],
+        capture_output=True, text=True, check=True,
+    )
+    times = {}
+    for line in process.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        times[name.strip()] = int(cumulative)
+    return times
+
+
+def test_cli_startup_budget():
+    times = import_times('sherlock_project.sherlock')
+    assert not [module for module in LAZY_MODULES if module in times]
+    assert times['sherlock_project.sherlock'] < STARTUP_BUDGET_US
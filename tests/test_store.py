@@ -0,0 +1,120 @@
+import json
+import os
+import sqlite3
+import subprocess
+import sys
+import uuid
+from types import SimpleNamespace
+
+import pytest
+
+from sherlock_project.notify import QueryNotify, QueryNotifyCollect
+from sherlock_project.result import QueryResult, QueryStatus
+from sherlock_project.runner import SearchRunner
+from sherlock_project.sherlock import sherlock
+from sherlock_project.store import (
+    PostgresResultStore,
+    SQLiteResultStore,
+    StoreError,
+    open_store,
+)
+
+
+def test_history_queries(tmp_path):
+    store = open_store(f"sqlite:///{tmp_path / 'history.db'}")
+    assert isinstance(store, SQLiteResultStore)
+    store.add([
+        QueryResult('alice', 'GitHub', 'https://github.com/alice', QueryStatus.CLAIMED, http_status=200),
+        QueryResult('alice', 'GitLab', 'https://gitlab.com/alice', QueryStatus.AVAILABLE, http_status=404),
+        QueryResult('bob', 'GitHub', 'https://github.com/bob', QueryStatus.CLAIMED, http_status=200),
+    ], search_id='s1', manifest_version='abc')
+    store.add([QueryResult('alice', 'GitHub', 'https://github.com/alice', QueryStatus.CLAIMED)])
+
+    assert [(site, url) for site, url, _ in store.claimed_sites('alice')] == [('GitHub', 'https://github.com/alice')]
+    assert [username for username, _ in store.site_usernames('GitHub')] == ['alice', 'bob']
+    assert store.site_usernames('GitLab') == []
+    store.close()
+
+
+def test_failed_add_is_rolled_back(tmp_path):
+    store = open_store(str(tmp_path / 'history.db'))
+    broken = QueryResult('alice', 'GitLab', 'https://gitlab.com/alice', QueryStatus.CLAIMED)
+    # No status, which the table does not allow
+    broken.status = SimpleNamespace(value=None)
+    with pytest.raises(sqlite3.IntegrityError):
+        store.add([QueryResult('alice', 'GitHub', 'https://github.com/alice', QueryStatus.CLAIMED), broken])
+    store.add([QueryResult('bob', 'GitHub', 'https://github.com/bob', QueryStatus.CLAIMED)])
+    assert [username for username, _ in store.site_usernames('GitHub')] == ['bob']
+    store.close()
+
+    with pytest.raises(StoreError):
+        open_store(str(tmp_path / 'missing' / 'history.db'))
+
+
+@pytest.mark.skipif(not os.environ.get('TEST_DATABASE_URL'),
+                    reason='TEST_DATABASE_URL names no PostgreSQL database to test against')
+def test_postgres_copy():
+    store = open_store(os.environ['TEST_DATABASE_URL'])
+    assert isinstance(store, PostgresResultStore)
+    username = f'sherlock-test-{uuid.uuid4().hex}'
+    try:
+        # Unquoted empty fields are NULL, and quotes and commas survive COPY
+        assert store.add([
+            QueryResult(username, 'Site, "quoted"', 'https://example.com/a', QueryStatus.CLAIMED,
+                        query_time=0.5, http_status=200),
+            QueryResult(username, 'Other', '', QueryStatus.CLAIMED),
+        ], search_id='s1', manifest_version='abc') == 2
+        from psycopg2.errors import UndefinedColumn
+
+        with pytest.raises(UndefinedColumn):
+            store._select('SELECT no_such_column FROM query_results', ())
+        # The aborted transaction was rolled back
+        assert store.claimed_sites(username)[0][:2] == ('Other', '')
+        rows = store._select('SELECT site, http_status, context, search_id FROM query_results'
+                             ' WHERE username = ? ORDER BY site', (username,))
+        assert rows == [('Other', None, None, 's1'), ('Site, "quoted"', 200, None, 's1')]
+    finally:
+        store._select('DELETE FROM query_results WHERE username = ? RETURNING site', (username,))
+        store.close()
+
+
+def test_results_carry_http_status(local_sites):
+    results = sherlock('nobody', local_sites, QueryNotify(), timeout=5)
+    assert results['LocalStatus']['status'].http_status == 404
+    assert results['LocalRefused']['status'].http_status is None
+
+
+def test_runner_records_searches(local_manifest):
+    store = open_store(':memory:')
+    runner = SearchRunner(local_manifest, store=store)
+    try:
+        runner.submit(['taken'], QueryNotifyCollect(), timeout=5, search_id='s2').result(timeout=30)
+    finally:
+        runner.close()
+
+    rows = store._select('SELECT search_id, manifest_version, http_status FROM query_results WHERE site = ?', ('LocalStatus',))
+    assert rows == [('s2', local_manifest.manifest_version, 200)]
+    assert [site for site, _, _ in store.claimed_sites('taken')] == ['LocalIllegal', 'LocalMessage', 'LocalRedirect', 'LocalStatus']
+
+
+def test_cli_carries_on_when_recording_fails(local_sites, tmp_path):
+    manifest = tmp_path / 'data.json'
+    manifest.write_text(json.dumps({'LocalStatus': local_sites['LocalStatus']}))
+    database = tmp_path / 'history.db'
+    connection = sqlite3.connect(database)
+    # A table which opens but refuses every row
+    connection.execute('CREATE TABLE query_results (search_id TEXT, username TEXT CHECK (0), site TEXT,'
+                       ' url_user TEXT, status TEXT, http_status INTEGER, query_time REAL, context TEXT,'
+                       ' manifest_version TEXT, checked_at REAL)')
+    connection.commit()
+    connection.close()
+
+    process = subprocess.run(
+        [sys.executable, '-m', 'sherlock_project', 'taken', 'nobody', '--json', str(manifest),
+         '--store', str(database), '--no-update-check', '--folderoutput', str(tmp_path / 'out'),
+         '--timeout', '5', '--txt'],
+        capture_output=True, text=True, cwd=tmp_path,
+    )
+    assert process.returncode == 0, process.stderr
+    assert process.stdout.count('Could not record results') == 1
+    assert sorted(os.listdir(tmp_path / 'out')) == ['nobody.txt', 'taken.txt']
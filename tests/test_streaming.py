@@ -0,0 +1,124 @@
+import pytest
+
+from sherlock_project.matcher import ERROR, WAF, SignatureMatcher
+from sherlock_project.notify import QueryNotify
+from sherlock_project.result import QueryStatus
+from sherlock_project.sherlock import ENGINES, sherlock
+from sherlock_project.streaming import CHUNK_SIZE, WAF_SCAN_BYTES, BodyReader
+
+
+def test_signature_across_chunks():
+    reader = BodyReader(SignatureMatcher({ERROR: ['User not found']}))
+    assert reader.feed(b'<html><h1>User not') is False
+    assert reader.feed(b' found</h1>') is True
+    assert reader.match == 'User not found'
+
+
+def test_multibyte_character_across_chunks():
+    reader = BodyReader(SignatureMatcher({ERROR: ['café']}))
+    reader.start('utf-8')
+    encoded = 'café'.encode('utf-8')
+    assert reader.feed(encoded[:-1]) is False
+    assert reader.feed(encoded[-1:]) is True
+
+
+def test_byte_cap():
+    reader = BodyReader(SignatureMatcher({ERROR: ['never']}), max_bytes=10)
+    assert reader.feed(b'12345678') is False
+    assert reader.feed(b'90abcdef') is True
+    assert reader.content == b'1234567890'
+    assert reader.stopped and reader.match is None
+
+
+def test_waf_fingerprint_after_error_message():
+    reader = BodyReader(SignatureMatcher({WAF: ['challenge-error'], ERROR: ['User not found']}))
+    assert reader.feed(b'<html>User not found') is False
+    assert reader.feed(b'<span id="challenge-error">') is True
+    assert reader.match == 'challenge-error'
+    # Once stopped, nothing more is taken
+    assert reader.feed(b'more') is True
+    assert reader.content.endswith(b'>')
+
+    reader.start('utf-8')
+    assert reader.content == b'' and not reader.stopped
+    assert reader.feed(b'User not found'.ljust(WAF_SCAN_BYTES, b'.')) is True
+    assert reader.match == 'User not found'
+
+
+def big_site(local_server, **extra):
+    return {"Big": {
+        "errorMsg": "User not found",
+        "errorType": "message",
+        "url": local_server + "/big/{}",
+        "urlMain": local_server + "/",
+        "username_claimed": "taken",
+        **extra,
+    }}
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_message_site_stops_at_error(local_server, engine):
+    results = sherlock('nobody', big_site(local_server), QueryNotify(), timeout=5, engine=engine,
+                       retain_bodies=True)
+    assert results['Big']['status'].status is QueryStatus.AVAILABLE
+    assert len(results['Big']['response_text']) < 1_000_000
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_message_site_reads_whole_claimed_page(local_server, engine):
+    results = sherlock('taken', big_site(local_server), QueryNotify(), timeout=5, engine=engine,
+                       retain_bodies=True)
+    assert results['Big']['status'].status is QueryStatus.CLAIMED
+    assert len(results['Big']['response_text']) > 4_000_000
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_max_body_bytes(local_server, engine):
+    results = sherlock('taken', big_site(local_server, maxBodyBytes=1000), QueryNotify(), timeout=5,
+                       engine=engine, retain_bodies=True)
+    assert results['Big']['status'].status is QueryStatus.CLAIMED
+    assert len(results['Big']['response_text']) == 1000
+
+
+def test_bodies_are_dropped_unless_retained(local_server):
+    site_data = big_site(local_server)
+    dropped = sherlock('taken', site_data, QueryNotify(), timeout=5)
+    assert dropped['Big']['response_text'] is None
+    assert 'body_digest' not in dropped['Big']
+    assert not hasattr(dropped['Big']['status'], '__dict__')
+
+    capped = sherlock('taken', site_data, QueryNotify(), timeout=5, retain_bodies=100, digest_bodies=True)
+    assert len(capped['Big']['response_text']) == 100
+    again = sherlock('taken', site_data, QueryNotify(), timeout=5, digest_bodies=True)
+    assert len(again['Big']['body_digest']) == 32
+    assert again['Big']['body_digest'] == capped['Big']['body_digest']
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_redirect_body_is_not_read(local_server, engine):
+    site_data = {"Moved": {
+        "errorMsg": "User not found",
+        "errorType": "message",
+        "url": local_server + "/moved/{}",
+        "urlMain": local_server + "/",
+        "username_claimed": "taken",
+    }}
+    results = sherlock('taken', site_data, QueryNotify(), timeout=5, engine=engine, retain_bodies=True)
+    assert results['Moved']['status'].status is QueryStatus.CLAIMED
+    assert results['Moved']['response_text'] == b'<html>profile</html>'
+
+
+@pytest.mark.parametrize('engine', ENGINES)
+def test_streamed_body_is_searched_once(local_server, engine, monkeypatch):
+    scanned = []
+    real_scan = SignatureMatcher.scan
+
+    def spy(matcher, text):
+        scanned.append(len(text))
+        return real_scan(matcher, text)
+    monkeypatch.setattr(SignatureMatcher, 'scan', spy)
+
+    results = sherlock('nobody', big_site(local_server), QueryNotify(), timeout=5, engine=engine)
+    assert results['Big']['status'].status is QueryStatus.AVAILABLE
+    # Only the chunks are searched, not the whole body again once read
+    assert scanned and max(scanned) < 2 * CHUNK_SIZE
@@ -0,0 +1,57 @@
+import json
+import os
+import time
+
+import pytest
+
+from sherlock_project import __version__
+from sherlock_project import update as update_module
+from sherlock_project.update import (
+    UpdateCheckError,
+    latest_release,
+    start_update_check,
+    update_message,
+)
+
+
+@pytest.fixture()
+def offline_forge(tmp_path, monkeypatch):
+    monkeypatch.setenv('XDG_CACHE_HOME', str(tmp_path))
+    monkeypatch.setattr(update_module, 'forge_api_latest_release', 'http://127.0.0.1:9/latest')
+    return tmp_path
+
+
+def test_cached_release_needs_no_request(offline_forge):
+    os.makedirs(offline_forge / 'sherlock')
+    release = {'tag_name': 'v99.0.0', 'html_url': 'https://example.com/r', 'fetched_at': time.time()}
+    (offline_forge / 'sherlock' / 'latest_release.json').write_text(json.dumps(release))
+    assert latest_release(timeout=1)['tag_name'] == 'v99.0.0'
+    assert start_update_check(timeout=1).result(timeout=5).startswith(f'Update available! {__version__} --> 99.0.0')
+    with pytest.raises(UpdateCheckError):
+        latest_release(ttl=0, timeout=1)
+
+
+def test_current_release_is_not_announced():
+    assert update_message({'tag_name': f'v{__version__}', 'html_url': ''}) is None
+
+
+def test_failed_check_resolves_to_error(offline_forge):
+    assert isinstance(start_update_check(timeout=1).exception(timeout=5), UpdateCheckError)
+
+
+def test_failed_check_is_not_repeated(offline_forge, monkeypatch):
+    calls = []
+    real_get = update_module.requests.get
+
+    def counting_get(*args, **kwargs):
+        calls.append(args)
+        return real_get(*args, **kwargs)
+    monkeypatch.setattr(update_module.requests, 'get', counting_get)
+
+    for _ in range(2):
+        with pytest.raises(UpdateCheckError, match='ConnectionError'):
+            latest_release(timeout=1)
+    assert len(calls) == 1
+    with pytest.raises(UpdateCheckError):
+        latest_release(timeout=1, failure_ttl=0)
+    assert len(calls) == 2
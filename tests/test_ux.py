@@ -41,3 +41,12 @@ def test_wildcard_username_expansion():
 def test_no_usernames_provided(cliargs):
     with pytest.raises(InteractivesSubprocessError, match=r"error: the following arguments are required: USERNAMES"):
         Interactives.run_cli(cliargs)
+
+
+@pytest.mark.parametrize('cliargs', [
+    'alice --timout 5',
+    'alice --ouptut x.txt bob',
+])
+def test_unknown_options_are_errors(cliargs):
+    with pytest.raises(InteractivesSubprocessError, match=r"error: unrecognized arguments: --"):
+        Interactives.run_cli(cliargs)
@@ -0,0 +1,42 @@
+from sherlock_project.notify import QueryNotify
+from sherlock_project.result import QueryResult, QueryStatus
+from sherlock_project.sherlock import sherlock
+from sherlock_project.verdicts import VerdictCache
+
+
+def test_repeat_search_reuses_verdicts(local_sites, tmp_path):
+    verdicts = VerdictCache(str(tmp_path / 'verdicts.sqlite3'))
+    try:
+        first = sherlock('taken', local_sites, QueryNotify(), timeout=5, verdicts=verdicts)
+        second = sherlock('taken', local_sites, QueryNotify(), timeout=5, verdicts=verdicts)
+    finally:
+        verdicts.close()
+
+    probed = [site for site, results in first.items() if results['status'].status is not QueryStatus.ILLEGAL]
+    assert probed and not any(first[site].get('cached') for site in probed)
+    assert all(second[site].get('cached') for site in probed)
+    for site in first:
+        assert second[site]['status'].status is first[site]['status'].status
+        assert second[site]['url_user'] == first[site]['url_user']
+
+
+def test_changed_entry_invalidates_verdict(local_sites):
+    verdicts = VerdictCache(':memory:')
+    sherlock('taken', local_sites, QueryNotify(), timeout=5, verdicts=verdicts)
+
+    changed = dict(local_sites)
+    changed['LocalMessage'] = {**local_sites['LocalMessage'], 'errorMsg': 'Nobody here'}
+    results = sherlock('taken', changed, QueryNotify(), timeout=5, verdicts=verdicts)
+    assert not results['LocalMessage'].get('cached')
+    assert results['LocalStatus'].get('cached')
+
+
+def test_statuses_without_ttl_are_not_cached():
+    verdicts = VerdictCache(':memory:', ttls={QueryStatus.CLAIMED: 60})
+    added = verdicts.add([
+        ('r1', QueryResult('a', 'A', 'https://a.example/a', QueryStatus.CLAIMED, http_status=200)),
+        ('r1', QueryResult('a', 'B', 'https://b.example/a', QueryStatus.UNKNOWN, context='Timeout')),
+    ])
+    assert added == 1
+    assert list(verdicts.lookup('a', {'A': 'r1', 'B': 'r1'})) == ['A']
+    assert verdicts.lookup('a', {'A': 'r2'}) == {}
@@ -0,0 +1,96 @@
+import socket
+import time
+
+import pytest
+import requests
+
+from sherlock_project.notify import QueryNotify
+from sherlock_project.result import QueryStatus
+from sherlock_project.sherlock import open_session, sherlock_batch
+from sherlock_project.warmup import DnsCache, origins, preconnect, warm_up_session
+
+
+def test_lookups_are_cached(monkeypatch):
+    lookups = []
+
+    def getaddrinfo(host, *args):
+        lookups.append(host)
+        if host == 'gone.example':
+            raise socket.gaierror('Name or service not known')
+        return [(socket.AF_INET6, socket.SOCK_STREAM, 6, '', ('2001:db8::1', 0, 0, 0)),
+                (socket.AF_INET, socket.SOCK_STREAM, 6, '', ('192.0.2.1', 0))]
+
+    monkeypatch.setattr(socket, 'getaddrinfo', getaddrinfo)
+    cache = DnsCache(ttl=60, negative_ttl=60)
+    assert cache.addresses('a.example') == cache.addresses('a.example') == ['2001:db8::1', '192.0.2.1']
+    for _ in range(2):
+        with pytest.raises(OSError):
+            cache.addresses('gone.example')
+    assert lookups == ['a.example', 'gone.example']
+
+    cache.ttl = 0
+    cache.addresses('b.example')
+    cache.addresses('b.example')
+    assert lookups.count('b.example') == 2
+
+
+def test_origins_skip_username_hosts():
+    assert origins([
+        'https://A.example/{}', 'https://a.example/api?q={}',
+        'https://{}.b.example/', 'http://c.example:8080/{}',
+    ]) == ['https://a.example/', 'http://c.example:8080/']
+
+
+def test_warm_session_serves_batch(local_server):
+    port = local_server.rsplit(':', 1)[1]
+    site_data = {'LocalStatus': {
+        'errorType': 'status_code',
+        'url': f'http://localhost:{port}/status/{{}}',
+        'urlMain': f'http://localhost:{port}/',
+        'username_claimed': 'taken',
+    }}
+    cache = DnsCache()
+    session = open_session('threads', dns_cache=cache)
+    try:
+        assert warm_up_session(session, [site_data['LocalStatus']['url']], 5) == 1
+        assert len(cache) == 1
+        statuses = [
+            results['LocalStatus']['status'].status
+            for _, results in sherlock_batch(['taken', 'nobody'], site_data, QueryNotify(),
+                                             timeout=5, session=session, warm_up=True)
+        ]
+    finally:
+        session.close()
+    assert statuses == [QueryStatus.CLAIMED, QueryStatus.AVAILABLE]
+
+    # The async engine has no pools to warm
+    with open_session('async') as session:
+        assert warm_up_session(session, [site_data['LocalStatus']['url']], 5) is None
+
+
+def test_next_address_is_tried(local_server, monkeypatch):
+    port = local_server.rsplit(':', 1)[1]
+    cache = DnsCache()
+    # Nothing listens on the first address
+    monkeypatch.setattr(cache, 'addresses', lambda host: ['127.0.0.2', '127.0.0.1'])
+    session = open_session('threads', dns_cache=cache)
+    try:
+        assert session.get(f'http://cached.example:{port}/status/taken', timeout=5).result().status_code == 200
+    finally:
+        session.close()
+
+
+def test_warm_up_does_not_wait_for_slow_hosts(monkeypatch):
+    getaddrinfo = socket.getaddrinfo
+
+    def slow_getaddrinfo(host, *args, **kwargs):
+        if host == 'slow.example':
+            time.sleep(2)
+            raise socket.gaierror('Name or service not known')
+        return getaddrinfo(host, *args, **kwargs)
+
+    monkeypatch.setattr(socket, 'getaddrinfo', slow_getaddrinfo)
+    with requests.Session() as session:
+        start = time.monotonic()
+        assert preconnect(session, ['https://slow.example/{}'], timeout=60, budget=0.2) == 0
+        assert time.monotonic() - start < 1
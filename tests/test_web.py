@@ -0,0 +1,195 @@
+import importlib.util
+import json
+import os
+import sys
+from concurrent.futures import Future
+
+import pytest
+
+from sherlock_project.notify import QueryNotifyCollect
+from sherlock_project.result import QueryResult, QueryStatus
+
+pytest.importorskip('flask')
+
+APP_PATH = os.path.join(os.path.dirname(__file__), '../web_interface/app.py')
+
+
+@pytest.fixture()
+def load_app(monkeypatch, tmp_path):
+    """Import the web interface afresh, with the given environment, writing under tmp_path."""
+    loaded = []
+
+    def load(**environ):
+        for name in ('DATABASE_URL', 'REDIS_URL', 'MAX_SEARCHES', 'SEARCH_TTL'):
+            monkeypatch.delenv(name, raising=False)
+        for name, value in environ.items():
+            monkeypatch.setenv(name, value)
+        monkeypatch.chdir(tmp_path)
+        spec = importlib.util.spec_from_file_location('sherlock_web_app', APP_PATH)
+        module = importlib.util.module_from_spec(spec)
+        monkeypatch.setitem(sys.modules, 'sherlock_web_app', module)
+        spec.loader.exec_module(module)
+        loaded.append(module)
+        return module
+
+    yield load
+    for module in loaded:
+        if module.runner is not None:
+            module.runner.close()
+
+
+def test_app_starts_without_its_database(load_app):
+    app = load_app(DATABASE_URL='postgresql://127.0.0.1:1/sherlock')
+    client = app.app.test_client()
+    response = client.get('/history/username/alice')
+    assert response.status_code == 404
+    assert response.get_json() == {'error': 'No result store configured'}
+    # Not tried again until the retry interval has passed
+    failed_at = app.store_failed_at
+    assert failed_at is not None
+    client.get('/history/site/GitHub')
+    assert app.store_failed_at == failed_at
+
+
+@pytest.fixture()
+def web(load_app):
+    app = load_app()
+    app.EVENT_KEEPALIVE = 0.05
+    return app
+
+
+def add_search(app, search_id, sites=(), finished=True):
+    """Register a search of 'taken' which has found the given sites so far."""
+    notify = QueryNotifyCollect()
+    future = Future()
+    notify.start('taken')
+    for site in sites:
+        notify.update(QueryResult('taken', site, f'https://{site}.example/taken', QueryStatus.CLAIMED))
+    app.searches.add(search_id, {'status': 'running', 'notify': notify, 'future': future,
+                                 'folder': os.path.join(app.app.config['RESULTS_FOLDER'], search_id)})
+    if finished:
+        notify.finish()
+        future.set_result({})
+    return notify, future
+
+
+def parse_events(chunks):
+    events = []
+    for chunk in chunks:
+        text = chunk.decode() if isinstance(chunk, bytes) else chunk
+        for block in filter(None, text.split('\n\n')):
+            fields = dict(line.split(': ', 1) for line in block.splitlines() if not line.startswith(':'))
+            events.append({'keep-alive': True} if not fields else {
+                'event': fields['event'], 'id': fields.get('id'), 'data': json.loads(fields['data'])})
+    return events
+
+
+def test_events_resume_after_last_event_id(web):
+    add_search(web, 's1', ['A', 'B', 'C'])
+    client = web.app.test_client()
+
+    response = client.get('/events/s1')
+    assert response.mimetype == 'text/event-stream'
+    events = parse_events([response.data])
+    assert [(event['event'], event['id']) for event in events] == [
+        ('result', '0'), ('result', '1'), ('result', '2'), ('summary', None)]
+    assert events[-1]['data']['status'] == 'completed'
+    assert events[-1]['data']['found'] == 3
+
+    # A reconnecting browser sends the id of the last event it received
+    events = parse_events([client.get('/events/s1', headers={'Last-Event-ID': '1'}).data])
+    assert [(event['event'], event['id']) for event in events] == [('result', '2'), ('summary', None)]
+    assert events[0]['data']['site'] == 'C'
+
+
+def test_idle_event_stream_is_kept_alive(web):
+    notify, future = add_search(web, 's1', finished=False)
+    response = web.app.test_client().get('/events/s1', buffered=False)
+    chunks = iter(response.response)
+    assert parse_events([next(chunks)]) == [{'keep-alive': True}]
+
+    notify.update(QueryResult('taken', 'A', 'https://A.example/taken', QueryStatus.CLAIMED))
+    chunk = next(chunks)
+    while chunk.startswith(b':'):
+        chunk = next(chunks)
+    assert parse_events([chunk])[0]['data']['site'] == 'A'
+
+    notify.finish()
+    future.set_result({})
+    assert parse_events(chunks)[-1]['event'] == 'summary'
+    response.close()
+
+
+def test_events_of_unknown_search(web):
+    response = web.app.test_client().get('/events/nope')
+    assert response.status_code == 404
+    assert response.get_json() == {'error': 'Search not found'}
+
+
+def test_status_since_cursor(web):
+    add_search(web, 's1', ['A', 'B', 'C'], finished=False)
+    client = web.app.test_client()
+
+    status = client.get('/status/s1?since=1').get_json()
+    assert status['status'] == 'running'
+    assert status['cursor'] == 3
+    assert [result['site'] for result in status['results']] == ['B', 'C']
+    # Counts cover every result, not only those after the cursor
+    assert status['counts'] == {'Claimed': 3}
+    assert status['total_checked'] == 3
+
+    status = client.get('/status/s1?since=3').get_json()
+    assert status['cursor'] == 3 and status['results'] == []
+
+    status = client.get('/status/s1').get_json()
+    assert [found['site'] for found in status['results']['found']] == ['A', 'B', 'C']
+    assert 'raw_output' in status
+
+
+def test_status_rejects_bad_cursor(web):
+    add_search(web, 's1', ['A'])
+    client = web.app.test_client()
+    assert client.get('/status/s1?since=-1').status_code == 400
+    assert client.get('/status/nope?since=0').status_code == 404
+
+
+def test_stats_of_spilled_and_running_searches(web):
+    add_search(web, 'done', ['A', 'B'])
+    add_search(web, 'running', ['C'], finished=False)
+    stats = web.app.test_client().get('/stats').get_json()
+    assert stats['searches'] == 2
+    assert stats['running'] == 1
+    assert stats['spilled'] == 1
+    assert stats['results_in_memory'] == 1 and stats['bytes_in_memory'] > 0
+    assert stats['bytes_spilled'] > 0
+    assert {'max_searches', 'ttl', 'evicted', 'expired'} <= set(stats)
+
+
+def test_evicted_search_is_not_found(load_app):
+    app = load_app(MAX_SEARCHES='1')
+    add_search(app, 'old', ['A'])
+    folder = os.path.join(app.app.config['RESULTS_FOLDER'], 'old')
+    os.makedirs(folder)
+    add_search(app, 'new', ['B'])
+    client = app.app.test_client()
+    for path in ('/status/old', '/status/old?since=0', '/events/old', '/list_files/old'):
+        assert client.get(path).status_code == 404
+    assert not os.path.exists(folder)
+    assert client.get('/stats').get_json()['evicted'] == 1
+
+
+def test_history_of_recorded_results(load_app, tmp_path):
+    app = load_app(DATABASE_URL=f"sqlite:///{tmp_path / 'history.db'}")
+    store = app.get_result_store()
+    store.add([
+        QueryResult('taken', 'A', 'https://A.example/taken', QueryStatus.CLAIMED),
+        QueryResult('taken', 'B', 'https://B.example/taken', QueryStatus.AVAILABLE),
+    ], search_id='s1')
+    client = app.app.test_client()
+
+    history = client.get('/history/username/taken').get_json()
+    assert [(claimed['site'], claimed['url']) for claimed in history['claimed']] == [
+        ('A', 'https://A.example/taken')]
+    history = client.get('/history/site/A').get_json()
+    assert [entry['username'] for entry in history['usernames']] == ['taken']
+    assert client.get('/history/site/B').get_json()['usernames'] == []
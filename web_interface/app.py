@@ -1,17 +1,99 @@
-from flask import Flask, render_template, request, jsonify, send_file
-import subprocess
-import os
 import json
-from datetime import datetime
+import os
 import threading
-import requests
-from urllib.parse import quote
+import time
+
+from flask import (
+    Flask,
+    Response,
+    jsonify,
+    render_template,
+    request,
+    send_file,
+    stream_with_context,
+)
+
+from sherlock_project.distributed import RedisJobQueue, collect_results, record_result
+from sherlock_project.export import write_csv, write_txt, write_xlsx
+from sherlock_project.latency import LatencyTracker
+from sherlock_project.notify import QueryNotifyCollect
+from sherlock_project.registry import (
+    DEFAULT_MAX_SEARCHES,
+    DEFAULT_SEARCH_TTL,
+    SearchRegistry,
+    new_search_id,
+)
+from sherlock_project.result import QueryStatus
+from sherlock_project.runner import SearchRunner
+from sherlock_project.scheduler import HostScheduler
+from sherlock_project.store import StoreError, open_store
 
 app = Flask(__name__)
 app.config['RESULTS_FOLDER'] = 'results'
 
-# Store active searches
-active_searches = {}
+# Searches kept for status and downloads. The least recently used finished
+# searches are forgotten, and finished results are moved to disk
+searches = SearchRegistry(
+    os.path.join(app.config['RESULTS_FOLDER'], '.spill'),
+    max_searches=int(os.environ.get('MAX_SEARCHES', DEFAULT_MAX_SEARCHES)),
+    ttl=float(os.environ.get('SEARCH_TTL', DEFAULT_SEARCH_TTL))
+)
+
+# Seconds between keep-alive comments on idle event streams
+EVENT_KEEPALIVE = 15
+
+# Guards the one-time reporting of queued searches
+reports_lock = threading.Lock()
+
+# With a database configured, every result is recorded for history lookups.
+# It is connected to on first use, so that the app starts without it
+DATABASE_URL = os.environ.get('DATABASE_URL')
+result_store = None
+store_lock = threading.Lock()
+store_failed_at = None
+
+# Seconds to wait before trying an unreachable database again
+STORE_RETRY_INTERVAL = 60
+
+# With Redis configured, searches are queued for worker processes
+# (python -m sherlock_project.distributed). Otherwise they run in this
+# process, sharing one manifest and connection pool
+job_queue = RedisJobQueue.from_url(os.environ['REDIS_URL']) if os.environ.get('REDIS_URL') else None
+
+# With CIRCUIT_BREAKER set, a host is skipped for a while after that many
+# consecutive connection errors or timeouts, its sites reported as unknown
+CIRCUIT_BREAKER = int(os.environ.get('CIRCUIT_BREAKER', 0))
+
+# With ADAPTIVE_TIMEOUTS set, each site is waited on for a timeout derived
+# from its latencies so far rather than the full timeout of the search
+ADAPTIVE_TIMEOUTS = bool(os.environ.get('ADAPTIVE_TIMEOUTS'))
+
+runner = SearchRunner(
+    scheduler=HostScheduler(failure_threshold=CIRCUIT_BREAKER or None),
+    latencies=LatencyTracker() if ADAPTIVE_TIMEOUTS else None,
+) if job_queue is None else None
+
+
+def get_result_store():
+    """Get the result store, or None if there is none or it cannot be reached
+
+    Searches carry on without history while the database is down
+    """
+    global result_store, store_failed_at
+    if not DATABASE_URL:
+        return None
+    with store_lock:
+        if result_store is None and (store_failed_at is None
+                                     or time.monotonic() - store_failed_at >= STORE_RETRY_INTERVAL):
+            try:
+                result_store = open_store(DATABASE_URL)
+            except StoreError as error:
+                store_failed_at = time.monotonic()
+                app.logger.error("Result store unavailable, searches are not recorded: %s", error)
+            else:
+                if runner is not None:
+                    runner.store = result_store
+        return result_store
 
 @app.route('/')
 def index():
@@ -83,82 +165,61 @@ def search():
         return jsonify({'error': 'Please provide at least one username'}), 400
 
     # Generate unique search ID
-    search_id = f"search_{datetime.now().strftime('%Y%m%d_%H%M%S')}"
-
-    # Build sherlock command
-    cmd = ['sherlock'] + usernames
-
-    # Add verbose flag to see each site being checked
-    cmd.append('--verbose')
-
-    if options.get('timeout'):
-        cmd.extend(['--timeout', str(options['timeout'])])
-
-    if options.get('csv'):
-        cmd.append('--csv')
-
-    if options.get('xlsx'):
-        cmd.append('--xlsx')
-
-    if options.get('nsfw'):
-        cmd.append('--nsfw')
-
-    if options.get('sites'):
-        for site in options['sites']:
-            cmd.extend(['--site', site])
-
-    if options.get('proxy'):
-        cmd.extend(['--proxy', options['proxy']])
+    search_id = new_search_id()
 
     # Output folder for results
     output_folder = os.path.join(app.config['RESULTS_FOLDER'], search_id)
-    os.makedirs(output_folder, exist_ok=True)
-    cmd.extend(['--folderoutput', output_folder])
+
+    try:
+        timeout = float(options.get('timeout') or 60)
+    except (TypeError, ValueError):
+        return jsonify({'error': 'Timeout must be a number'}), 400
+
+    if job_queue is not None:
+        # Queue the search for the workers
+        job_queue.submit(
+            search_id,
+            usernames,
+            site_list=options.get('sites') or None,
+            nsfw=bool(options.get('nsfw')),
+            proxy=options.get('proxy') or None,
+            timeout=timeout,
+        )
+        searches.add(search_id, {
+            'status': 'running',
+            'options': options,
+            'reported': False,
+            'folder': output_folder
+        })
+        return jsonify({
+            'search_id': search_id,
+            'message': 'Search queued',
+            'usernames': usernames
+        })
+
+    # Connect to the database on the first search, so that it is recorded
+    get_result_store()
 
     # Run search in background
-    def run_search():
-        try:
-            # Use Popen for real-time output streaming
-            process = subprocess.Popen(
-                cmd,
-                stdout=subprocess.PIPE,
-                stderr=subprocess.PIPE,
-                text=True,
-                bufsize=1
-            )
-
-            output_lines = []
-
-            # Read output in real-time
-            for line in process.stdout:
-                output_lines.append(line)
-                # Update live results
-                active_searches[search_id] = {
-                    'status': 'running',
-                    'output': ''.join(output_lines),
-                    'folder': output_folder
-                }
-
-            # Wait for process to complete
-            process.wait()
-            stderr_output = process.stderr.read()
-
-            active_searches[search_id] = {
-                'status': 'completed',
-                'output': ''.join(output_lines),
-                'error': stderr_output,
-                'folder': output_folder
-            }
-        except Exception as e:
-            active_searches[search_id] = {
-                'status': 'error',
-                'error': str(e),
-                'folder': output_folder
-            }
-
-    active_searches[search_id] = {'status': 'running'}
-    thread = threading.Thread(target=run_search)
-    thread.start()
+    notify = QueryNotifyCollect()
+    future = runner.submit(
+        usernames,
+        notify,
+        site_list=options.get('sites') or None,
+        nsfw=bool(options.get('nsfw')),
+        proxy=options.get('proxy') or None,
+        timeout=timeout,
+        output_folder=output_folder,
+        csv=bool(options.get('csv')),
+        xlsx=bool(options.get('xlsx')),
+        search_id=search_id,
+    )
+    searches.add(search_id, {
+        'status': 'running',
+        'notify': notify,
+        'future': future,
+        'folder': output_folder
+    })
 
     return jsonify({
         'search_id': search_id,
@@ -168,64 +229,282 @@ def search():
 
 @app.route('/status/<search_id>')
 def get_status(search_id):
-    if search_id not in active_searches:
+    search_info = searches.get(search_id)
+    if search_info is None:
         return jsonify({'error': 'Search not found'}), 404
 
-    search_info = active_searches[search_id]
+    # With ?since=<cursor>, only the results after the cursor are returned
+    since = request.args.get('since', type=int)
+    if since is not None and since < 0:
+        return jsonify({'error': 'Cursor must not be negative'}), 400
 
-    # Parse results even if still running to show live updates
-    if 'output' in search_info and search_info['output']:
-        results = parse_results(search_info['output'])
-        response = {
-            'status': search_info['status'],
-            'results': results,
-            'raw_output': search_info['output'],
-            'folder': search_info.get('folder', '')
-        }
+    if 'future' not in search_info:
+        return jsonify(get_queued_status(search_id, search_info, since))
+    future = search_info['future']
+    notify = search_info['notify']
 
+    response = {
+        'status': 'running',
+        'folder': search_info['folder']
+    }
+    if future.done():
+        error = future.exception()
+        if error is not None:
+            response['status'] = 'error'
+            response['error'] = str(error)
+            return jsonify(response)
+        response['status'] = 'completed'
+
+    if since is not None:
+        results, counts = notify.since(since)
+        response.update(status_delta(since, results, counts))
         return jsonify(response)
 
-    return jsonify(search_info)
+    results = notify.snapshot()
+    response['results'] = summarize_results(results, notify.usernames)
+    response['raw_output'] = format_output(results)
+
+    return jsonify(response)
+
+def status_delta(since, results, counts):
+    """Get the results after a cursor, with the counts of all results so far"""
+    return {
+        'cursor': since + len(results),
+        'results': [result_event(result) for result in results],
+        'counts': {str(status): count for status, count in counts.items()},
+        'total_checked': sum(counts.values())
+    }
+
+def get_queued_status(search_id, search_info, since=None):
+    """Get the status of a search queued for the workers"""
+    progress = job_queue.progress(search_id, start=since or 0)
+    if progress is None:
+        return {'status': 'error', 'error': 'Search expired', 'folder': search_info['folder']}
+
+    if progress['status'] != 'running' and not search_info['reported']:
+        records = progress['records'] if not since else job_queue.progress(search_id)['records']
+        finish_queued_search(search_id, search_info, records)
 
-def parse_results(output):
-    """Parse sherlock output to extract found accounts"""
-    results = {
+    response = {
+        'status': progress['status'],
+        'error': progress['error'],
+        'folder': search_info['folder']
+    }
+    results = [record_result(record) for record in progress['records']]
+    if since is not None:
+        response.update(status_delta(since, results, progress['counts']))
+        return response
+
+    response['results'] = summarize_results(results, progress['usernames'])
+    response['raw_output'] = format_output(results)
+    return response
+
+def finish_queued_search(search_id, search_info, records):
+    """Write the reports and history of a queued search, once it has finished"""
+    with reports_lock:
+        if search_info['reported']:
+            return
+        search_info['reported'] = True
+
+    # Write the reports the workers cannot, as they may be on other hosts
+    write_reports(records, search_info['folder'], search_info['options'])
+    store = get_result_store()
+    if store is not None:
+        store.add(
+            (record_result(record) for record in records),
+            search_id=search_id
+        )
+
+def write_reports(records, folder, options):
+    """Write the report files of a finished search"""
+    os.makedirs(folder, exist_ok=True)
+    for username, results in collect_results(records).items():
+        write_txt(results, os.path.join(folder, f"{username}.txt"))
+        if options.get('csv'):
+            write_csv(username, results, os.path.join(folder, f"{username}.csv"))
+        if options.get('xlsx'):
+            write_xlsx(username, results, os.path.join(folder, f"{username}.xlsx"))
+
+def summarize_results(results, usernames):
+    """Summarize query results into the counts shown by the page"""
+    summary = {
         'found': [],
         'not_found': [],
-        'checking': [],
-        'total_checked': 0
+        'checking': list(usernames),
+        'total_checked': len(results)
     }
 
-    lines = output.split('\n')
-    for line in lines:
-        if line.startswith('[+]'):
-            # Found account
-            parts = line[4:].split(': ', 1)
-            if len(parts) == 2:
-                results['found'].append({
-                    'site': parts[0].strip(),
-                    'url': parts[1].strip()
-                })
-                results['total_checked'] += 1
-        elif line.startswith('[-]'):
-            # Not found
-            site = line[4:].strip()
-            results['not_found'].append(site)
-            results['total_checked'] += 1
-        elif line.startswith('[*]'):
-            # Currently checking (verbose mode)
-            site = line[4:].strip()
-            if site:
-                results['checking'].append(site)
-
-    return results
+    for result in results:
+        if result.status == QueryStatus.CLAIMED:
+            summary['found'].append({
+                'site': result.site_name,
+                'url': result.site_url_user
+            })
+        elif result.status == QueryStatus.AVAILABLE:
+            summary['not_found'].append(result.site_name)
+
+    return summary
+
+def format_output(results):
+    """Format query results the way the command line prints them"""
+    lines = []
+    for result in results:
+        if result.status == QueryStatus.CLAIMED:
+            lines.append(f"[+] {result.site_name}: {result.site_url_user}")
+        elif result.status == QueryStatus.AVAILABLE:
+            lines.append(f"[-] {result.site_name}: Not Found!")
+        else:
+            lines.append(f"[-] {result.site_name}: {result.context or result.status}")
+    return '\n'.join(lines)
+
+@app.route('/events/<search_id>')
+def search_events(search_id):
+    """Stream each result of a search as a server-sent event, then a summary"""
+    search_info = searches.get(search_id)
+    if search_info is None:
+        return jsonify({'error': 'Search not found'}), 404
+
+    # A reconnecting browser resumes after the last event it received
+    try:
+        cursor = int(request.headers.get('Last-Event-ID', -1)) + 1
+    except ValueError:
+        cursor = 0
+
+    if 'future' in search_info:
+        events = collected_events(search_info, cursor)
+    else:
+        events = queued_events(search_id, search_info, cursor)
+
+    return Response(
+        stream_with_context(events),
+        mimetype='text/event-stream',
+        headers={'Cache-Control': 'no-cache', 'X-Accel-Buffering': 'no'}
+    )
+
+def format_event(event, data, event_id=None):
+    """Format one server-sent event"""
+    lines = [f"event: {event}"]
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"data: {json.dumps(data)}")
+    return '\n'.join(lines) + '\n\n'
+
+def result_event(result):
+    """Get the data of the event for one query result"""
+    return {
+        'username': result.username,
+        'site': result.site_name,
+        'url': result.site_url_user,
+        'status': str(result.status),
+        'http_status': result.http_status,
+        'query_time': result.query_time,
+        'context': result.context
+    }
+
+def summary_event(status, results, usernames, error=None):
+    """Get the data of the final event of a search"""
+    summary = summarize_results(results, usernames)
+    return {
+        'status': status,
+        'error': error,
+        'found': len(summary['found']),
+        'not_found': len(summary['not_found']),
+        'total_checked': summary['total_checked'],
+        'usernames': usernames
+    }
+
+def collected_events(search_info, cursor):
+    """Events of a search running in this process"""
+    notify = search_info['notify']
+    while True:
+        results = notify.wait(cursor, timeout=EVENT_KEEPALIVE)
+        for result in results:
+            yield format_event('result', result_event(result), cursor)
+            cursor += 1
+        if results:
+            continue
+        if notify.finished:
+            break
+        yield ": keep-alive\n\n"
+
+    error = search_info['future'].exception()
+    yield format_event('summary', summary_event(
+        'error' if error is not None else 'completed',
+        notify.snapshot(),
+        notify.usernames,
+        str(error) if error is not None else None
+    ))
+
+def queued_events(search_id, search_info, cursor):
+    """Events of a search queued for the workers"""
+    # Workers publish an event as each job completes
+    subscription = job_queue.client.pubsub(ignore_subscribe_messages=True)
+    subscription.subscribe(job_queue.events_channel(search_id))
+    try:
+        while True:
+            progress = job_queue.progress(search_id, start=cursor)
+            if progress is None:
+                yield format_event('summary', {'status': 'error', 'error': 'Search expired'})
+                return
+            for record in progress['records']:
+                yield format_event('result', result_event(record_result(record)), cursor)
+                cursor += 1
+            if progress['status'] != 'running':
+                break
+            if subscription.get_message(timeout=EVENT_KEEPALIVE) is None:
+                yield ": keep-alive\n\n"
+    finally:
+        subscription.close()
+
+    progress = job_queue.progress(search_id)
+    finish_queued_search(search_id, search_info, progress['records'])
+    yield format_event('summary', summary_event(
+        progress['status'],
+        [record_result(record) for record in progress['records']],
+        progress['usernames'],
+        progress['error']
+    ))
+
+@app.route('/stats')
+def stats():
+    """Report the searches kept, and the memory and disk their results use"""
+    return jsonify(searches.stats())
+
+@app.route('/history/username/<username>')
+def username_history(username):
+    store = get_result_store()
+    if store is None:
+        return jsonify({'error': 'No result store configured'}), 404
+
+    return jsonify({
+        'username': username,
+        'claimed': [
+            {'site': site, 'url': url, 'last_seen': last_seen}
+            for site, url, last_seen in store.claimed_sites(username)
+        ]
+    })
+
+@app.route('/history/site/<site>')
+def site_history(site):
+    store = get_result_store()
+    if store is None:
+        return jsonify({'error': 'No result store configured'}), 404
+
+    return jsonify({
+        'site': site,
+        'usernames': [
+            {'username': username, 'last_seen': last_seen}
+            for username, last_seen in store.site_usernames(site)
+        ]
+    })
 
 @app.route('/download/<search_id>/<filename>')
 def download_file(search_id, filename):
-    if search_id not in active_searches:
+    search_info = searches.get(search_id)
+    if search_info is None:
         return jsonify({'error': 'Search not found'}), 404
 
-    folder = active_searches[search_id].get('folder')
+    folder = search_info.get('folder')
     if not folder:
         return jsonify({'error': 'Results folder not found'}), 404
 
@@ -237,10 +516,11 @@ def download_file(search_id, filename):
 
 @app.route('/list_files/<search_id>')
 def list_files(search_id):
-    if search_id not in active_searches:
+    search_info = searches.get(search_id)
+    if search_info is None:
         return jsonify({'error': 'Search not found'}), 404
 
-    folder = active_searches[search_id].get('folder')
+    folder = search_info.get('folder')
     if not folder or not os.path.exists(folder):
         return jsonify({'files': []})
 